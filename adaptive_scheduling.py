@@ -0,0 +1,60 @@
+# This file is used by the program to decide how long to wait before the next check
+# cycle of a site, when adaptive scheduling is turned on (`ping.adaptive_scheduling`).
+# This file is not inteded to be ran by itself, but rather imported by `monitor.py`.
+# Instead of always waiting `ping_check_frequency` minutes:
+#  - While every check succeeds and the ping statistics show no packet loss, the wait is
+#    doubled after each check, up to `ping_check_frequency` minutes.
+#  - As soon as a check has a failed address (but not enough to reboot), the site is
+#    checked again after `fast_recheck_interval` seconds to confirm it, a few times in a
+#    row, so a real outage is found in seconds instead of at the next check. During these
+#    fast rechecks, failed pings are also retried after `fast_recheck_interval` seconds.
+#  - If the ping statistics show packet loss over `adaptive_loss_threshold` percent, the
+#    wait is halved after each check, down to `minimum_check_interval` seconds.
+
+# Default adaptive scheduling settings
+DEFAULT_MINIMUM_CHECK_INTERVAL = 30 # seconds
+DEFAULT_FAST_RECHECK_INTERVAL = 1 # seconds
+DEFAULT_FAST_RECHECK_LIMIT = 3
+DEFAULT_ADAPTIVE_LOSS_THRESHOLD = 1 # percent
+
+# The wait between the check cycles of one site
+class AdaptiveCheckInterval:
+    __slots__ = ("minimum_interval", "maximum_interval", "fast_recheck_interval", "fast_recheck_limit", "loss_threshold", "interval", "fast_rechecks", "fast_rechecking")
+
+    def __init__(self, minimum_interval, maximum_interval, fast_recheck_interval=DEFAULT_FAST_RECHECK_INTERVAL, fast_recheck_limit=DEFAULT_FAST_RECHECK_LIMIT, loss_threshold=DEFAULT_ADAPTIVE_LOSS_THRESHOLD):
+        self.minimum_interval = min(minimum_interval, maximum_interval)
+        self.maximum_interval = maximum_interval
+        self.fast_recheck_interval = fast_recheck_interval
+        self.fast_recheck_limit = fast_recheck_limit
+        self.loss_threshold = loss_threshold
+        self.interval = self.minimum_interval
+        self.fast_rechecks = 0
+        # Whether the next check is a fast recheck, confirming a failure
+        self.fast_rechecking = False
+
+    # Start again from the minimum interval (e.g. after a reboot)
+    def reset(self):
+        self.interval = self.minimum_interval
+        self.fast_rechecks = 0
+        self.fast_rechecking = False
+
+    # The number of seconds to wait before the next check, from the result of the last check:
+    # the number of failed addresses, and the packet loss rate (0 to 1) of the ping statistics
+    def next_interval(self, failed_pings, loss_rate):
+        # Confirm a failure quickly, a few times in a row
+        if failed_pings > 0 and self.fast_rechecks < self.fast_recheck_limit:
+            self.fast_rechecks += 1
+            self.fast_rechecking = True
+            self.interval = self.minimum_interval
+            return self.fast_recheck_interval
+        self.fast_rechecking = False
+        if failed_pings == 0:
+            self.fast_rechecks = 0
+
+        if failed_pings > 0 or loss_rate * 100 > self.loss_threshold:
+            # The connection is flaky, check more often
+            self.interval = max(self.minimum_interval, self.interval / 2)
+        else:
+            # The connection is healthy, check less often
+            self.interval = min(self.maximum_interval, self.interval * 2)
+        return self.interval
@@ -0,0 +1,27 @@
+# Fake probe functions for the benchmarks, with the same signature as the ones made by
+# `prober.create_prober`: probe(address) returns the RTT in microseconds, or None if the
+# address didn't answer. They never touch the network, so the benchmarks measure the
+# program rather than the connection.
+
+# Import the required modules
+import time
+import zlib
+
+# A probe that answers straight away, from every address
+def instant_probe(address):
+    return 1000
+
+# Create a probe that takes `latency` seconds, and fails for a fixed share (`loss_rate`, 0 to
+# 1) of the addresses. Which addresses fail is worked out from the address, so every run of
+# a benchmark fails the same addresses.
+def create_fake_prober(latency=0.01, loss_rate=0.0):
+    def fake_probe(address):
+        time.sleep(latency)
+        if zlib.crc32(address.encode()) % 1000 < loss_rate * 1000:
+            return None
+        return int(latency * 1000000)
+    return fake_probe
+
+# A ping list of `count` made up addresses
+def create_ping_list(count):
+    return [f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}" for index in range(count)]
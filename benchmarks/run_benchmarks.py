@@ -0,0 +1,238 @@
+# This file runs the benchmarks of the program, and saves the results to a JSON file so runs
+# can be compared across commits. Run it from the program's folder:
+#   python benchmarks/run_benchmarks.py
+#   python benchmarks/run_benchmarks.py --quick --output results.json
+#   python benchmarks/run_benchmarks.py --only logging probing
+# The benchmarks:
+#  - logging: log entries written per second, as the month's log file grows, for both log
+#    formats, and for the background log writer.
+#  - probing: probes per second and time to decision, for large ping lists (fake probes).
+#  - router: the time for a reboot request (including the login), against a stub router.
+#  - memory: the memory used per monitored site.
+# Nothing here touches the network or the real `logs` folder.
+
+# Import the required modules
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import datetime
+import tracemalloc
+import subprocess
+
+# The benchmarks import the program's modules from the folder above
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_PATH))
+
+import loger
+import monitor
+import configuration
+import ping_engine
+import routers
+from scheduler import Scheduler
+from fake_probers import instant_probe, create_fake_prober, create_ping_list
+from stub_router import start_stub_router, STUB_ROUTER_PASSWORD
+
+# A log entry like the ones written while pinging
+LOG_ENTRY_ARGUMENTS = ("success", "Successfully pinged 8.8.8.8 - 12.3 ms (attempt: 1/3)", "success")
+
+# The site settings used by the benchmarks
+def create_site_settings(name, ping_list, router_ip_address="127.0.0.1"):
+    return configuration.SiteSettings(
+        name,
+        {"router_ip_address": router_ip_address, "router_password": STUB_ROUTER_PASSWORD},
+        {"ping_list": ping_list, "unreachable_ping_threshold": max(1, len(ping_list) // 2), "ping_check_frequency": 5, "ping_retry_amount": 0, "ping_retry_interval": 1},
+        {"network_reboot_interval": 5, "network_reboot_retry_count": 3, "network_reboot_cooldown_period": 60}
+    )
+
+# The latency percentiles of a list of times in seconds, in ms
+def summarise_times(times):
+    times = sorted(times)
+    return {
+        "count": len(times),
+        "mean_ms": round(sum(times) / len(times) * 1000, 3),
+        "p50_ms": round(times[len(times) // 2] * 1000, 3),
+        "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))] * 1000, 3),
+        "max_ms": round(times[-1] * 1000, 3)
+    }
+
+# Log entries written per second with `write_log_entries`, after the log file already has
+# `existing_entries` entries, for each log format
+def benchmark_logging(quick):
+    file_sizes = (0, 1000, 10000) if quick else (0, 1000, 10000, 50000)
+    writes = 50 if quick else 200
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for file_format, extension in loger.LOG_FORMATS.items():
+            results[file_format] = []
+            for existing_entries in file_sizes:
+                # json log files are rewritten on every write, so use fewer writes on big files
+                format_writes = writes if file_format == "jsonl" or existing_entries <= 1000 else max(5, writes // 20)
+                path = os.path.join(folder, f"{file_format}-{existing_entries}{extension}")
+                loger.write_log_entries(path, [loger.create_log_entry(*LOG_ENTRY_ARGUMENTS) for _ in range(existing_entries)])
+                started = time.perf_counter()
+                for _ in range(format_writes):
+                    loger.write_log_entries(path, [loger.create_log_entry(*LOG_ENTRY_ARGUMENTS)])
+                elapsed = time.perf_counter() - started
+                results[file_format].append({
+                    "existing_entries": existing_entries,
+                    "file_size_bytes": os.path.getsize(path),
+                    "writes": format_writes,
+                    "writes_per_second": round(format_writes / elapsed, 1)
+                })
+
+        # The background log writer: how fast `write_to_log_file` returns, and how long until
+        # everything is on disk
+        entries = 10000 if quick else 100000
+        working_directory = os.getcwd()
+        os.chdir(folder)
+        try:
+            loger.Initialise_log_file("jsonl")
+            started = time.perf_counter()
+            for _ in range(entries):
+                loger.write_to_log_file(*LOG_ENTRY_ARGUMENTS)
+            queued = time.perf_counter() - started
+            loger.flush_log_file()
+            flushed = time.perf_counter() - started
+            loger.close_log_file()
+            loger.logging_enabled = False
+        finally:
+            os.chdir(working_directory)
+        results["buffered_jsonl"] = {
+            "entries": entries,
+            "calls_per_second": round(entries / queued, 1),
+            "entries_on_disk_per_second": round(entries / flushed, 1)
+        }
+    return results
+
+# Probes per second and time to decision for ping lists of different sizes, with fake probes
+# that take 10 ms each
+def benchmark_probing(quick):
+    list_sizes = (10, 100, 500) if quick else (10, 100, 500, 1000)
+    fake_probe = create_fake_prober(latency=0.01)
+    results = []
+    for list_size in list_sizes:
+        ping_list = create_ping_list(list_size)
+        counted = []
+
+        # Every address is pinged, as with a threshold of 1 the decision is only known once
+        # every address has answered
+        started = time.perf_counter()
+        failed_pings = ping_engine.check_ping_list(ping_list, fake_probe, 1, 0, 1, on_attempt=lambda *arguments: counted.append(1))
+        all_pinged = time.perf_counter() - started
+
+        # Half of the addresses fail, so the decision is made as soon as enough have failed
+        failing_probe = create_fake_prober(latency=0.01, loss_rate=0.5)
+        started = time.perf_counter()
+        ping_engine.check_ping_list(ping_list, failing_probe, max(1, list_size // 10), 0, 1)
+        early_decision = time.perf_counter() - started
+
+        # The cost of the engine itself, with probes that answer straight away
+        started = time.perf_counter()
+        ping_engine.check_ping_list(ping_list, instant_probe, list_size, 0, 1)
+        overhead = time.perf_counter() - started
+
+        results.append({
+            "ping_list_size": list_size,
+            "failed_pings": failed_pings,
+            "probes": len(counted),
+            "time_to_decision_ms": round(all_pinged * 1000, 3),
+            "probes_per_second": round(len(counted) / all_pinged, 1),
+            "time_to_early_decision_ms": round(early_decision * 1000, 3),
+            "instant_probes_per_second": round(list_size / overhead, 1)
+        })
+    return results
+
+# The time for a reboot request (login, then reboot) and for a status request with a cached
+# token, against the stub router
+def benchmark_router(quick):
+    requests_count = 20 if quick else 200
+    server = start_stub_router()
+    try:
+        client = routers.create_router_client({"router_ip_address": f"127.0.0.1:{server.server_port}", "router_password": STUB_ROUTER_PASSWORD})
+        reboot_times = []
+        for _ in range(requests_count):
+            started = time.perf_counter()
+            if not client.reboot():
+                raise RuntimeError("The stub router didn't accept the reboot request")
+            reboot_times.append(time.perf_counter() - started)
+
+        client.login()
+        status_times = []
+        for _ in range(requests_count):
+            started = time.perf_counter()
+            client.status()
+            status_times.append(time.perf_counter() - started)
+        client.logout()
+    finally:
+        server.shutdown()
+        server.server_close()
+    return {"reboot": summarise_times(reboot_times), "status_with_cached_token": summarise_times(status_times)}
+
+# The memory used per monitored site, with full ping statistics for every address
+def benchmark_memory(quick):
+    site_count = 100 if quick else 1000
+    ping_list = create_ping_list(5)
+    scheduler = Scheduler()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    site_monitors = []
+    for index in range(site_count):
+        site_monitor = monitor.SiteMonitor(scheduler, create_site_settings(f"site-{index}", ping_list), True)
+        # Fill the statistics windows, as they are after the site has run for a while
+        for address in ping_list:
+            for _ in range(100):
+                site_monitor.on_ping_attempt(address, 0, 1, 12000)
+        site_monitors.append(site_monitor)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(statistic.size_diff for statistic in after.compare_to(before, "filename"))
+    return {"sites": site_count, "addresses_per_site": len(ping_list), "bytes_per_site": round(allocated / site_count)}
+
+BENCHMARKS = {
+    "logging": benchmark_logging,
+    "probing": benchmark_probing,
+    "router": benchmark_router,
+    "memory": benchmark_memory
+}
+
+# The commit being benchmarked, if the program is in a git repository
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BENCHMARKS_PATH, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the benchmarks of the automatic network rebooter.")
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes, for a quick check")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="only run these benchmarks")
+    parser.add_argument("--output", metavar="PATH", help="save the results to PATH (default: benchmarks/results/{time}.json)")
+    arguments = parser.parse_args()
+
+    # The monitor prints every ping, which would be most of the time measured
+    monitor.SiteMonitor.print = lambda self, message: None
+
+    results = {
+        "commit": get_commit(),
+        "time": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": arguments.quick,
+        "benchmarks": {}
+    }
+    for name in arguments.only or BENCHMARKS:
+        print(f"Running the {name} benchmark...")
+        started = time.perf_counter()
+        results["benchmarks"][name] = BENCHMARKS[name](arguments.quick)
+        print(f"  done in {time.perf_counter() - started:.1f} seconds")
+
+    output_path = arguments.output or os.path.join(BENCHMARKS_PATH, "results", datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w") as file:
+        json.dump(results, file, indent=4)
+    print(json.dumps(results["benchmarks"], indent=4))
+    print(f"Results saved to: {output_path}")
@@ -0,0 +1,121 @@
+# A stub of the Virgin Media Hub 5 REST API, for the benchmarks and the tests. It answers the requests the
+# `virgin_media_hub_5` driver sends (login, system info, reboot and logout) straight away,
+# or after `response_delay` seconds, without rebooting anything. It can also be ran by
+# itself, to try the program against it:
+#   python benchmarks/stub_router.py 8081
+# and set `router_ip_address` to "127.0.0.1:8081" in `config.json`.
+
+# Import the required modules
+import sys
+import json
+import time
+import uuid
+import socket
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# The password the stub router accepts
+STUB_ROUTER_PASSWORD = "benchmark"
+
+# Handles the requests to the stub router
+class StubRouterRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive connections, like the real router
+    protocol_version = "HTTP/1.1"
+
+    # Send the headers and the body without waiting for an ACK in between (Nagle's algorithm),
+    # which would add 40 ms to every response and hide the time spent in the driver
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        body = self.read_body()
+        if self.path == "/rest/v1/user/login":
+            if body.get("password") != STUB_ROUTER_PASSWORD:
+                self.send_json(401, {"error": "unauthorised"})
+                return
+            self.server.login_count += 1
+            if self.server.login_body is not None:
+                self.send_body(201, self.server.login_body)
+                return
+            token = uuid.uuid4().hex
+            self.server.tokens.add(token)
+            self.send_json(201, {"created": {"token": token, "userId": 3}})
+        elif self.path == "/rest/v1/system/reboot":
+            if self.authorised():
+                self.server.reboot_count += 1
+                self.send_json(200, {"reboot": {"enable": True}})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_GET(self):
+        if self.path == "/rest/v1/system/info":
+            if self.authorised():
+                self.send_json(200, {"info": {"model": "stub", "reboots": self.server.reboot_count}})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_DELETE(self):
+        token = self.path.rsplit("/", 1)[-1]
+        if self.path.startswith("/rest/v1/user/") and token in self.server.tokens:
+            self.server.tokens.discard(token)
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self.send_json(401, {"error": "unauthorised"})
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    # Check the bearer token, and answer 401 if it isn't valid
+    def authorised(self):
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        if token in self.server.tokens:
+            return True
+        self.send_json(401, {"error": "unauthorised"})
+        return False
+
+    def send_json(self, status, data):
+        self.send_body(status, json.dumps(data).encode())
+
+    def send_body(self, status, body):
+        if self.server.response_delay:
+            time.sleep(self.server.response_delay)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# Start the stub router on a background thread, on a free port unless one is given.
+# Returns the server, its address is "127.0.0.1:{server.server_port}". Clearing
+# `server.tokens` makes the router reject the tokens it gave out (401), and setting
+# `server.login_body` to some bytes makes it answer logins with them.
+def start_stub_router(port=0, response_delay=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubRouterRequestHandler)
+    server.daemon_threads = True
+    server.tokens = set()
+    server.reboot_count = 0
+    server.login_count = 0
+    server.login_body = None
+    server.response_delay = response_delay
+    threading.Thread(target=server.serve_forever, name="stub-router", daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    server = start_stub_router(int(sys.argv[1]) if len(sys.argv) > 1 else 8081)
+    print(f"Stub router on 127.0.0.1:{server.server_port} (password: {STUB_ROUTER_PASSWORD}), press Ctrl + C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
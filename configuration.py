@@ -0,0 +1,363 @@
+# This file is used by the program to check the configuration settings in `config.json`,
+# and turn them into settings objects, before it starts monitoring. This file is not inteded
+# to be ran by itself, but rather imported by the main program (`main.py`).
+# The checks use the same rules (and ranges) as the setup wizard in `program_setup.py`, so
+# a `config.json` made by the wizard is always valid. In daemon mode (`main.py --daemon`)
+# nobody can be asked for a missing router IP address or password, so those are required.
+# The settings are checked once, when they are loaded, and every optional setting is filled
+# in with its default then, so the monitor reads plain attributes (`settings.ping.ping_list`)
+# instead of looking up nested dictionaries and defaults on every check cycle.
+
+# Import the required modules
+import program_setup
+import prober
+import routers
+import loger
+import retention
+import probe_store
+import metrics
+import recovery
+import reboot_governor
+import adaptive_scheduling
+import ping_statistics
+import dns_cache
+import state_file
+from scheduler import DEFAULT_MAX_WORKERS
+
+# Default configuration settings
+DEFAULT_CONFIGURATION_PATH = "config.json"
+DEFAULT_CONFIG_WATCH_INTERVAL = 5 # seconds
+
+# Raised when the configuration settings are not valid, with the list of problems found
+class InvalidConfigurationError(Exception):
+    def __init__(self, problems):
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+# The ping settings of a site
+class PingSettings:
+    __slots__ = ("ping_list", "unreachable_ping_threshold", "ping_check_frequency", "ping_retry_amount", "ping_retry_interval", "probe_method", "probe_timeout", "probe_tcp_port", "probe_dns_query_name", "statistics_window_size", "max_packet_loss", "max_latency", "max_jitter", "adaptive_scheduling", "minimum_check_interval", "fast_recheck_interval", "fast_recheck_limit", "adaptive_loss_threshold", "count_dns_failures")
+
+    def __init__(self, ping_settings):
+        self.ping_list = list(ping_settings["ping_list"])
+        self.unreachable_ping_threshold = ping_settings["unreachable_ping_threshold"]
+        self.ping_check_frequency = ping_settings["ping_check_frequency"]
+        self.ping_retry_amount = ping_settings["ping_retry_amount"]
+        self.ping_retry_interval = ping_settings["ping_retry_interval"]
+        self.probe_method = ping_settings.get("probe_method", prober.DEFAULT_PROBE_METHOD)
+        self.probe_timeout = ping_settings.get("probe_timeout", prober.DEFAULT_PROBE_TIMEOUT)
+        self.probe_tcp_port = ping_settings.get("probe_tcp_port", prober.DEFAULT_TCP_PORT)
+        self.probe_dns_query_name = ping_settings.get("probe_dns_query_name", prober.DEFAULT_DNS_QUERY_NAME)
+        self.statistics_window_size = ping_settings.get("statistics_window_size", ping_statistics.DEFAULT_WINDOW_SIZE)
+        self.max_packet_loss = ping_settings.get("max_packet_loss")
+        self.max_latency = ping_settings.get("max_latency")
+        self.max_jitter = ping_settings.get("max_jitter")
+        self.adaptive_scheduling = ping_settings.get("adaptive_scheduling", False)
+        self.minimum_check_interval = ping_settings.get("minimum_check_interval", adaptive_scheduling.DEFAULT_MINIMUM_CHECK_INTERVAL)
+        self.fast_recheck_interval = ping_settings.get("fast_recheck_interval", adaptive_scheduling.DEFAULT_FAST_RECHECK_INTERVAL)
+        self.fast_recheck_limit = ping_settings.get("fast_recheck_limit", adaptive_scheduling.DEFAULT_FAST_RECHECK_LIMIT)
+        self.adaptive_loss_threshold = ping_settings.get("adaptive_loss_threshold", adaptive_scheduling.DEFAULT_ADAPTIVE_LOSS_THRESHOLD)
+        self.count_dns_failures = ping_settings.get("count_dns_failures", False)
+
+# The network (reboot) settings of a site
+class NetworkSettings:
+    __slots__ = ("network_reboot_interval", "network_reboot_retry_count", "network_reboot_cooldown_period", "recovery_detection", "recovery_poll_interval", "recovery_stable_polls", "recovery_down_timeout", "layered_diagnosis", "max_reboots_per_hour", "max_reboots_per_day", "reboot_backoff_base", "reboot_backoff_max")
+
+    def __init__(self, network_settings):
+        self.network_reboot_interval = network_settings["network_reboot_interval"]
+        self.network_reboot_retry_count = network_settings["network_reboot_retry_count"]
+        self.network_reboot_cooldown_period = network_settings["network_reboot_cooldown_period"]
+        self.recovery_detection = network_settings.get("recovery_detection", True)
+        self.recovery_poll_interval = network_settings.get("recovery_poll_interval", recovery.DEFAULT_RECOVERY_POLL_INTERVAL)
+        self.recovery_stable_polls = network_settings.get("recovery_stable_polls", recovery.DEFAULT_RECOVERY_STABLE_POLLS)
+        self.recovery_down_timeout = network_settings.get("recovery_down_timeout", recovery.DEFAULT_RECOVERY_DOWN_TIMEOUT)
+        self.layered_diagnosis = network_settings.get("layered_diagnosis", True)
+        self.max_reboots_per_hour = network_settings.get("max_reboots_per_hour", reboot_governor.DEFAULT_MAX_REBOOTS_PER_HOUR)
+        self.max_reboots_per_day = network_settings.get("max_reboots_per_day", reboot_governor.DEFAULT_MAX_REBOOTS_PER_DAY)
+        self.reboot_backoff_base = network_settings.get("reboot_backoff_base", reboot_governor.DEFAULT_REBOOT_BACKOFF_BASE)
+        self.reboot_backoff_max = network_settings.get("reboot_backoff_max", reboot_governor.DEFAULT_REBOOT_BACKOFF_MAX)
+
+# The settings of one site: a router and its ping list. The router details stay a dictionary,
+# as that is what the router drivers are given (see `routers/base.py`).
+class SiteSettings:
+    __slots__ = ("name", "router_details", "manual_router_details", "ping", "network")
+
+    def __init__(self, name, router_details, ping_settings, network_settings):
+        self.name = name
+        self.router_details = dict(router_details)
+        # The router details that are not in the config file, and were entered when the
+        # program started (they are also in `router_details`)
+        self.manual_router_details = {}
+        self.ping = PingSettings(ping_settings)
+        self.network = NetworkSettings(network_settings)
+
+# All of the configuration settings of the program
+class Configuration:
+    __slots__ = ("sites", "log_file", "log_format", "log_flush_interval", "log_batch_size", "log_fsync_interval", "log_rollup_save_interval", "log_compress_closed_months", "log_max_age_months", "log_max_size_mb", "log_retention_check_interval", "probe_store", "probe_store_path", "max_worker_threads", "metrics_enabled", "metrics_host", "metrics_port", "config_watch_interval", "dns_cache_size", "dns_cache_max_stale", "state_file", "state_file_path", "state_save_interval")
+
+    def __init__(self, configuration_settings):
+        self.sites = [SiteSettings(site["name"], site["router_details"], site["ping"], site["network"]) for site in get_site_settings(configuration_settings)]
+        self.log_file = configuration_settings["log_file"]
+        self.log_format = configuration_settings.get("log_format", "json")
+        self.log_flush_interval = configuration_settings.get("log_flush_interval", loger.DEFAULT_FLUSH_INTERVAL)
+        self.log_batch_size = configuration_settings.get("log_batch_size", loger.DEFAULT_BATCH_SIZE)
+        self.log_fsync_interval = configuration_settings.get("log_fsync_interval", loger.DEFAULT_FSYNC_INTERVAL)
+        self.log_rollup_save_interval = configuration_settings.get("log_rollup_save_interval", loger.DEFAULT_ROLLUP_SAVE_INTERVAL)
+        self.log_compress_closed_months = configuration_settings.get("log_compress_closed_months", retention.DEFAULT_COMPRESS_CLOSED_MONTHS)
+        self.log_max_age_months = configuration_settings.get("log_max_age_months", retention.DEFAULT_MAX_AGE_MONTHS)
+        self.log_max_size_mb = configuration_settings.get("log_max_size_mb", retention.DEFAULT_MAX_SIZE_MB)
+        self.log_retention_check_interval = configuration_settings.get("log_retention_check_interval", retention.DEFAULT_RETENTION_CHECK_INTERVAL)
+        self.probe_store = configuration_settings.get("probe_store", False)
+        self.probe_store_path = configuration_settings.get("probe_store_path", probe_store.DEFAULT_PROBE_STORE_PATH)
+        self.max_worker_threads = configuration_settings.get("max_worker_threads", DEFAULT_MAX_WORKERS)
+        metrics_settings = configuration_settings.get("metrics", {})
+        self.metrics_enabled = metrics_settings.get("enabled", False)
+        self.metrics_host = metrics_settings.get("host", metrics.DEFAULT_METRICS_HOST)
+        self.metrics_port = metrics_settings.get("port", metrics.DEFAULT_METRICS_PORT)
+        self.config_watch_interval = configuration_settings.get("config_watch_interval", DEFAULT_CONFIG_WATCH_INTERVAL)
+        self.dns_cache_size = configuration_settings.get("dns_cache_size", dns_cache.DEFAULT_DNS_CACHE_SIZE)
+        self.dns_cache_max_stale = configuration_settings.get("dns_cache_max_stale", dns_cache.DEFAULT_DNS_MAX_STALE)
+        self.state_file = configuration_settings.get("state_file", True)
+        self.state_file_path = configuration_settings.get("state_file_path", state_file.DEFAULT_STATE_FILE_PATH)
+        self.state_save_interval = configuration_settings.get("state_save_interval", state_file.DEFAULT_STATE_SAVE_INTERVAL)
+
+# Get the settings of each site to monitor from the configuration settings.
+# A single site config has `router_details`, `ping` and `network` at the top level. A multi
+# site config has a `sites` list instead, and each site has its own `name` and
+# `router_details`, and can have its own `ping` and `network` settings (if it doesn't, the
+# top level ones are used).
+def get_site_settings(configuration_settings):
+    if "sites" not in configuration_settings:
+        return [{
+            "name": "default",
+            "router_details": configuration_settings["router_details"],
+            "ping": configuration_settings["ping"],
+            "network": configuration_settings["network"]
+        }]
+
+    sites = []
+    for index, site in enumerate(configuration_settings["sites"]):
+        sites.append({
+            "name": site.get("name", f"site-{index + 1}"),
+            "router_details": site["router_details"],
+            "ping": site.get("ping", configuration_settings.get("ping")),
+            "network": site.get("network", configuration_settings.get("network"))
+        })
+    return sites
+
+# Check a number setting is a whole number in a range, like the setup wizard
+def verify_number_in_range(value, min, max):
+    return isinstance(value, int) and not isinstance(value, bool) and program_setup.verify_user_input_number_in_range(str(value), min, max)
+
+# Check a number setting is a number (whole or not) in a range, e.g. a number of seconds
+def verify_number(value, min, max):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and min <= value <= max
+
+# Check a number setting is a number above 0, and no more than `max`
+def verify_positive_number(value, max):
+    return verify_number(value, 0, max) and value > 0
+
+# Check an optional limit is either not set (null) or a number in a range
+def verify_optional_number(value, min, max):
+    return value is None or verify_number(value, min, max)
+
+# Check a router IP address, which can have a port (e.g. "192.168.0.1" or "192.168.0.1:8080")
+def verify_router_ip_address(router_ip_address):
+    if not isinstance(router_ip_address, str):
+        return False
+    address, _, port = router_ip_address.partition(":")
+    if port and not program_setup.verify_user_input_number_in_range(port, 1, 65535):
+        return False
+    return program_setup.verify_user_input_ip_address(address)
+
+# Check the router IP address and password of a site, and add a message for each problem found
+# to `problems`
+def validate_router_details(router_details, require_router_details, prefix, problems):
+    router_ip_address = router_details.get("router_ip_address")
+    if router_ip_address in ("", None):
+        if require_router_details:
+            problems.append(prefix + "`router_ip_address` must be set (it can't be entered when the program starts)")
+    elif not verify_router_ip_address(router_ip_address):
+        problems.append(prefix + f"`router_ip_address` is not a valid IP address: {router_ip_address}")
+    if require_router_details and router_details.get("router_password") in ("", None):
+        problems.append(prefix + "`router_password` must be set (it can't be entered when the program starts)")
+
+# Check the settings of one site, and add a message for each problem found to `problems`
+def validate_site_settings(site, require_router_details, problems):
+    prefix = f"[{site['name']}] "
+    router_details = site["router_details"]
+    ping_settings = site["ping"]
+    network_settings = site["network"]
+    if not isinstance(router_details, dict):
+        problems.append(prefix + "`router_details` must be an object")
+        return
+    if not isinstance(ping_settings, dict):
+        problems.append(prefix + "`ping` settings are missing")
+        return
+    if not isinstance(network_settings, dict):
+        problems.append(prefix + "`network` settings are missing")
+        return
+
+    # Router details
+    validate_router_details(router_details, require_router_details, prefix, problems)
+    router_model = router_details.get("router_model", routers.DEFAULT_ROUTER_MODEL)
+    if router_model not in routers.ROUTER_DRIVERS:
+        # Drivers outside of the `routers` folder are loaded now, as they can't be checked by name
+        try:
+            routers.load_router_driver(router_model)
+        except routers.UnknownRouterModelError as e:
+            problems.append(prefix + str(e))
+
+    # Ping settings
+    ping_list = ping_settings.get("ping_list")
+    if not isinstance(ping_list, list) or len(ping_list) == 0:
+        problems.append(prefix + "`ping_list` must be a list with at least one address")
+        ping_list = []
+    for ping_address in ping_list:
+        if not isinstance(ping_address, str) or not (program_setup.verify_user_input_url(ping_address) or program_setup.verify_user_input_ip_address(ping_address)):
+            problems.append(prefix + f"`ping_list` has an invalid URL or IP address: {ping_address}")
+    if ping_list and not verify_number_in_range(ping_settings.get("unreachable_ping_threshold"), 1, len(ping_list)):
+        problems.append(prefix + f"`unreachable_ping_threshold` must be a number between 1 and {len(ping_list)}")
+    if not verify_number_in_range(ping_settings.get("ping_check_frequency"), 1, 483840):
+        problems.append(prefix + "`ping_check_frequency` must be a number of minutes between 1 and 483840")
+    if not verify_number_in_range(ping_settings.get("ping_retry_amount"), 0, 10):
+        problems.append(prefix + "`ping_retry_amount` must be a number between 0 and 10")
+    if not verify_number_in_range(ping_settings.get("ping_retry_interval"), 1, 300):
+        problems.append(prefix + "`ping_retry_interval` must be a number of seconds between 1 and 300")
+    if not isinstance(ping_settings.get("count_dns_failures", False), bool):
+        problems.append(prefix + "`count_dns_failures` must be true or false")
+    probe_method = ping_settings.get("probe_method", prober.DEFAULT_PROBE_METHOD)
+    if probe_method not in prober.PROBE_METHODS:
+        problems.append(prefix + f"Unknown `probe_method`: {probe_method} (supported methods: {', '.join(prober.PROBE_METHODS)})")
+    if not verify_positive_number(ping_settings.get("probe_timeout", prober.DEFAULT_PROBE_TIMEOUT), 60):
+        problems.append(prefix + "`probe_timeout` must be a number of seconds above 0 and up to 60")
+    if not verify_number_in_range(ping_settings.get("probe_tcp_port", prober.DEFAULT_TCP_PORT), 1, 65535):
+        problems.append(prefix + "`probe_tcp_port` must be a port number between 1 and 65535")
+    probe_dns_query_name = ping_settings.get("probe_dns_query_name", prober.DEFAULT_DNS_QUERY_NAME)
+    if not isinstance(probe_dns_query_name, str) or not probe_dns_query_name:
+        problems.append(prefix + "`probe_dns_query_name` must be a hostname")
+    if not verify_number_in_range(ping_settings.get("statistics_window_size", ping_statistics.DEFAULT_WINDOW_SIZE), 1, 100000):
+        problems.append(prefix + "`statistics_window_size` must be a number of pings between 1 and 100000")
+    if not verify_optional_number(ping_settings.get("max_packet_loss"), 0, 100):
+        problems.append(prefix + "`max_packet_loss` must be a percentage between 0 and 100 (or null)")
+    if not verify_optional_number(ping_settings.get("max_latency"), 0, 600000):
+        problems.append(prefix + "`max_latency` must be a number of milliseconds (or null)")
+    if not verify_optional_number(ping_settings.get("max_jitter"), 0, 600000):
+        problems.append(prefix + "`max_jitter` must be a number of milliseconds (or null)")
+    if not isinstance(ping_settings.get("adaptive_scheduling", False), bool):
+        problems.append(prefix + "`adaptive_scheduling` must be true or false")
+    if not verify_positive_number(ping_settings.get("minimum_check_interval", adaptive_scheduling.DEFAULT_MINIMUM_CHECK_INTERVAL), 86400):
+        problems.append(prefix + "`minimum_check_interval` must be a number of seconds above 0 and up to 86400")
+    if not verify_positive_number(ping_settings.get("fast_recheck_interval", adaptive_scheduling.DEFAULT_FAST_RECHECK_INTERVAL), 3600):
+        problems.append(prefix + "`fast_recheck_interval` must be a number of seconds above 0 and up to 3600")
+    if not verify_number_in_range(ping_settings.get("fast_recheck_limit", adaptive_scheduling.DEFAULT_FAST_RECHECK_LIMIT), 0, 100):
+        problems.append(prefix + "`fast_recheck_limit` must be a number between 0 and 100")
+    if not verify_number(ping_settings.get("adaptive_loss_threshold", adaptive_scheduling.DEFAULT_ADAPTIVE_LOSS_THRESHOLD), 0, 100):
+        problems.append(prefix + "`adaptive_loss_threshold` must be a percentage between 0 and 100")
+
+    # Network settings
+    if not verify_number_in_range(network_settings.get("network_reboot_interval"), 5, 1440):
+        problems.append(prefix + "`network_reboot_interval` must be a number of minutes between 5 and 1440")
+    if not verify_number_in_range(network_settings.get("network_reboot_retry_count"), 1, 10):
+        problems.append(prefix + "`network_reboot_retry_count` must be a number between 1 and 10")
+    if not verify_number_in_range(network_settings.get("network_reboot_cooldown_period"), 1, 1440):
+        problems.append(prefix + "`network_reboot_cooldown_period` must be a number of minutes between 1 and 1440")
+    if not isinstance(network_settings.get("recovery_detection", True), bool):
+        problems.append(prefix + "`recovery_detection` must be true or false")
+    if not verify_positive_number(network_settings.get("recovery_poll_interval", recovery.DEFAULT_RECOVERY_POLL_INTERVAL), 3600):
+        problems.append(prefix + "`recovery_poll_interval` must be a number of seconds above 0 and up to 3600")
+    if not verify_number_in_range(network_settings.get("recovery_stable_polls", recovery.DEFAULT_RECOVERY_STABLE_POLLS), 1, 100):
+        problems.append(prefix + "`recovery_stable_polls` must be a number between 1 and 100")
+    if not verify_positive_number(network_settings.get("recovery_down_timeout", recovery.DEFAULT_RECOVERY_DOWN_TIMEOUT), 86400):
+        problems.append(prefix + "`recovery_down_timeout` must be a number of seconds above 0 and up to 86400")
+    if not isinstance(network_settings.get("layered_diagnosis", True), bool):
+        problems.append(prefix + "`layered_diagnosis` must be true or false")
+    if not verify_number_in_range(network_settings.get("max_reboots_per_hour", reboot_governor.DEFAULT_MAX_REBOOTS_PER_HOUR), 0, 12):
+        problems.append(prefix + "`max_reboots_per_hour` must be a number between 0 and 12 (0 for no limit)")
+    if not verify_number_in_range(network_settings.get("max_reboots_per_day", reboot_governor.DEFAULT_MAX_REBOOTS_PER_DAY), 0, 288):
+        problems.append(prefix + "`max_reboots_per_day` must be a number between 0 and 288 (0 for no limit)")
+    if not verify_number_in_range(network_settings.get("reboot_backoff_base", reboot_governor.DEFAULT_REBOOT_BACKOFF_BASE), 0, 1440):
+        problems.append(prefix + "`reboot_backoff_base` must be a number of minutes between 0 and 1440 (0 turns the backoff off)")
+    if not verify_number_in_range(network_settings.get("reboot_backoff_max", reboot_governor.DEFAULT_REBOOT_BACKOFF_MAX), 1, 10080):
+        problems.append(prefix + "`reboot_backoff_max` must be a number of minutes between 1 and 10080")
+
+# Check the configuration settings. Returns a list of messages, one for each problem found
+# (an empty list if the settings are valid).
+def validate_configuration_settings(configuration_settings, require_router_details=False):
+    if not isinstance(configuration_settings, dict):
+        return ["The configuration settings must be a JSON object"]
+    problems = []
+    if not isinstance(configuration_settings.get("log_file"), bool):
+        problems.append("`log_file` must be true or false")
+    if configuration_settings.get("log_format", "json") not in loger.LOG_FORMATS:
+        problems.append(f"`log_format` must be one of: {', '.join(loger.LOG_FORMATS)}")
+    if not verify_positive_number(configuration_settings.get("log_flush_interval", loger.DEFAULT_FLUSH_INTERVAL), 3600):
+        problems.append("`log_flush_interval` must be a number of seconds above 0 and up to 3600")
+    if not verify_number_in_range(configuration_settings.get("log_batch_size", loger.DEFAULT_BATCH_SIZE), 1, 100000):
+        problems.append("`log_batch_size` must be a number of log entries between 1 and 100000")
+    if not verify_optional_number(configuration_settings.get("log_fsync_interval", loger.DEFAULT_FSYNC_INTERVAL), 0, 86400):
+        problems.append("`log_fsync_interval` must be a number of seconds between 0 and 86400 (or null)")
+    if not verify_positive_number(configuration_settings.get("log_rollup_save_interval", loger.DEFAULT_ROLLUP_SAVE_INTERVAL), 3600):
+        problems.append("`log_rollup_save_interval` must be a number of seconds above 0 and up to 3600")
+    if not isinstance(configuration_settings.get("log_compress_closed_months", retention.DEFAULT_COMPRESS_CLOSED_MONTHS), bool):
+        problems.append("`log_compress_closed_months` must be true or false")
+    log_max_age_months = configuration_settings.get("log_max_age_months", retention.DEFAULT_MAX_AGE_MONTHS)
+    if log_max_age_months is not None and not verify_number_in_range(log_max_age_months, 1, 1200):
+        problems.append("`log_max_age_months` must be a number of months between 1 and 1200 (or null)")
+    log_max_size_mb = configuration_settings.get("log_max_size_mb", retention.DEFAULT_MAX_SIZE_MB)
+    if log_max_size_mb is not None and not verify_positive_number(log_max_size_mb, 10000000):
+        problems.append("`log_max_size_mb` must be a number of MB above 0 (or null)")
+    if not verify_positive_number(configuration_settings.get("log_retention_check_interval", retention.DEFAULT_RETENTION_CHECK_INTERVAL), 604800):
+        problems.append("`log_retention_check_interval` must be a number of seconds above 0 and up to 604800")
+    if not isinstance(configuration_settings.get("probe_store", False), bool):
+        problems.append("`probe_store` must be true or false")
+    if not isinstance(configuration_settings.get("probe_store_path", probe_store.DEFAULT_PROBE_STORE_PATH), str):
+        problems.append("`probe_store_path` must be a path")
+    if not verify_number_in_range(configuration_settings.get("max_worker_threads", DEFAULT_MAX_WORKERS), 1, 1024):
+        problems.append("`max_worker_threads` must be a number between 1 and 1024")
+    metrics_settings = configuration_settings.get("metrics", {})
+    if not isinstance(metrics_settings, dict):
+        problems.append("`metrics` must be an object")
+    else:
+        if not isinstance(metrics_settings.get("enabled", False), bool):
+            problems.append("`metrics.enabled` must be true or false")
+        if not isinstance(metrics_settings.get("host", metrics.DEFAULT_METRICS_HOST), str):
+            problems.append("`metrics.host` must be an IP address or hostname")
+        if not verify_number_in_range(metrics_settings.get("port", metrics.DEFAULT_METRICS_PORT), 1, 65535):
+            problems.append("`metrics.port` must be a port number between 1 and 65535")
+    config_watch_interval = configuration_settings.get("config_watch_interval", DEFAULT_CONFIG_WATCH_INTERVAL)
+    if isinstance(config_watch_interval, bool) or not isinstance(config_watch_interval, (int, float)) or config_watch_interval < 0:
+        problems.append("`config_watch_interval` must be a number of seconds (0 to turn off watching `config.json`)")
+    if not verify_number_in_range(configuration_settings.get("dns_cache_size", dns_cache.DEFAULT_DNS_CACHE_SIZE), 0, 100000):
+        problems.append("`dns_cache_size` must be a number of hostnames between 0 and 100000 (0 turns the DNS cache off)")
+    if not verify_number_in_range(configuration_settings.get("dns_cache_max_stale", dns_cache.DEFAULT_DNS_MAX_STALE), 0, 604800):
+        problems.append("`dns_cache_max_stale` must be a number of seconds between 0 and 604800")
+    if not isinstance(configuration_settings.get("state_file", True), bool):
+        problems.append("`state_file` must be true or false")
+    if not isinstance(configuration_settings.get("state_file_path", state_file.DEFAULT_STATE_FILE_PATH), str):
+        problems.append("`state_file_path` must be a path")
+    if not verify_number_in_range(configuration_settings.get("state_save_interval", state_file.DEFAULT_STATE_SAVE_INTERVAL), 1, 86400):
+        problems.append("`state_save_interval` must be a number of seconds between 1 and 86400")
+
+    try:
+        sites = get_site_settings(configuration_settings)
+    except (KeyError, TypeError, AttributeError) as e:
+        problems.append(f"Missing setting: {e}" if isinstance(e, KeyError) else f"Invalid site settings: {e}")
+        return problems
+    if len(sites) == 0:
+        problems.append("`sites` must have at least one site")
+    site_names = set()
+    for site in sites:
+        if site["name"] in site_names:
+            problems.append(f"More than one site is named {site['name']}")
+        site_names.add(site["name"])
+        validate_site_settings(site, require_router_details, problems)
+    return problems
+
+# Check the configuration settings (a dictionary, as read from `config.json`) and turn them
+# into a `Configuration`. Raises `InvalidConfigurationError` if they are not valid.
+def load_configuration(configuration_settings, require_router_details=False):
+    problems = validate_configuration_settings(configuration_settings, require_router_details)
+    if problems:
+        raise InvalidConfigurationError(problems)
+    return Configuration(configuration_settings)
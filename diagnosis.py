@@ -0,0 +1,129 @@
+# This file is used by the program to find out where the connection is broken before it
+# reboots the router, so the router isn't rebooted for a problem it can't fix. This file is
+# not inteded to be ran by itself, but rather imported by `monitor.py`.
+# When a check cycle finds the internet connection unstable (the WAN layer), the layers
+# below it are checked, all at the same time, on the scheduler's worker threads:
+#  1. local: this computer has a network interface with a route to the router. This only
+#     asks the operating system for a route, nothing is sent.
+#  2. gateway: the router answers a ping (with the site's probe method).
+#  3. dns: a hostname can be resolved, bypassing the DNS cache.
+# The layers are then looked at in that order, and the first one that failed is the
+# diagnosis, as soon as its result (and the results of the layers below it) are in. If
+# every layer is fine, the diagnosis is "wan": the router is reachable but the internet
+# isn't. The router is only rebooted for "wan". When the local interface or the gateway is
+# down, the problem is on this side of the router (a cable, Wi-Fi, or this computer), and
+# when only DNS is failing, it is usually the ISP's name servers. Rebooting the router
+# rarely fixes either, and would only add minutes of downtime.
+
+# Import the required modules
+import socket
+import prober
+import dns_cache
+
+# The layers, from the bottom up
+LAYER_LOCAL = "local"
+LAYER_GATEWAY = "gateway"
+LAYER_DNS = "dns"
+LAYER_WAN = "wan"
+LAYERS = (LAYER_LOCAL, LAYER_GATEWAY, LAYER_DNS)
+
+# The layers where a network reboot can fix the problem
+REBOOT_LAYERS = (LAYER_WAN,)
+
+# What each diagnosis means, for messages
+LAYER_DESCRIPTIONS = {
+    LAYER_LOCAL: "this computer has no network connection (local interface)",
+    LAYER_GATEWAY: "the router is not reachable from this computer (gateway)",
+    LAYER_DNS: "the router is reachable, but DNS lookups are failing (DNS)",
+    LAYER_WAN: "the router is reachable, but the internet is not (WAN)"
+}
+
+# Get the IP address of the router, without the port (e.g. "192.168.0.1:8080" -> "192.168.0.1")
+def get_gateway_address(router_details):
+    return (router_details.get("router_ip_address") or "").partition(":")[0]
+
+# Check this computer has an interface with a route to an address. Connecting a UDP socket
+# only picks the interface and source address, no packet is sent.
+def check_local_interface(address):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.connect((address, 9))
+        return sock.getsockname()[0] != "0.0.0.0"
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+# Check a hostname can be resolved, without the DNS cache
+def check_dns(hostname):
+    try:
+        dns_cache.dns_cache.lookup(hostname)
+        return True
+    except dns_cache.DnsLookupError:
+        return False
+
+# Diagnoses which layer of a site's connection is broken, ran by a scheduler.
+#  - ping_function(address) returns the RTT in microseconds, or None (see `prober.create_prober`).
+#  - on_complete(layer) is called with the first layer that failed, or LAYER_WAN.
+# Layers with nothing to check (e.g. no router IP address) count as fine.
+class NetworkDiagnosis:
+    __slots__ = ("scheduler", "gateway_address", "dns_hostname", "ping_function", "on_complete", "results", "finished")
+
+    def __init__(self, scheduler, gateway_address, dns_hostname, ping_function, on_complete=None):
+        self.scheduler = scheduler
+        self.gateway_address = gateway_address
+        self.dns_hostname = dns_hostname
+        self.ping_function = ping_function
+        self.on_complete = on_complete
+        # The result of each layer (True if it is fine), once it is known
+        self.results = {}
+        self.finished = False
+
+    # Check all of the layers at the same time
+    def start(self):
+        checks = {
+            LAYER_LOCAL: (check_local_interface, self.gateway_address),
+            LAYER_GATEWAY: (self.check_gateway, self.gateway_address),
+            LAYER_DNS: (check_dns, self.dns_hostname)
+        }
+        for layer, (check, argument) in checks.items():
+            if not argument:
+                self.results[layer] = True
+                continue
+            # A check that raises an exception counts as failed
+            self.scheduler.run_in_executor(lambda result, layer=layer: self.on_layer_result(layer, result), check, argument, on_error=lambda error, layer=layer: self.on_layer_result(layer, False))
+        self.check_decision()
+
+    # Stop the diagnosis, the results still running are ignored
+    def cancel(self):
+        self.finished = True
+
+    # Ping the router
+    def check_gateway(self, address):
+        return prober.is_reachable(self.ping_function(address))
+
+    # Handle the result of one layer
+    def on_layer_result(self, layer, result):
+        if self.finished:
+            return
+        self.results[layer] = bool(result)
+        self.check_decision()
+
+    # Finish as soon as the lowest layer that failed is known, without waiting for the
+    # layers above it
+    def check_decision(self):
+        if self.finished:
+            return
+        for layer in LAYERS:
+            if layer not in self.results:
+                return
+            if not self.results[layer]:
+                self.finish(layer)
+                return
+        self.finish(LAYER_WAN)
+
+    # Report the diagnosis
+    def finish(self, layer):
+        self.finished = True
+        if self.on_complete:
+            self.on_complete(layer)
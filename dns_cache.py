@@ -0,0 +1,321 @@
+# This file is used by the program to resolve the hostnames in the ping list (such as
+# www.apple.com) to IP addresses, and to cache them, so a probe doesn't wait for a DNS
+# lookup every time. This file is not inteded to be ran by itself, but rather imported by
+# `prober.py`.
+# Hostnames are looked up by sending a DNS query to the name servers in /etc/resolv.conf,
+# which gives the time to live (TTL) of the answer, and the address is cached for that long.
+# If there are no name servers (e.g. on Windows) or none of them can answer (e.g. the name is
+# only in /etc/hosts), the system resolver is used, and the address is cached for
+# DEFAULT_FALLBACK_TTL seconds.
+# A background thread looks up each hostname again shortly before its TTL runs out, so probes
+# nearly always find a fresh address. If a lookup fails, the last known address is kept for
+# up to `max_stale` seconds, so a slow or broken resolver doesn't make the addresses look
+# unreachable. A hostname that can't be resolved at all is a DNS failure, which the probes
+# report separately from an unreachable address (see `prober.DNS_FAILURE`).
+# The cache holds at most `size` hostnames, the least recently used one is dropped first.
+
+# Import the required modules
+import time
+import heapq
+import random
+import socket
+import struct
+import threading
+import collections
+import loger
+
+# Default DNS cache settings
+DEFAULT_DNS_CACHE_SIZE = 256 # hostnames
+DEFAULT_DNS_MAX_STALE = 3600 # seconds
+DEFAULT_DNS_TIMEOUT = 2 # seconds
+DEFAULT_MINIMUM_TTL = 30 # seconds
+DEFAULT_MAXIMUM_TTL = 86400 # seconds
+DEFAULT_FALLBACK_TTL = 300 # seconds, when the TTL isn't known
+DEFAULT_IDLE_TIMEOUT = 3600 # seconds, hostnames that aren't used for this long aren't refreshed
+REFRESH_AHEAD = 0.8 # look a hostname up again once this much of its TTL has passed
+RESOLV_CONF_PATH = "/etc/resolv.conf"
+
+# Raised when a hostname can not be resolved
+class DnsLookupError(Exception):
+    pass
+
+# Check if an address is an IPv4 address, which doesn't need to be resolved
+def is_ip_address(address):
+    try:
+        socket.inet_pton(socket.AF_INET, address)
+        return True
+    except OSError:
+        return False
+
+# Build a DNS query for the A record of a name
+def build_dns_query(query_id, query_name):
+    header = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+    question = b"".join(bytes([len(label)]) + label.encode("ascii") for label in query_name.strip(".").split("."))
+    return header + question + b"\x00" + struct.pack("!HH", 1, 1)
+
+# Read the IPv4 name servers from /etc/resolv.conf, or an empty list if there isn't one
+def read_name_servers(path=RESOLV_CONF_PATH):
+    name_servers = []
+    try:
+        with open(path, "r") as file:
+            for line in file:
+                fields = line.split()
+                if len(fields) >= 2 and fields[0] == "nameserver" and is_ip_address(fields[1]):
+                    name_servers.append(fields[1])
+    except OSError:
+        pass
+    return name_servers
+
+# Skip over a (possibly compressed) name in a DNS message, and return the offset after it
+def skip_dns_name(data, offset):
+    while True:
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        if length == 0:
+            return offset + 1
+        offset += length + 1
+
+# Read the first IPv4 address and the TTL of the answer to an A query. The TTL is the
+# lowest one of the records in the answer (including any CNAME records on the way).
+def parse_dns_answer(data):
+    _, flags, question_count, answer_count = struct.unpack("!HHHH", data[:8])
+    if flags & 0x0200:
+        raise DnsLookupError("the answer was truncated")
+    response_code = flags & 0x000F
+    if response_code == 3:
+        raise DnsLookupError("the name does not exist")
+    if response_code != 0:
+        raise DnsLookupError(f"the name server answered with error code {response_code}")
+
+    offset = 12
+    for _ in range(question_count):
+        offset = skip_dns_name(data, offset) + 4
+    address = None
+    ttl = None
+    for _ in range(answer_count):
+        offset = skip_dns_name(data, offset)
+        record_type, record_class, record_ttl, length = struct.unpack("!HHIH", data[offset:offset + 10])
+        offset += 10
+        if record_class == 1 and record_type in (1, 5):
+            ttl = record_ttl if ttl is None else min(ttl, record_ttl)
+        if address is None and record_class == 1 and record_type == 1 and length == 4:
+            address = socket.inet_ntoa(data[offset:offset + 4])
+        offset += length
+    if address is None:
+        raise DnsLookupError("the name has no IPv4 address")
+    return address, ttl
+
+# Send an A query for a hostname to a name server, and return the address and its TTL
+def query_name_server(hostname, name_server, timeout=DEFAULT_DNS_TIMEOUT):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        query_id = random.randint(0, 0xFFFF)
+        sock.sendto(build_dns_query(query_id, hostname), (name_server, 53))
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DnsLookupError(f"no answer from {name_server}")
+            sock.settimeout(remaining)
+            data, reply_address = sock.recvfrom(4096)
+            if len(data) < 12 or reply_address[0] != name_server:
+                continue
+            reply_id, flags = struct.unpack("!HH", data[:4])
+            if reply_id == query_id and flags & 0x8000:
+                try:
+                    return parse_dns_answer(data)
+                except (struct.error, IndexError):
+                    raise DnsLookupError(f"the answer from {name_server} could not be read")
+    except socket.timeout:
+        raise DnsLookupError(f"no answer from {name_server}")
+    except OSError as e:
+        raise DnsLookupError(f"could not query {name_server}: {e}")
+    finally:
+        sock.close()
+
+# Look a hostname up, and return its address and TTL (None if the system resolver was used)
+def lookup_hostname(hostname, name_servers, timeout=DEFAULT_DNS_TIMEOUT):
+    error = None
+    for name_server in name_servers:
+        try:
+            return query_name_server(hostname, name_server, timeout)
+        except (DnsLookupError, UnicodeError, ValueError) as e:
+            error = error or e
+    # The system resolver also knows about /etc/hosts, mDNS, etc.
+    try:
+        return socket.gethostbyname(hostname), None
+    except (OSError, UnicodeError) as e:
+        raise DnsLookupError(str(error or e))
+
+# A cached address
+class DnsCacheEntry:
+    __slots__ = ("address", "ttl", "expires_at", "refresh_at", "last_used", "failing")
+
+    def __init__(self):
+        self.address = None
+        self.ttl = None
+        self.expires_at = 0
+        self.refresh_at = None
+        self.last_used = 0
+        self.failing = False
+
+# Resolves hostnames, caches the addresses for their TTL and keeps them fresh in the background.
+# It is used from the worker threads that run the probes, so all of its state is behind a lock.
+class DnsCache:
+    def __init__(self, size=DEFAULT_DNS_CACHE_SIZE, max_stale=DEFAULT_DNS_MAX_STALE, timeout=DEFAULT_DNS_TIMEOUT, name_servers=None):
+        self.size = size
+        self.max_stale = max_stale
+        self.timeout = timeout
+        # Read from /etc/resolv.conf the first time they are needed
+        self.name_servers = name_servers
+        self.entries = collections.OrderedDict()
+        # When each hostname should be looked up again, as a heap of (time, hostname)
+        self.refresh_times = []
+        self.condition = threading.Condition()
+        self.refresher = None
+
+    # Look a hostname up with the configured name servers
+    def lookup(self, hostname):
+        if self.name_servers is None:
+            self.name_servers = read_name_servers()
+        address, ttl = lookup_hostname(hostname, self.name_servers, self.timeout)
+        if ttl is None:
+            ttl = DEFAULT_FALLBACK_TTL
+        return address, min(max(ttl, DEFAULT_MINIMUM_TTL), DEFAULT_MAXIMUM_TTL)
+
+    # Resolve an address to an IPv4 address, or return None if it can't be resolved
+    def resolve(self, address):
+        if is_ip_address(address):
+            return address
+        if self.size <= 0:
+            try:
+                return self.lookup(address)[0]
+            except DnsLookupError:
+                return None
+
+        now = time.monotonic()
+        stale_address = None
+        with self.condition:
+            entry = self.entries.get(address)
+            if entry is not None:
+                self.entries.move_to_end(address)
+                entry.last_used = now
+                if now < entry.expires_at:
+                    # Hostnames that were idle aren't being refreshed, start again
+                    if entry.refresh_at is None:
+                        self.schedule_refresh(address, entry, entry.expires_at - entry.ttl * (1 - REFRESH_AHEAD))
+                    return entry.address
+                if now < entry.expires_at + self.max_stale:
+                    # The background lookups are failing, don't wait for another one
+                    if entry.failing:
+                        return entry.address
+                    stale_address = entry.address
+
+        try:
+            resolved_address, ttl = self.lookup(address)
+        except DnsLookupError as e:
+            if stale_address is None:
+                return None
+            self.lookup_failed(address, e)
+            return stale_address
+        self.store(address, resolved_address, ttl)
+        return resolved_address
+
+    # Cache the address of a hostname, and schedule the lookup that will refresh it
+    def store(self, hostname, address, ttl):
+        now = time.monotonic()
+        with self.condition:
+            entry = self.entries.get(hostname)
+            if entry is None:
+                entry = self.entries[hostname] = DnsCacheEntry()
+                entry.last_used = now
+                while len(self.entries) > self.size:
+                    self.entries.popitem(last=False)
+            if entry.failing:
+                entry.failing = False
+                loger.write_to_log_file("success", f"Resolved {hostname} again - {address}")
+            entry.address = address
+            entry.ttl = ttl
+            entry.expires_at = now + ttl
+            self.schedule_refresh(hostname, entry, now + ttl * REFRESH_AHEAD)
+
+    # A lookup failed while the last known address can still be used: keep using it, and try
+    # again after the minimum TTL
+    def lookup_failed(self, hostname, error):
+        with self.condition:
+            entry = self.entries.get(hostname)
+            if entry is None:
+                return
+            if not entry.failing:
+                entry.failing = True
+                loger.write_to_log_file("error", f"Could not resolve {hostname} ({error}), using its last known address {entry.address}")
+            self.schedule_refresh(hostname, entry, time.monotonic() + DEFAULT_MINIMUM_TTL)
+
+    # Add a refresh to the heap, and start the background thread the first time (the lock must be held)
+    def schedule_refresh(self, hostname, entry, refresh_at):
+        entry.refresh_at = refresh_at
+        heapq.heappush(self.refresh_times, (refresh_at, hostname))
+        if self.refresher is None:
+            self.refresher = threading.Thread(target=self.refresh_loop, name="dns-refresher", daemon=True)
+            self.refresher.start()
+        self.condition.notify()
+
+    # Wait for the next hostname that is due to be refreshed (the lock must be held)
+    def next_due_refresh(self):
+        while True:
+            if not self.refresh_times:
+                self.condition.wait()
+                continue
+            refresh_at, hostname = self.refresh_times[0]
+            delay = refresh_at - time.monotonic()
+            if delay > 0:
+                self.condition.wait(delay)
+                continue
+            heapq.heappop(self.refresh_times)
+            entry = self.entries.get(hostname)
+            # Skip hostnames that have been dropped from the cache or rescheduled since
+            if entry is None or entry.refresh_at != refresh_at:
+                continue
+            # Stop refreshing hostnames that are no longer used, until they are used again
+            if time.monotonic() - entry.last_used > DEFAULT_IDLE_TIMEOUT:
+                entry.refresh_at = None
+                continue
+            return hostname
+
+    # Use new settings, keeping the most recently used addresses that still fit
+    def configure(self, size, max_stale):
+        with self.condition:
+            self.size = size
+            self.max_stale = max_stale
+            while len(self.entries) > max(0, size):
+                self.entries.popitem(last=False)
+
+    # Look the cached hostnames up again before their TTL runs out, on the background thread
+    def refresh_loop(self):
+        while True:
+            with self.condition:
+                hostname = self.next_due_refresh()
+            try:
+                address, ttl = self.lookup(hostname)
+            except DnsLookupError as e:
+                self.lookup_failed(hostname, e)
+                continue
+            self.store(hostname, address, ttl)
+
+# The DNS cache used by the probes
+dns_cache = DnsCache()
+
+# Replace the DNS cache with one with these settings (`size` 0 turns caching off)
+def configure_dns_cache(size=DEFAULT_DNS_CACHE_SIZE, max_stale=DEFAULT_DNS_MAX_STALE):
+    global dns_cache
+    dns_cache = DnsCache(size, max_stale)
+
+# Change the settings of the DNS cache in use (e.g. after a configuration reload), without
+# losing the cached addresses or starting another background thread
+def reconfigure_dns_cache(size=DEFAULT_DNS_CACHE_SIZE, max_stale=DEFAULT_DNS_MAX_STALE):
+    dns_cache.configure(size, max_stale)
+
+# Resolve an address (IP address or hostname) to an IPv4 address, or None if it can't be resolved
+def resolve(address):
+    return dns_cache.resolve(address)
@@ -0,0 +1,493 @@
+# This file is a small web server for viewing the log files in `logs.html` through a web
+# browser, without loading whole log files into the page. It is ran by itself (it does
+# not need the rest of the program to be running), from the same folder as `main.py`:
+#   python log_server.py          (then open http://127.0.0.1:8000/logs.html)
+#   python log_server.py 8080     (use another port)
+# It only serves `logs.html` and the files in the `logs` folder (everything else in the
+# program's folder, such as `config.json` and `state.json`, has passwords or tokens in it), and:
+#  - `/api/logs`: the years and months that have log files, found by scanning `logs/`.
+#  - `/api/logs/{year}/{month}`: one page of the log entries of a month, newest first,
+#    filtered by status, time range and message. The query parameters are `offset`,
+#    `limit`, `status`, `from` and `to` (ISO timestamps, `to` not included), `search` and
+#    `order` (`newest` or `oldest`).
+# For JSON Lines log files, the server keeps an index of where each line starts in the
+# file (a byte offset), which only has to be extended as the file grows. A page of log
+# entries is read straight from those offsets, the time range is found by binary searching
+# the timestamps, and the status and message filters are checked on the raw bytes of a line
+# before it is parsed. The timestamps are local time, so they go back an hour when daylight
+# saving time ends (or whenever the clock is turned back): a log file where that happened
+# has its time range found by checking every line instead. JSON log files are one JSON
+# array, so they are parsed once and kept until they change. Compressed log files (closed
+# months, see `retention.py`) are decompressed once and kept until they change. If a month
+# has more than one log file (the log format was changed during it), they are read as one.
+# Damaged log lines (e.g. a line cut short by a crash) are skipped.
+
+# Import the required modules
+import os
+import sys
+import json
+import gzip
+import mmap
+import array
+import bisect
+import threading
+import posixpath
+from urllib.parse import urlparse, parse_qs, unquote
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import loger
+
+# Default log server settings
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# The log file extensions, in the order they are looked for
+LOG_FILE_EXTENSIONS = (".jsonl", ".json", ".jsonl.gz", ".json.gz")
+
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+
+# Every log line written by `loger.py` starts with this, followed by the timestamp
+TIMESTAMP_PREFIX = b'{"timestamp": "'
+
+# The log file indexes, by path
+log_file_indexes = {}
+log_file_indexes_lock = threading.Lock()
+
+# The years and months that have a log file, e.g. {"2025": ["January", "February"]}
+def list_available_logs(logs_path="logs"):
+    available_logs = {}
+    if not os.path.isdir(logs_path):
+        return available_logs
+    for year in sorted(os.listdir(logs_path)):
+        year_path = os.path.join(logs_path, year)
+        if not year.isdigit() or not os.path.isdir(year_path):
+            continue
+        file_names = set(os.listdir(year_path))
+        months = [month for month in MONTHS if any(month + extension in file_names for extension in LOG_FILE_EXTENSIONS)]
+        if months:
+            available_logs[year] = months
+    return available_logs
+
+# The paths of the log files of a year and month. There is usually one, but there are more
+# if the log format was changed during the month (e.g. `March.json` and `March.jsonl`).
+def find_log_files(year, month, logs_path="logs"):
+    if not year.isdigit() or month not in MONTHS:
+        return []
+    log_file_paths = [os.path.join(logs_path, year, month + extension) for extension in LOG_FILE_EXTENSIONS]
+    return [log_file_path for log_file_path in log_file_paths if os.path.exists(log_file_path)]
+
+# The timestamp of a log line, without parsing the whole line. A damaged line has an
+# unknown timestamp, which is an empty string.
+def get_line_timestamp(line):
+    try:
+        if line.startswith(TIMESTAMP_PREFIX):
+            end = line.find(b'"', len(TIMESTAMP_PREFIX))
+            if end != -1:
+                return line[len(TIMESTAMP_PREFIX):end].decode()
+        entry = json.loads(line)
+    except ValueError:
+        return ""
+    timestamp = entry.get("timestamp") if isinstance(entry, dict) else None
+    return timestamp if isinstance(timestamp, str) else ""
+
+# Check that timestamps never go backwards, carrying on from `last_timestamp`. An unknown
+# timestamp counts as going backwards, since it can't be placed. Returns whether they are in
+# time order, and the last timestamp.
+def check_time_order(timestamps, last_timestamp):
+    for timestamp in timestamps:
+        if not timestamp or timestamp < last_timestamp:
+            return False, last_timestamp
+        last_timestamp = timestamp
+    return True, last_timestamp
+
+# The timestamps of the lines in `data` that start at `offsets[first:]` (`base` is where
+# `data` starts in the file)
+def get_new_line_timestamps(data, offsets, first, base=0):
+    for number in range(first, len(offsets) - 1):
+        yield get_line_timestamp(data[offsets[number] - base:offsets[number + 1] - base].strip())
+
+# The byte offsets of the lines of a JSON Lines log file, extended as the file grows
+class JsonLinesIndex:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # offsets[i] is where line i starts, and offsets[-1] is where the indexed part ends
+        self.offsets = array.array("Q", [0])
+        self.file_id = None
+        # Whether the timestamps of the indexed lines never go backwards, and the last of them
+        self.in_order = True
+        self.last_timestamp = ""
+
+    # Index the lines added since the last update (or start again if the file was replaced)
+    def update(self):
+        with self.lock:
+            status = os.stat(self.path)
+            file_id = (status.st_dev, status.st_ino)
+            if file_id != self.file_id or status.st_size < self.offsets[-1]:
+                self.offsets = array.array("Q", [0])
+                self.file_id = file_id
+                self.in_order = True
+                self.last_timestamp = ""
+            if status.st_size == self.offsets[-1]:
+                return
+            with open(self.path, "rb") as file:
+                file.seek(self.offsets[-1])
+                data = file.read(status.st_size - self.offsets[-1])
+            # Only index whole lines, a line that is still being written is indexed next time
+            base = self.offsets[-1]
+            first = len(self.offsets) - 1
+            position = data.find(b"\n")
+            while position != -1:
+                self.offsets.append(base + position + 1)
+                position = data.find(b"\n", position + 1)
+            if self.in_order:
+                self.in_order, self.last_timestamp = check_time_order(get_new_line_timestamps(data, self.offsets, first, base), self.last_timestamp)
+
+    # The number of lines in the index
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    # Open the indexed part of the file for reading lines and entries
+    def open(self):
+        with self.lock:
+            return JsonLinesReader(self.path, self.offsets, len(self), self.in_order)
+
+# The byte offsets of the lines of a compressed JSON Lines log file. Closed months don't
+# change, so the file is decompressed once, and kept in memory with its line offsets.
+class CompressedJsonLinesIndex:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = b""
+        self.offsets = array.array("Q", [0])
+        self.file_key = None
+        self.in_order = True
+
+    def update(self):
+        with self.lock:
+            status = os.stat(self.path)
+            file_key = (status.st_ino, status.st_size, status.st_mtime_ns)
+            if file_key == self.file_key:
+                return
+            with gzip.open(self.path, "rb") as file:
+                data = file.read()
+            offsets = array.array("Q", [0])
+            position = data.find(b"\n")
+            while position != -1:
+                offsets.append(position + 1)
+                position = data.find(b"\n", position + 1)
+            self.data = data
+            self.offsets = offsets
+            self.file_key = file_key
+            self.in_order = check_time_order(get_new_line_timestamps(data, offsets, 0), "")[0]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def open(self):
+        with self.lock:
+            return JsonLinesReader(self.data, self.offsets, len(self), self.in_order)
+
+# Reads the lines of an indexed JSON Lines log file, from a path (the file is memory-mapped)
+# or from the decompressed bytes of a compressed log file
+class JsonLinesReader:
+    def __init__(self, source, offsets, count, in_order):
+        # Lines indexed after the reader was opened are not read, the offsets are only ever appended to
+        self.offsets = offsets
+        self.count = count
+        self.in_order = in_order
+        self.file = None
+        self.map = source
+        if isinstance(source, str):
+            self.file = open(source, "rb")
+            self.map = mmap.mmap(self.file.fileno(), offsets[count], access=mmap.ACCESS_READ) if offsets[count] else b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        if self.file is not None:
+            if self.map:
+                self.map.close()
+            self.file.close()
+
+    def line(self, number):
+        return self.map[self.offsets[number]:self.offsets[number + 1]].strip()
+
+    def timestamp(self, number):
+        return get_line_timestamp(self.line(number))
+
+    # The entry of a line, or None if the line is damaged
+    def entry(self, number):
+        try:
+            entry = json.loads(self.line(number))
+        except ValueError:
+            return None
+        return entry if isinstance(entry, dict) else None
+
+# The entries of a JSON log file (one JSON array), parsed again only when the file changes
+class JsonArrayIndex:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = []
+        self.file_key = None
+        self.in_order = True
+
+    def update(self):
+        with self.lock:
+            status = os.stat(self.path)
+            file_key = (status.st_ino, status.st_size, status.st_mtime_ns)
+            if file_key != self.file_key:
+                self.entries = loger.read_log_file(self.path)
+                self.file_key = file_key
+                self.in_order = check_time_order((entry.get("timestamp", "") for entry in self.entries), "")[0]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def open(self):
+        with self.lock:
+            return JsonArrayReader(self.entries, self.in_order)
+
+# Reads the entries of a JSON log file, the same way as `JsonLinesReader`
+class JsonArrayReader:
+    def __init__(self, entries, in_order):
+        self.entries = entries
+        self.count = len(entries)
+        self.in_order = in_order
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        pass
+
+    # There are no raw lines to check before parsing, the entries are already parsed
+    def line(self, number):
+        return None
+
+    def timestamp(self, number):
+        return self.entries[number].get("timestamp", "")
+
+    def entry(self, number):
+        return self.entries[number]
+
+# Get the index of a log file, updated to the end of the file
+def get_log_file_index(log_file_path):
+    with log_file_indexes_lock:
+        index = log_file_indexes.get(log_file_path)
+        if index is None:
+            if log_file_path.endswith(".jsonl"):
+                index = JsonLinesIndex(log_file_path)
+            elif log_file_path.endswith(".jsonl.gz"):
+                index = CompressedJsonLinesIndex(log_file_path)
+            else:
+                # JSON arrays, compressed or not, are parsed by `loger.read_log_file`
+                index = JsonArrayIndex(log_file_path)
+            log_file_indexes[log_file_path] = index
+    index.update()
+    return index
+
+# Reads the log files of a month as one, in the order of their first timestamps
+class MergedReader:
+    def __init__(self, readers):
+        self.all_readers = readers
+        self.readers = sorted((reader for reader in readers if reader.count), key=lambda reader: reader.timestamp(0))
+        # starts[i] is the number of the first entry of readers[i]
+        self.starts = []
+        self.count = 0
+        for reader in self.readers:
+            self.starts.append(self.count)
+            self.count += reader.count
+        self.in_order = all(reader.in_order for reader in self.readers) and all(
+            previous.timestamp(previous.count - 1) <= reader.timestamp(0) for previous, reader in zip(self.readers, self.readers[1:])
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        for reader in self.all_readers:
+            reader.__exit__(*exception)
+
+    # The reader an entry is in, and its number in that reader
+    def find_reader(self, number):
+        reader_number = bisect.bisect_right(self.starts, number) - 1
+        return self.readers[reader_number], number - self.starts[reader_number]
+
+    def line(self, number):
+        reader, number = self.find_reader(number)
+        return reader.line(number)
+
+    def timestamp(self, number):
+        reader, number = self.find_reader(number)
+        return reader.timestamp(number)
+
+    def entry(self, number):
+        reader, number = self.find_reader(number)
+        return reader.entry(number)
+
+# Open the log files of a month for reading, updated to the end of each file
+def open_log_files(log_file_paths):
+    readers = []
+    for log_file_path in log_file_paths:
+        try:
+            readers.append(get_log_file_index(log_file_path).open())
+        except FileNotFoundError:
+            # Removed since it was found, e.g. by `retention.py` once it was compressed
+            continue
+    return readers[0] if len(readers) == 1 else MergedReader(readers)
+
+# The number of the first entry with a timestamp of at least `timestamp`
+def find_entry(reader, timestamp):
+    low = 0
+    high = reader.count
+    while low < high:
+        middle = (low + high) // 2
+        if reader.timestamp(middle) < timestamp:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+# Whether a log entry matches the status and message filters
+def entry_matches(entry, status, search):
+    if status is not None and entry.get("status") != status:
+        return False
+    if search is not None and search not in entry.get("log", {}).get("message", "").lower():
+        return False
+    return True
+
+# Get one page of the log entries of the log files of a month. Returns the number of
+# entries that match the filters, and the entries of the page.
+def query_log_files(log_file_paths, offset=0, limit=DEFAULT_PAGE_SIZE, status=None, start=None, end=None, search=None, newest_first=True):
+    if search is not None:
+        search = search.lower()
+
+    # The raw bytes the lines of matching entries must have, so most lines never have to be
+    # parsed. JSON escapes non-ASCII characters, quotes and backslashes, so a search with any
+    # of those can only be checked on the parsed entry.
+    status_bytes = None if status is None else json.dumps({"status": status})[1:-1].encode()
+    search_bytes = None
+    if search is not None and search.isascii() and '"' not in search and "\\" not in search:
+        search_bytes = search.encode()
+
+    with open_log_files(log_file_paths) as reader:
+        if reader.in_order:
+            first = 0 if start is None else find_entry(reader, start)
+            last = reader.count if end is None else find_entry(reader, end)
+            numbers = range(first, last)
+        else:
+            # A binary search could miss entries when the timestamps go backwards
+            numbers = range(reader.count)
+            if start is not None or end is not None:
+                numbers = [number for number in numbers if (start is None or start <= reader.timestamp(number)) and (end is None or reader.timestamp(number) < end)]
+        if newest_first:
+            numbers = numbers[::-1]
+
+        # Without status and message filters, the page can be read straight from the index
+        if status is None and search is None:
+            entries = [reader.entry(number) for number in numbers[offset:offset + limit]]
+            return len(numbers), [entry for entry in entries if entry is not None]
+
+        total = 0
+        entries = []
+        for number in numbers:
+            line = reader.line(number)
+            if line is not None:
+                if status_bytes is not None and status_bytes not in line:
+                    continue
+                if search_bytes is not None and search_bytes not in line.lower():
+                    continue
+            # Only parse the entries that could match, or are needed for the page
+            entry = reader.entry(number)
+            if entry is None or not entry_matches(entry, status, search):
+                continue
+            if offset <= total < offset + limit:
+                entries.append(entry)
+            total += 1
+        return total, entries
+
+# Check if a file can be served: only `logs.html` and the files in the `logs` folder are
+def is_served_path(path):
+    path = unquote(path).replace("\\", "/")
+    if ".." in path.split("/"):
+        return False
+    path = posixpath.normpath(path)
+    return path in ("/logs.html", "/logs") or path.startswith("/logs/")
+
+# Handles the requests to the log server
+class LogRequestHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/api/logs":
+            self.send_json(list_available_logs())
+        elif url.path.startswith("/api/logs/"):
+            self.send_log_entries(url)
+        elif is_served_path(url.path):
+            super().do_GET()
+        else:
+            self.send_error(404)
+
+    def do_HEAD(self):
+        if is_served_path(urlparse(self.path).path):
+            super().do_HEAD()
+        else:
+            self.send_error(404)
+
+    # Send one page of the log entries of a month
+    def send_log_entries(self, url):
+        parts = url.path.split("/")
+        if len(parts) != 5:
+            self.send_error(404)
+            return
+        log_file_paths = find_log_files(parts[3], parts[4])
+        if not log_file_paths:
+            self.send_error(404, "No log file for this month")
+            return
+
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            offset = max(0, int(query.get("offset", 0)))
+            limit = min(MAX_PAGE_SIZE, max(1, int(query.get("limit", DEFAULT_PAGE_SIZE))))
+        except ValueError:
+            self.send_error(400, "offset and limit must be numbers")
+            return
+        total, entries = query_log_files(
+            log_file_paths,
+            offset,
+            limit,
+            status=query.get("status") or None,
+            start=query.get("from") or None,
+            end=query.get("to") or None,
+            search=query.get("search") or None,
+            newest_first=query.get("order", "newest") != "oldest"
+        )
+        self.send_json({"total": total, "offset": offset, "entries": entries})
+
+    def send_json(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+# Run the log server until it is stopped (Ctrl + C)
+def run_log_server(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    server = ThreadingHTTPServer((host, port), LogRequestHandler)
+    print(f"Serving the logs on http://{host}:{port}/logs.html (press Ctrl + C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    host = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_HOST
+    run_log_server(host, port)
@@ -10,11 +10,289 @@
 
 # Import the required modules
 import os
+import sys
 import json
+import gzip
+import time
+import queue
+import atexit
 import datetime
+import threading
+import rollups
+import tracing
 
-# Initials a log file for the current month in the logs/{year} folder
-def Initialise_log_file():
+# The storage format of the log files, set by `Initialise_log_file`:
+#  - "json": the whole month is one JSON array ({month}.json). Every write has to
+#    load and rewrite the whole file, so it gets slower as the month goes on.
+#  - "jsonl": JSON Lines ({month}.jsonl), one log entry per line. Every write is a
+#    single append of one line, no matter how big the file is.
+LOG_FORMATS = {"json": ".json", "jsonl": ".jsonl"}
+log_format = "json"
+
+# Get the path of the log file for a year and month in the given log format
+def get_log_file_path(year, month, file_format=None):
+    if file_format is None:
+        file_format = log_format
+    return f"logs/{year}/{month}{LOG_FORMATS[file_format]}"
+
+# Get the path of the log file for the current month
+def get_current_log_file_path():
+    now = datetime.datetime.now()
+    return get_log_file_path(now.year, now.strftime("%B"))
+
+# Default background log writer settings
+DEFAULT_FLUSH_INTERVAL = 1 # seconds
+DEFAULT_BATCH_SIZE = 100 # log entries
+DEFAULT_FSYNC_INTERVAL = 60 # seconds
+DEFAULT_QUEUE_SIZE = 10000 # log entries
+DEFAULT_ROLLUP_SAVE_INTERVAL = 10 # seconds
+# How much of a log file is read at a time when checking it for a partly written line when
+# logging starts, longer lines are not log entries
+RECOVERY_TAIL_SIZE = 65536 # bytes
+
+# The background log writer, None until `Initialise_log_file` is called (logging is off)
+log_writer = None
+# Whether logging is on, without the background log writer every write is done straight away
+logging_enabled = False
+# Where log entries are also written as JSON Lines (daemon mode), None if they aren't
+stdout_stream = None
+# The rollups of the month being logged (see `rollups.py`), only used by the log writer thread when there is one
+log_rollups = rollups.Rollups()
+
+# Writes log entries to the log files on a background thread, so the program never has to
+# wait for the disk. Log entries are put on a bounded queue and written in batches, once
+# per flush interval or every `batch_size` entries (whichever comes first), with one write
+# per log file per batch. The files are synced to the disk (fsync) at most once every
+# `fsync_interval` seconds (0 to sync every batch, None to leave it to the system), which
+# keeps writes to SD cards down. Rollup events are added to the rollups of the month on the
+# same thread, and the rollup files are written at most once every `rollup_save_interval`
+# seconds, and whenever the queue is flushed. If the disk is so slow that the queue fills up, new log
+# entries are dropped (and the number dropped is logged) rather than blocking the program.
+class LogWriter(threading.Thread):
+    def __init__(self, flush_interval=DEFAULT_FLUSH_INTERVAL, batch_size=DEFAULT_BATCH_SIZE, fsync_interval=DEFAULT_FSYNC_INTERVAL, queue_size=DEFAULT_QUEUE_SIZE, rollup_save_interval=DEFAULT_ROLLUP_SAVE_INTERVAL):
+        super().__init__(name="log-writer", daemon=True)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.rollup_save_interval = rollup_save_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.last_fsync = time.monotonic()
+        self.last_rollup_save = time.monotonic()
+        self.dropped_entries = 0
+        self.closed = False
+
+    # Add a log entry to the queue (called from any thread, never blocks)
+    def put(self, log_file_path, entry):
+        try:
+            self.queue.put_nowait((log_file_path, entry))
+        except queue.Full:
+            self.dropped_entries += 1
+
+    # Add a rollup event to the queue (called from any thread, never blocks)
+    def put_rollup_event(self, moment, event, rtt):
+        try:
+            self.queue.put_nowait(("rollup", (moment, event, rtt)))
+        except queue.Full:
+            self.dropped_entries += 1
+
+    # Write everything in the queue, and wait for it to be written
+    def flush(self, timeout=None):
+        if not self.is_alive():
+            return
+        done = threading.Event()
+        self.queue.put(("flush", done))
+        done.wait(timeout)
+
+    # Write everything in the queue and stop the thread
+    def close(self, timeout=10):
+        if self.closed:
+            return
+        self.closed = True
+        if self.is_alive():
+            self.queue.put(("close", None))
+            self.join(timeout)
+
+    def run(self):
+        while True:
+            batch = []
+            command = None
+            # Wait for the first entry of the batch, then collect entries until the batch
+            # is full or the flush interval has passed
+            item = self.queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item[0] in ("flush", "close"):
+                    command = item
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if self.dropped_entries:
+                dropped_entries, self.dropped_entries = self.dropped_entries, 0
+                batch.append((get_current_log_file_path(), create_log_entry("error", f"{dropped_entries} log entries were dropped, the log writer could not keep up")))
+            force_fsync = command is not None and command[0] == "close"
+            try:
+                self.write_batch(batch, force_fsync, command is not None)
+            except Exception as e:
+                # Keep the writer running, a failed write must not stop the logging
+                print("Error writing to the log file:", e)
+
+            if command is not None:
+                if command[0] == "flush":
+                    command[1].set()
+                else:
+                    return
+
+    # Write a batch of log entries, grouped by log file, and add the rollup events to the rollups
+    @tracing.traced("log.flush")
+    def write_batch(self, batch, force_fsync=False, save_rollups=False):
+        entries_by_path = {}
+        for log_file_path, entry in batch:
+            if log_file_path == "rollup":
+                log_rollups.add(*entry)
+            else:
+                entries_by_path.setdefault(log_file_path, []).append(entry)
+
+        fsync = force_fsync or (self.fsync_interval is not None and time.monotonic() - self.last_fsync >= self.fsync_interval)
+        for log_file_path, entries in entries_by_path.items():
+            write_log_entries(log_file_path, entries, fsync)
+        if fsync:
+            self.last_fsync = time.monotonic()
+
+        if save_rollups or time.monotonic() - self.last_rollup_save >= self.rollup_save_interval:
+            log_rollups.save()
+            self.last_rollup_save = time.monotonic()
+
+# Write log entries to a log file straight away, creating the file (and its folder) if needed.
+# Neither format can be left half written if the program is killed part way through:
+#  - "jsonl": the entries are appended in one write, and if the write fails the file is cut
+#    back to where it was. If the program is killed during the write, the torn line at the
+#    end is cut off by `recover_log_file` when logging starts again.
+#  - "json": the whole array is written to a temporary file, which then replaces the log
+#    file in one step (`os.replace`), so the log file is always either the old or new array.
+def write_log_entries(log_file_path, entries, fsync=False):
+    os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
+
+    if log_file_path.endswith(".jsonl"):
+        # Append the new log entries as lines, the rest of the file is never read
+        with open(log_file_path, "ab") as file:
+            size = file.tell()
+            try:
+                file.write("".join(json.dumps(entry) + "\n" for entry in entries).encode())
+                file.flush()
+                if fsync:
+                    os.fsync(file.fileno())
+            except OSError:
+                # Don't leave part of a line for the next write to be added to (e.g. the disk is full)
+                file.truncate(size)
+                raise
+        return
+
+    # Open the log file for the current month
+    data = []
+    if os.path.exists(log_file_path):
+        try:
+            with open(log_file_path, "r") as file:
+                # Load the data from the file
+                data = json.load(file)
+        except ValueError:
+            # A log file damaged before writes were made atomic, keep it for the user and start a new one
+            damaged_path = f"{log_file_path}.damaged-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+            os.replace(log_file_path, damaged_path)
+            entries = [create_log_entry("error", f"The log file was damaged, it was moved to {damaged_path}")] + entries
+    # Append the new log data to the list
+    data.extend(entries)
+    # Write the new data to a temporary file, then replace the log file with it
+    temporary_path = log_file_path + ".tmp"
+    with open(temporary_path, "w") as file:
+        json.dump(data, file, indent=4)
+        if fsync:
+            file.flush()
+            os.fsync(file.fileno())
+    os.replace(temporary_path, log_file_path)
+
+# Find where the line that ends at `end` starts in a file (the byte after the newline before
+# it, or 0), reading backwards `chunk_size` bytes at a time
+def find_line_start(file, end, chunk_size=RECOVERY_TAIL_SIZE):
+    # The line's own newline isn't where it starts
+    position = end - 1
+    while position > 0:
+        start = max(0, position - chunk_size)
+        file.seek(start)
+        newline = file.read(position - start).rfind(b"\n")
+        if newline >= 0:
+            return start + newline + 1
+        position = start
+    return 0
+
+# Check the end of a JSON Lines log file after the program was stopped without warning (a crash
+# or power cut), and cut off any line at the end that was only partly written. Only the lines
+# at the end are read, so this is fast however large the file is. A line longer than
+# `tail_size` is never a log entry (they are a few hundred bytes), it is usually the zeros a
+# power cut can leave at the end of a file, so it is cut off without being read. Returns the
+# number of bytes cut off.
+def recover_log_file(log_file_path, tail_size=RECOVERY_TAIL_SIZE):
+    if not log_file_path.endswith(".jsonl") or not os.path.exists(log_file_path):
+        return 0
+    with open(log_file_path, "r+b") as file:
+        size = file.seek(0, os.SEEK_END)
+
+        # Walk back over the lines at the end, until one is whole
+        end = size
+        while end > 0:
+            line_start = find_line_start(file, end, tail_size)
+            if end - line_start <= tail_size:
+                file.seek(line_start)
+                line = file.read(end - line_start)
+                if line.endswith(b"\n") and is_whole_log_line(line):
+                    break
+            end = line_start
+
+        if end < size:
+            file.truncate(end)
+            file.flush()
+            os.fsync(file.fileno())
+        return size - end
+
+# Whether a line of a JSON Lines log file was completely written. Every log entry is a JSON
+# object, which can't be cut short and still be one, so a line is whole if it ends with its
+# newline and is a JSON object. A torn line that happens to be valid JSON (e.g. a number cut
+# short) is not an object, and is cut off like any other torn line.
+def is_whole_log_line(line):
+    if not line.strip():
+        return True
+    try:
+        return isinstance(json.loads(line), dict)
+    except ValueError:
+        return False
+
+# Write everything in the background log writer's queue to the log files, and wait for it
+def flush_log_file(timeout=None):
+    if log_writer is not None:
+        log_writer.flush(timeout)
+
+# Write everything in the background log writer's queue and stop it (ran when the program exits)
+def close_log_file():
+    global log_writer
+    if log_writer is not None:
+        log_writer.close()
+        log_writer = None
+
+# Initials a log file for the current month in the logs/{year} folder, and turns logging on.
+# With `buffered`, log entries are written by a background log writer (see `LogWriter`).
+def Initialise_log_file(file_format="json", buffered=True, flush_interval=DEFAULT_FLUSH_INTERVAL, batch_size=DEFAULT_BATCH_SIZE, fsync_interval=DEFAULT_FSYNC_INTERVAL, rollup_save_interval=DEFAULT_ROLLUP_SAVE_INTERVAL):
+    global log_format, log_writer, logging_enabled
+    if file_format not in LOG_FORMATS:
+        raise ValueError(f"Unknown log format: {file_format} (expected one of: {', '.join(LOG_FORMATS)})")
+    log_format = file_format
     # Get the current date
     now = datetime.datetime.now()
     # Get the current year
@@ -24,9 +302,26 @@ def Initialise_log_file():
     # Create the folder if it doesn't exist
     if not os.path.exists(f"logs/{year}"):
         os.makedirs(f"logs/{year}")
-    # Create the log file for the current month
-    with open(f"logs/{year}/{month}.json", "w") as file:
-        file.write("[]")
+    # Create the log file for the current month, an existing log file is never emptied
+    # (the program may have been restarted part way through the month)
+    recovered_bytes = 0
+    if log_format == "jsonl":
+        # JSON Lines files are only ever appended to, so just make sure the file exists
+        with open(get_log_file_path(year, month), "a"):
+            pass
+        recovered_bytes = recover_log_file(get_log_file_path(year, month))
+    elif not os.path.exists(get_log_file_path(year, month)):
+        with open(get_log_file_path(year, month), "w") as file:
+            file.write("[]")
+
+    logging_enabled = True
+    close_log_file()
+    if buffered:
+        log_writer = LogWriter(flush_interval, batch_size, fsync_interval, rollup_save_interval=rollup_save_interval)
+        log_writer.start()
+        atexit.register(close_log_file)
+    if recovered_bytes:
+        write_to_log_file("error", f"The last log entry was only partly written (the program was stopped without warning), {recovered_bytes} bytes were removed")
 
 # [
 #     {
@@ -46,19 +341,11 @@ def Initialise_log_file():
 # internet_connection: yes, no, n/a
 # network_reboot: yes, no, n/a
 
-def write_to_log_file(status, message, ping_status = "n/a", internet_connection = "n/a", network_reboot = "n/a"):
+# Create a log entry, timestamped now
+def create_log_entry(status, message, ping_status = "n/a", internet_connection = "n/a", network_reboot = "n/a"):
     # Get the current date and time in the ISO format
     timestamp = datetime.datetime.now().isoformat()
-    # Get the current year
-    year = datetime.datetime.now().year
-    # Get the current month
-    month = datetime.datetime.now().strftime("%B")
-    # Open the log file for the current month
-    with open(f"logs/{year}/{month}.json", "r") as file:
-        # Load the data from the file
-        data = json.load(file)
-    # Append the new log data to the list
-    data.append({
+    return {
         "timestamp": timestamp,
         "status": status,
         "log": {
@@ -67,14 +354,116 @@ def write_to_log_file(status, message, ping_status = "n/a", internet_connection
             "internet_connection": internet_connection,
             "network_reboot": network_reboot
         }
-    })
-    # Write the new data to the file
-    with open(f"logs/{year}/{month}.json", "w") as file:
-        json.dump(data, file, indent=4)
-    
+    }
+
+# Write log entries to stdout as JSON Lines, as well as to the log file if logging is on. Used
+# in daemon mode, where a service manager (e.g. systemd's journal) collects the output. The
+# stream is kept, so the caller can send everything else that is printed to stderr and keep
+# stdout for the log entries only.
+def enable_stdout_logging(stream=None):
+    global stdout_stream
+    stdout_stream = stream or sys.stdout
+
+# Write an object to stdout as one JSON line, if stdout logging is on
+def write_to_stdout(data):
+    if stdout_stream is not None:
+        stdout_stream.write(json.dumps(data) + "\n")
+        stdout_stream.flush()
+
+# Write to the log file for the current month (does nothing if logging is off), and to stdout
+# if stdout logging is on
+@tracing.traced("log.write")
+def write_to_log_file(status, message, ping_status = "n/a", internet_connection = "n/a", network_reboot = "n/a"):
+    if not logging_enabled and stdout_stream is None:
+        return
+    entry = create_log_entry(status, message, ping_status, internet_connection, network_reboot)
+    write_to_stdout(entry)
+    if not logging_enabled:
+        return
+    log_file_path = get_current_log_file_path()
+
+    if log_writer is not None:
+        log_writer.put(log_file_path, entry)
+    else:
+        write_log_entries(log_file_path, [entry])
+
+# Add an event to the rollups of the current month (does nothing if logging is off), one of:
+# "check", "failed_check", "ping" (with the RTT in ms), "failed_ping" or "reboot"
+def record_rollup_event(event, rtt=None):
+    if not logging_enabled:
+        return
+    if event not in rollups.ROLLUP_EVENTS:
+        raise ValueError(f"Unknown rollup event: {event}")
+    moment = datetime.datetime.now()
+
+    if log_writer is not None:
+        log_writer.put_rollup_event(moment, event, rtt)
+    else:
+        log_rollups.add(moment, event, rtt)
+        log_rollups.save()
+
+# Read all the log entries from a log file, in either format
+def read_log_file(path):
+    # Closed months are compressed by `retention.py` ({month}.jsonl.gz or {month}.json.gz)
+    if path.endswith(".gz"):
+        file = gzip.open(path, "rt")
+        path = path[:-3]
+    else:
+        file = open(path, "r")
+    with file:
+        if path.endswith(".jsonl"):
+            entries = []
+            for line in file:
+                if not line.strip():
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A partly written last line, from a crash that hasn't been recovered from yet
+                    if not line.endswith("\n"):
+                        break
+                    raise
+            return entries
+        return json.load(file)
+
+# The path of a log file without its extensions, e.g. "logs/2025/March" for "logs/2025/March.jsonl.gz"
+def strip_log_file_extension(path):
+    if path.endswith(".gz"):
+        path = path[:-3]
+    return os.path.splitext(path)[0]
+
+# Convert a {month}.json log file (JSON array) to a {month}.jsonl log file (JSON Lines)
+def convert_log_file_to_jsonl(json_path, jsonl_path=None):
+    if jsonl_path is None:
+        jsonl_path = strip_log_file_extension(json_path) + ".jsonl"
+    entries = read_log_file(json_path)
+    with open(jsonl_path, "w") as file:
+        for entry in entries:
+            file.write(json.dumps(entry) + "\n")
+    return jsonl_path
+
+# Convert a {month}.jsonl log file (JSON Lines) to a {month}.json log file (JSON array)
+def convert_log_file_to_json(jsonl_path, json_path=None):
+    if json_path is None:
+        json_path = strip_log_file_extension(jsonl_path) + ".json"
+    entries = read_log_file(jsonl_path)
+    with open(json_path, "w") as file:
+        json.dump(entries, file, indent=4)
+    return json_path
+
 
 if __name__ == "__main__":
-    Initialise_log_file()
+    # Convert an existing log file between the two formats, e.g:
+    #   python loger.py to-jsonl logs/2025/March.json
+    #   python loger.py to-json logs/2025/March.jsonl
+    if len(sys.argv) == 3 and sys.argv[1] in ("to-jsonl", "to-json"):
+        if sys.argv[1] == "to-jsonl":
+            print("Converted log file saved to:", convert_log_file_to_jsonl(sys.argv[2]))
+        else:
+            print("Converted log file saved to:", convert_log_file_to_json(sys.argv[2]))
+        sys.exit()
+
+    Initialise_log_file(buffered=False)
 
     # Test the write_to_log_file function
     write_to_log_file("success", "User logged in", "yes", "no")
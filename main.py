@@ -4,13 +4,27 @@
 
 # Import the required libraries
 import os
-import time
-import requests
+import sys
+import argparse
 import json
-import subprocess
+import traceback
 import program_setup
-from datetime import datetime
+import configuration
+import dns_cache
 import loger
+import probe_store
+import retention
+import routers
+import monitor
+import metrics
+import tracing
+from scheduler import Scheduler
+
+# Exit codes, for service managers such as systemd (78 is EX_CONFIG from sysexits.h, which
+# can be excluded from automatic restarts with `RestartPreventExitStatus=78`)
+EXIT_SUCCESS = 0
+EXIT_FAILURE = 1
+EXIT_CONFIGURATION_ERROR = 78
 
 # Console colour variables
 class format:
@@ -26,11 +40,6 @@ class format:
     UNDERLINE = "\033[4m"
     END = "\033[0m"
 
-# Get the current timestamp
-def timestamp():
-    # Get the current timestamp
-    return datetime.now().strftime("%d/%m/%Y %H:%M:%S.%f")[:-4]
-
 # Mask a string with asterisks
 def mask_string(s):
     return s[:4] + '*' * (len(s) - 4)
@@ -112,8 +121,28 @@ def load_configuration_settings():
             configuration_settings = json.load(file)
             return configuration_settings
     except Exception as e:
-        print(f"{format.RED}Error loading the configuration settings from the 'config.json' file. Please try again.{format.END}")
-        print(f"Error: {e}")
+        if monitor.console_messages:
+            print(f"{format.RED}Error loading the configuration settings from the 'config.json' file. Please try again.{format.END}")
+            print(f"Error: {e}")
+        loger.write_to_log_file("error", f"Error loading the configuration settings from the 'config.json' file: {e}")
+        return
+
+# Load and check the configuration settings, and turn them into a `configuration.Configuration`.
+# Every problem found is printed and logged, and None is returned if there are any. In daemon
+# mode nobody can be asked for missing router details, so they are required.
+def load_configuration(require_router_details=False):
+    configuration_settings = load_configuration_settings()
+    if configuration_settings is None:
+        return
+    try:
+        return configuration.load_configuration(configuration_settings, require_router_details)
+    except configuration.InvalidConfigurationError as e:
+        if monitor.console_messages:
+            print(f"{format.RED}The configuration settings in the 'config.json' file are not valid:{format.END}")
+            for problem in e.problems:
+                print(f" - {problem}")
+        for problem in e.problems:
+            loger.write_to_log_file("error", f"Invalid configuration settings: {problem}")
         return
 
 # Confirm the configuration settings to load
@@ -144,91 +173,73 @@ def confirm_settings_to_load():
         print("Ending the program...")
         exit()
 
-# Ping an address to check the internet connection
-def ping_address_bool(address):
+# Start logging, the probe store and the log retention manager, if turned on
+def start_logging(configuration_settings):
+
+    # Check to see if config file has logs enabled
+    if configuration_settings.log_file:
+        loger.Initialise_log_file(
+            configuration_settings.log_format,
+            flush_interval=configuration_settings.log_flush_interval,
+            batch_size=configuration_settings.log_batch_size,
+            fsync_interval=configuration_settings.log_fsync_interval,
+            rollup_save_interval=configuration_settings.log_rollup_save_interval
+        )
+
+    # Check to see if config file has the probe store enabled
+    if configuration_settings.probe_store:
+        probe_store.open_probe_store(configuration_settings.probe_store_path)
+
+    # Compress and delete old logs in the background, if logs or probe results are kept
+    if configuration_settings.log_file or configuration_settings.probe_store:
+        retention.RetentionManager(
+            probe_store_path=configuration_settings.probe_store_path,
+            compress_closed_months=configuration_settings.log_compress_closed_months,
+            max_age_months=configuration_settings.log_max_age_months,
+            max_size_mb=configuration_settings.log_max_size_mb,
+            check_interval=configuration_settings.log_retention_check_interval
+        ).start()
+
+# Publish the metrics for Prometheus to scrape, if turned on
+def start_metrics_server(configuration_settings):
+    if configuration_settings.metrics_enabled:
+        metrics_host = configuration_settings.metrics_host
+        metrics_port = configuration_settings.metrics_port
+        metrics.start_metrics_server(metrics_host, metrics_port)
+        monitor.print_message(f"Metrics are published on http://{metrics_host}:{metrics_port}/metrics")
+        loger.write_to_log_file("neutral", f"Metrics server started on {metrics_host}:{metrics_port}")
+
+# The path of the state file, or None if it is turned off
+def get_state_file_path(configuration_settings):
+    if configuration_settings.state_file:
+        return configuration_settings.state_file_path
+    return None
+
+# Create the router client (driver) for the router model in the site settings
+def create_router_client(site_settings):
     try:
-        result = subprocess.run(["ping", "-c", "1", address], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        return result.returncode == 0
-    except Exception as e:
-        return False
-
-# Generate login token
-def generate_login_token(base_url, password):
-    payload = {"password": password}
-    url = base_url + "/rest/v1/user/login"
-    headers = {'Content-Type': 'application/json'}
-
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        if response.status_code == 201:
-            json_response = response.json()
-            token = json_response.get("created", {}).get("token")
-            if token:
-                print("Login successful! Token:", token)
-                return token
-            else:
-                print("Unexpected response format:", json_response)
-                return None
-        else:
-            print("Login failed. Server response:", response.text)
-            return None
-    except requests.exceptions.RequestException as e:
-        print("Error:", e)
-        return None
-    
-# Reboot system
-def reboot_system(base_url, token):
-    payload = {"reboot": {"enable": True}}
-    url = base_url + "/rest/v1/system/reboot"
-    headers = {
-        'Content-Type': 'application/json',
-        'Authorization': 'Bearer ' + token
-    }
-
-    try:
-        # Set a timeout of 5 seconds; if no response is received, it will raise a Timeout exception
-        response = requests.post(url, json=payload, headers=headers, timeout=5)
-        # If a response is received, then something might be wrong (e.g., authentication issue)
-        print("Reboot request failed. Server response:", response.text)
-    except requests.exceptions.Timeout:
-        # If a timeout occurs, assume the modem is rebooting as expected
-        print("No response after 5 seconds. Assuming the modem is rebooting successfully.")
-    except requests.exceptions.RequestException as e:
-        print("Error:", e)
-
-# Logout
-def logout(base_url, token):
-    url = base_url + "/rest/v1/user/3/token/" + token
-    headers = {
-        'Content-Type': 'application/json',
-        'Authorization': 'Bearer ' + token
-    }
-
-    try:
-        response = requests.delete(url, headers=headers)
-        if response.status_code == 204:
-            print(f"     - {format.GREEN}{format.BOLD}Logout successful!{format.END}")
-        else:
-            print(f"    - {format.RED}{format.BOLD}Logout failed.\nServer response:{format.END}", response.text)
-    except requests.exceptions.RequestException as e:
-        print("Error:", e)
+        return routers.create_router_client(site_settings.router_details)
+    except routers.UnknownRouterModelError as e:
+        print(f"{format.RED}{e}{format.END}")
+        print("Make sure your router is supported by the program.")
+        print("Stopping the program...")
+        exit()
 
 # Test: Login to the router
-def test_login_to_router(configuration_settings):
-    router_ip_address = configuration_settings["router_details"]["router_ip_address"]
-    router_password = configuration_settings["router_details"]["router_password"]
-    base_url = f"http://{router_ip_address}"
+def test_login_to_router(site_settings):
+    client = create_router_client(site_settings)
 
     # Generate login token
-    print(f" >>> Generating login token for {router_ip_address}...")
-    token = generate_login_token(base_url, router_password)
-    if token:
+    print(f" >>> Generating login token for {site_settings.router_details['router_ip_address']}...")
+    if client.login():
         print(f"     - {format.GREEN}{format.BOLD}Login test successful!{format.END}")
-        time.sleep(2)
-        
+
         # Logout
         print(" >>> Logging out...")
-        logout(base_url, token)
+        if client.logout():
+            print(f"     - {format.GREEN}{format.BOLD}Logout successful!{format.END}")
+        else:
+            print(f"     - {format.RED}{format.BOLD}Logout failed.{format.END}")
     else:
         print("Login test failed. Please check the configuration, the router IP address and password.")
         print("If you need help, please read the README.md and/or visit the Github repository.")
@@ -236,25 +247,20 @@ def test_login_to_router(configuration_settings):
         exit()
 
 # Test: Reboot the network
-def test_reboot_network(configuration_settings):
-    router_ip_address = configuration_settings["router_details"]["router_ip_address"]
-    router_password = configuration_settings["router_details"]["router_password"]
-    base_url = f"http://{router_ip_address}"
+def test_reboot_network(site_settings):
+    client = create_router_client(site_settings)
 
     # Generate login token
-    print(f" >>> Generating login token for {router_ip_address}...")
-    token = generate_login_token(base_url, router_password)
-    if token:
+    print(f" >>> Generating login token for {site_settings.router_details['router_ip_address']}...")
+    if client.login():
         print(f"     - {format.GREEN}{format.BOLD}Login successful!{format.END}")
-        time.sleep(2)
 
         # Reboot the system using the token
         print(" >>> Rebooting the network...")
-        reboot_system(base_url, token)
-
-        # Logout
-        print(" >>> Logging out...")
-        logout(base_url, token)
+        if not client.reboot():
+            # Logout, the token is only lost if the router reboots
+            print(" >>> Logging out...")
+            client.logout()
     else:
         print("Reboot test failed. Please check the configuration, the router IP address and password.")
         print("Make sure your router is supported by the program.")
@@ -262,7 +268,58 @@ def test_reboot_network(configuration_settings):
         print("Stopping the program...")
         exit()
 
+# Run the program without any prompts, for service managers such as systemd: check the
+# configuration settings, then start monitoring straight away. Log entries are written to
+# stdout as JSON Lines, and anything else that is printed goes to stderr. Returns the exit code.
+def run_daemon():
+    loger.enable_stdout_logging(sys.stdout)
+    sys.stdout = sys.stderr
+    monitor.console_messages = False
+
+    if not os.path.exists("config.json"):
+        loger.write_to_log_file("error", f"`config.json` does not exist in {os.getcwd()}, run the program without --daemon to start the setup wizard")
+        return EXIT_CONFIGURATION_ERROR
+    configuration_settings = load_configuration(require_router_details=True)
+    if configuration_settings is None:
+        return EXIT_CONFIGURATION_ERROR
+
+    try:
+        start_logging(configuration_settings)
+        loger.write_to_log_file("neutral", "Program started in daemon mode - Configuration settings loaded")
+        start_metrics_server(configuration_settings)
+
+        # Monitor all of the sites on one scheduler, until stopped by a signal
+        dns_cache.configure_dns_cache(configuration_settings.dns_cache_size, configuration_settings.dns_cache_max_stale)
+        scheduler = Scheduler(configuration_settings.max_worker_threads)
+        monitor.MonitorService(
+            scheduler,
+            configuration_settings.sites,
+            lambda: load_configuration(require_router_details=True),
+            configuration.DEFAULT_CONFIGURATION_PATH,
+            configuration_settings.config_watch_interval,
+            get_state_file_path(configuration_settings),
+            configuration_settings.state_save_interval,
+            configuration_settings
+        ).run()
+    except Exception as e:
+        loger.write_to_log_file("error", f"Program stopped by an unexpected error: {e}")
+        traceback.print_exc()
+        loger.close_log_file()
+        return EXIT_FAILURE
+    return EXIT_SUCCESS
+
 if __name__ == "__main__":
+    # Command line options
+    parser = argparse.ArgumentParser(description="Automatic Network Rebooter: monitors the internet connection and reboots the router when it is down.")
+    parser.add_argument("--daemon", action="store_true", help="run without any prompts (e.g. as a systemd service): check `config.json`, start monitoring straight away and write the log entries to stdout as JSON Lines")
+    parser.add_argument("--profile", action="store_true", help="measure how long each phase (pinging, logging, router requests, waiting) takes, and print the latency percentiles when the program exits")
+    parser.add_argument("--profile-cprofile", metavar="PATH", help="with --profile, also save a cProfile of the program to PATH")
+    parser.add_argument("--profile-stacks", metavar="PATH", help="with --profile, also save sampled stacks of every thread to PATH, in the collapsed format for flame graphs")
+    arguments = parser.parse_args()
+    if arguments.profile:
+        tracing.start_profiling(arguments.profile_cprofile, arguments.profile_stacks)
+    if arguments.daemon:
+        sys.exit(run_daemon())
 
     # Clear the terminal window
     os.system("clear")
@@ -287,42 +344,56 @@ if __name__ == "__main__":
         # Check successful
         print(f" > {format.GREEN}{format.BOLD}Success!{format.END} `config.json` exists.\n")
 
-        configuration_settings = load_configuration_settings()
-        
+        configuration_settings = load_configuration()
+        if configuration_settings is None:
+            print("Please fix the configuration settings in `config.json`, or delete it to start the setup wizard.")
+            print("Stopping the program...")
+            exit()
+
         # Confirm the configuration settings to load
         confirm_settings_to_load()
 
-        # Check to see if config file has logs enabled
-        if configuration_settings["log_file"]:
-            loger.Initialise_log_file()
-            loger.write_to_log_file("neutral", "Program started - Configuration settings loaded")
+        # Start logging (if turned on in the config file)
+        start_logging(configuration_settings)
+        loger.write_to_log_file("neutral", "Program started - Configuration settings loaded")
 
         # Clear the terminal window
         os.system("clear")
 
+        # The sites (routers and their ping lists) to monitor
+        sites = configuration_settings.sites
+
         # Check if config.json has the router IP address set
         print(f"\n{format.BOLD}Checking to see if `config.json` has the router IP address and password set...{format.END}")
         print(f"You can chose not save these settings in the configuration settings and enter them manually each time the program starts for security reasons. This is optional.")
 
-        if configuration_settings["router_details"]["router_ip_address"] == "" or configuration_settings["router_details"]["router_ip_address"] == None or "router_ip_address" not in configuration_settings["router_details"]:
-            print(f" > {format.RED}{format.BOLD}Unsuccessful.{format.END} The router IP address is not set in the configuration settings.")
-            print("Please enter the IP address of the router to continue...")
-            configuration_settings["router_details"]["router_ip_address"] = user_input_ip_address()
-            print(f" > {format.GREEN}{format.BOLD}Router IP address set{format.END}. (not saved in the configuration settings)")
-            loger.write_to_log_file("neutral", "Router IP address set manually")
-        else:
-            print(f" > {format.GREEN}{format.BOLD}Success!{format.END} The router IP address is set in the configuration settings.")
-            loger.write_to_log_file("neutral", "Router IP address set in the configuration settings")
-
-        if configuration_settings["router_details"]["router_password"] == "" or configuration_settings["router_details"]["router_password"] == None or "router_password" not in configuration_settings["router_details"]:
-            print(f" > {format.RED}{format.BOLD}Unsuccessful.{format.END} The router password is not set in the configuration settings.")
-            print("Please enter the password of the router to continue...")
-            configuration_settings["router_details"]["router_password"] = input("Enter the password of the router: ")
-            print(f" > {format.GREEN}{format.BOLD}Router password set{format.END}. (not saved in the configuration settings)")
-            loger.write_to_log_file("neutral", "Router password set manually")
-        else:
-            print(f" > {format.GREEN}{format.BOLD}Success!{format.END} The router password is set in the configuration settings.")
-            loger.write_to_log_file("neutral", "Router password set in the configuration settings")
+        for site in sites:
+            router_details = site.router_details
+            if len(sites) > 1:
+                print(f"\n{format.BOLD}Site: {site.name}{format.END}")
+
+            if router_details.get("router_ip_address") == "" or router_details.get("router_ip_address") == None:
+                print(f" > {format.RED}{format.BOLD}Unsuccessful.{format.END} The router IP address is not set in the configuration settings.")
+                print("Please enter the IP address of the router to continue...")
+                router_details["router_ip_address"] = site.manual_router_details["router_ip_address"] = user_input_ip_address()
+                print(f" > {format.GREEN}{format.BOLD}Router IP address set{format.END}. (not saved in the configuration settings)")
+                loger.write_to_log_file("neutral", "Router IP address set manually")
+            else:
+                print(f" > {format.GREEN}{format.BOLD}Success!{format.END} The router IP address is set in the configuration settings.")
+                loger.write_to_log_file("neutral", "Router IP address set in the configuration settings")
+
+            if router_details.get("router_password") == "" or router_details.get("router_password") == None:
+                print(f" > {format.RED}{format.BOLD}Unsuccessful.{format.END} The router password is not set in the configuration settings.")
+                print("Please enter the password of the router to continue...")
+                router_details["router_password"] = site.manual_router_details["router_password"] = input("Enter the password of the router: ")
+                print(f" > {format.GREEN}{format.BOLD}Router password set{format.END}. (not saved in the configuration settings)")
+                loger.write_to_log_file("neutral", "Router password set manually")
+            else:
+                print(f" > {format.GREEN}{format.BOLD}Success!{format.END} The router password is set in the configuration settings.")
+                loger.write_to_log_file("neutral", "Router password set in the configuration settings")
+
+            # Make sure there is a driver for the router model before going any further
+            create_router_client(site)
 
         # Ask the user if they would like to test if the program can login to the router
         print(f"\n{format.BOLD}{format.CYAN}Do you want to test if the program can login to the router?{format.END}")
@@ -334,7 +405,8 @@ if __name__ == "__main__":
 
         if login_test.lower() == "y":
             loger.write_to_log_file("neutral", "User tested login to the router")
-            test_login_to_router(configuration_settings)
+            for site in sites:
+                test_login_to_router(site)
         else:
             print(f"{format.ITALIC}Skipping the login test...{format.END}")
             loger.write_to_log_file("neutral", "Skipping the login test")
@@ -347,7 +419,8 @@ if __name__ == "__main__":
         reboot_test = user_input_yes_no()
 
         if reboot_test.lower() == "y":
-            test_reboot_network(configuration_settings)
+            for site in sites:
+                test_reboot_network(site)
 
             # Press to continue
             loger.write_to_log_file("neutral", "User tested rebooting the network","n/a", "n/a", "yes")
@@ -374,103 +447,13 @@ if __name__ == "__main__":
             loger.write_to_log_file("neutral", "User ended the program")
             exit()
 
-        while True:
-            # check the internet connection with the ping list
-            print(timestamp() + " >>> Checking the internet connection...")
-
-            list_of_ping_addresses = configuration_settings["ping"]["ping_list"]
-            unreachable_ping_threshold = configuration_settings["ping"]["unreachable_ping_threshold"]
-            ping_retry_amount = configuration_settings["ping"]["ping_retry_amount"]
-            ping_retry_interval = configuration_settings["ping"]["ping_retry_interval"]
-
-            # Number of failed pings
-            failed_pings = 0
-
-            # loop through the list of ping addresses
-            for ping_address in list_of_ping_addresses:
-
-                # if total failed pings is greater than the unreachable ping threshold, break the loop
-                if failed_pings >= unreachable_ping_threshold:
-                    break
-
-                specific_failed_pings = 0
-                
-                # Loop for numbwer of ping retries
-                for i in range(ping_retry_amount):
-                    # Ping the address to check the internet connection
-                    if ping_address_bool(ping_address):
-                        print(f"{timestamp()} >>> ({format.GREEN}Ping successful{format.END}) - {ping_address} - (attempt: {i + 1}/{ping_retry_amount + 1})")
-                        loger.write_to_log_file("success", f"Successfully pinged {ping_address} - (attempt: {i + 1}/{ping_retry_amount + 1})", "success")
-                        break
-                    else:
-                        if ping_retry_amount > 1:
-                            print(f"{timestamp()} >>> ({format.RED}Ping failed{format.END}) - {ping_address} - Will retry in {ping_retry_interval} seconds (attempt: {i + 1}/{ping_retry_amount + 1})")
-                            loger.write_to_log_file("error", f"Failed to ping {ping_address} - (attempt: {i + 1}/{ping_retry_amount + 1})", "error")
-                        else:
-                            print(f"{timestamp()} >>> ({format.RED}Ping failed{format.END}) - {ping_address}")
-                            loger.write_to_log_file("error", f"Failed to ping {ping_address}", "error")
-                        specific_failed_pings += 1
-                        time.sleep(ping_retry_interval)
-                
-                if specific_failed_pings == ping_retry_amount:
-                    failed_pings += 1
-            
-            number_of_reboots_in_a_row = 0
-
-            # Check if threshold is reached, and reboot the network
-            if failed_pings >= unreachable_ping_threshold:
-                print(f"{timestamp()} >>> {format.RED}Internet connection is considered unstable. ({failed_pings}/{unreachable_ping_threshold} failed pings){format.END}")
-                print(f"{timestamp()} >>> Rebooting the network...")
-                loger.write_to_log_file("error", "Internet connection is considered unstable", "n/a", "no", "yes")
-
-                number_of_reboots_in_a_row += 1
-
-                # Reboot the network
-                router_ip_address = configuration_settings["router_details"]["router_ip_address"]
-                router_password = configuration_settings["router_details"]["router_password"]
-                base_url = f"http://{router_ip_address}"
-
-                # Generate login token
-                print(timestamp() + " >>> Generating login token...")
-                loger.write_to_log_file("neutral", "Generating login token")
-                token = generate_login_token(base_url, router_password)
-                if token:
-                    print(timestamp() + " >>> Token generated successfully!")
-                    loger.write_to_log_file("success", "Token generated successfully", "n/a", "no", "yes")
-                    time.sleep(2)
-                    
-                    # Reboot the system using the token
-                    print(timestamp() + " >>> Rebooting the network...")
-                    loger.write_to_log_file("neutral", "Rebooting the network", "n/a", "no", "yes")
-                    reboot_system(base_url, token)
-
-                    # Logout
-                    print(timestamp() + " >>> Logging out...")
-                    loger.write_to_log_file("neutral", "Logging out")
-                    logout(base_url, token)
-
-                    # wait after rebooting the network
-                    print(f"{timestamp()} >>> Waiting for {configuration_settings['network']['network_reboot_interval']} minutes after rebooting the network...")
-                    loger.write_to_log_file("neutral", f"Waiting for {configuration_settings['network']['network_reboot_interval']} minutes after rebooting the network")
-                    time.sleep(configuration_settings["network"]["network_reboot_interval"] * 60)
-                    
-            else:
-                print(f"{timestamp()} >>> {format.GREEN}Internet connection is considered stable. ({failed_pings}/{unreachable_ping_threshold} failed pings){format.END}")
-                loger.write_to_log_file("success", "Internet connection is considered stable", "n/a", "yes", "no")
-                number_of_reboots_in_a_row = 0
-
-            # if the number of reboots in a row is greater than the network reboot retry count, go into cooldown period
-            if number_of_reboots_in_a_row >= configuration_settings["network"]["network_reboot_retry_count"]:
-                print(f"{timestamp()} >>> {format.RED}Network reboot retry count reached. Going into cooldown period for {configuration_settings['network']['network_reboot_cooldown_period']} minutes...{format.END}")
-                loger.write_to_log_file("error", f"Network reboot retry count reached. Going into cooldown period for {configuration_settings['network']['network_reboot_cooldown_period']} minutes", "n/a", "no", "no")
-                time.sleep(configuration_settings["network"]["network_reboot_cooldown_period"] * 60)
-                print(f"{timestamp()} >>> Cooldown period ended. Resuming network monitoring...")
-                loger.write_to_log_file("neutral", "Cooldown period ended. Resuming network monitoring")
-
-            ping_check_frequency = configuration_settings["ping"]["ping_check_frequency"]
-            print(f"{timestamp()} >>> Waiting for {ping_check_frequency} minutes before checking the internet connection again...")
-            loger.write_to_log_file("neutral", f"Waiting for {ping_check_frequency} minutes before checking the internet connection again")
-            time.sleep(ping_check_frequency * 60)
+        # Publish the metrics for Prometheus to scrape, if turned on
+        start_metrics_server(configuration_settings)
+
+        # Monitor all of the sites on one scheduler
+        dns_cache.configure_dns_cache(configuration_settings.dns_cache_size, configuration_settings.dns_cache_max_stale)
+        scheduler = Scheduler(configuration_settings.max_worker_threads)
+        monitor.MonitorService(scheduler, sites, load_configuration, configuration.DEFAULT_CONFIGURATION_PATH, configuration_settings.config_watch_interval, get_state_file_path(configuration_settings), configuration_settings.state_save_interval, configuration_settings).run()
     else:
         # Check failed
         print(f" > {format.RED}{format.BOLD}Unsuccessful.{format.END} `config.json` does not exist.")
@@ -0,0 +1,187 @@
+# This file is used by the program to publish what the monitor is doing as metrics, which a
+# Prometheus server (or anything that reads the Prometheus/OpenMetrics text format) can scrape.
+# This file is not inteded to be ran by itself, but rather imported by `monitor.py`, and
+# `main.py` starts the metrics server when `metrics.enabled` is turned on:
+#   curl http://127.0.0.1:9464/metrics
+# The metrics are only ever updated from the scheduler thread (see `scheduler.py`), so they
+# are plain numbers in dictionaries, with no locks on the probe path. The metrics server
+# reads them from its own thread when it is scraped; a scrape that happens half way through
+# a check cycle can see some metrics updated and others not yet, which is fine for metrics.
+
+# Import the required modules
+import bisect
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Default metrics settings
+DEFAULT_METRICS_HOST = "127.0.0.1"
+DEFAULT_METRICS_PORT = 9464
+
+# The RTT histogram buckets, in seconds
+DEFAULT_RTT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Escape a label value for the text format
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+# Format the labels of a sample, e.g. {site="default",target="8.8.8.8"}
+def format_labels(label_names, label_values, extra=""):
+    labels = [f'{name}="{escape_label_value(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+# Format a number for the text format
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+# A value that only goes up, with one value per set of label values
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self, openmetrics):
+        for label_values, value in list(self.values.items()):
+            yield self.name + "_total", format_labels(self.label_names, label_values), value
+
+# A value that can go up and down, with one value per set of label values
+class Gauge:
+    type = "gauge"
+
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.values = {}
+
+    def set(self, *label_values, value):
+        self.values[label_values] = value
+
+    def samples(self, openmetrics):
+        for label_values, value in list(self.values.items()):
+            yield self.name, format_labels(self.label_names, label_values), value
+
+# The counts of one set of label values of a histogram
+class HistogramValue:
+    __slots__ = ("bucket_counts", "count", "sum")
+
+    def __init__(self, bucket_count):
+        self.bucket_counts = [0] * bucket_count
+        self.count = 0
+        self.sum = 0.0
+
+# Counts observed values in buckets, with one set of buckets per set of label values
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, label_names=(), buckets=DEFAULT_RTT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, *label_values, value):
+        histogram_value = self.values.get(label_values)
+        if histogram_value is None:
+            histogram_value = self.values[label_values] = HistogramValue(len(self.buckets) + 1)
+        # Only the bucket the value falls in is counted, the buckets are added up when scraped
+        histogram_value.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        histogram_value.count += 1
+        histogram_value.sum += value
+
+    def samples(self, openmetrics):
+        for label_values, histogram_value in list(self.values.items()):
+            cumulative_count = 0
+            for upper_bound, bucket_count in zip(self.buckets + (float("inf"),), list(histogram_value.bucket_counts)):
+                cumulative_count += bucket_count
+                yield self.name + "_bucket", format_labels(self.label_names, label_values, f'le="{"+Inf" if upper_bound == float("inf") else repr(float(upper_bound))}"'), cumulative_count
+            yield self.name + "_count", format_labels(self.label_names, label_values), histogram_value.count
+            yield self.name + "_sum", format_labels(self.label_names, label_values), histogram_value.sum
+
+# The metrics of the program
+probes = Counter("network_rebooter_probes", "Ping attempts, by site, address and result.", ("site", "target", "result"))
+probe_rtt = Histogram("network_rebooter_probe_rtt_seconds", "Round trip time of the ping attempts that were answered.", ("site", "target"))
+probe_loss_ratio = Gauge("network_rebooter_probe_loss_ratio", "Packet loss (0 to 1) over the ping statistics window.", ("site", "target"))
+failed_pings = Gauge("network_rebooter_failed_pings", "Addresses that failed in the last check cycle.", ("site",))
+dns_failures = Gauge("network_rebooter_dns_failures", "Addresses whose hostname could not be resolved in the last check cycle.", ("site",))
+unreachable_ping_threshold = Gauge("network_rebooter_unreachable_ping_threshold", "Failed addresses that make a check cycle unstable.", ("site",))
+check_cycles = Counter("network_rebooter_check_cycles", "Check cycles, by site and result.", ("site", "result"))
+diagnoses = Counter("network_rebooter_diagnoses", "Diagnoses of unstable check cycles, by site and the first layer that failed.", ("site", "layer"))
+reboots = Counter("network_rebooter_reboots", "Network reboot requests, by site and result.", ("site", "result"))
+reboots_in_a_row = Gauge("network_rebooter_reboots_in_a_row", "Network reboots since the connection was last stable.", ("site",))
+site_state = Gauge("network_rebooter_state", "The state of the site monitor (1 for the current state).", ("site", "state"))
+last_successful_check = Gauge("network_rebooter_last_successful_check_timestamp_seconds", "When the last stable check cycle finished (Unix time).", ("site",))
+last_recovery = Gauge("network_rebooter_last_recovery_seconds", "How long the network took to recover after the last reboot.", ("site",))
+
+METRICS = (probes, probe_rtt, probe_loss_ratio, failed_pings, dns_failures, unreachable_ping_threshold, check_cycles, diagnoses, reboots, reboots_in_a_row, site_state, last_successful_check, last_recovery)
+
+# Remove the metrics of a site (e.g. a site that was removed from the configuration settings)
+def forget_site(site):
+    for metric in METRICS:
+        for label_values in list(metric.values):
+            if label_values and label_values[0] == site:
+                metric.values.pop(label_values, None)
+
+# Remove the metrics of one address of a site (e.g. an address that was removed from its ping list)
+def forget_target(site, target):
+    for metric in METRICS:
+        if metric.label_names[:2] != ("site", "target"):
+            continue
+        for label_values in list(metric.values):
+            if label_values[:2] == (site, target):
+                metric.values.pop(label_values, None)
+
+# All of the metrics in the Prometheus text format, or the OpenMetrics text format
+def render_metrics(openmetrics=False):
+    lines = []
+    for metric in METRICS:
+        # In the Prometheus text format a counter family is named after its samples (..._total)
+        family_name = metric.name + "_total" if metric.type == "counter" and not openmetrics else metric.name
+        lines.append(f"# HELP {family_name} {metric.help}")
+        lines.append(f"# TYPE {family_name} {metric.type}")
+        for sample_name, labels, value in metric.samples(openmetrics):
+            lines.append(f"{sample_name}{labels} {format_value(value)}")
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+# Handles the scrapes of the metrics server
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        body = render_metrics(openmetrics).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Scrapes happen every few seconds, don't print every one of them
+    def log_message(self, format, *args):
+        pass
+
+# Start the metrics server on a background thread, and return it (call `shutdown` to stop it)
+def start_metrics_server(host=DEFAULT_METRICS_HOST, port=DEFAULT_METRICS_PORT):
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
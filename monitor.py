@@ -0,0 +1,883 @@
+# This file is used by the program to monitor the internet connection of one or more
+# sites (a router and its ping list) and reboot the router when the connection is lost.
+# This file is not inteded to be ran by itself, but rather imported by the main program
+# (`main.py`).
+# Every site has a small `SiteMonitor` object that holds its state, and all of the sites
+# share one scheduler: check cycles, ping retries, waiting after a reboot and cooldown
+# periods are all timers, so one program (and one thread) can look after many routers.
+# The router driver of a site is only loaded the first time the site needs a reboot, and
+# every reboot has to be allowed by the site's reboot governor (see `reboot_governor.py`).
+# The reboot history, cooldown period, ping statistics and router login token of each site
+# are kept in the state file (see `state_file.py`), so a restarted program carries on from
+# where it stopped instead of rebooting the router again straight away.
+
+# Import the required modules
+import os
+import math
+import time
+import signal
+from datetime import datetime
+import loger
+import prober
+import routers
+import ping_engine
+import ping_statistics as ping_statistics_engine
+import adaptive_scheduling
+import recovery
+import diagnosis
+import probe_store
+import metrics
+import tracing
+import state_file
+import reboot_governor
+import configuration
+import dns_cache
+
+# Console colour variables
+class format:
+    RED = "\033[91m"
+    GREEN = "\033[92m"
+    YELLOW = "\033[93m"
+    BLUE = "\033[94m"
+    PINK = "\033[95m"
+    CYAN = "\033[96m"
+    WHITE = "\033[97m"
+    BOLD = "\033[1m"
+    ITALIC = "\033[3m"
+    UNDERLINE = "\033[4m"
+    END = "\033[0m"
+
+# Whether messages are printed to the console. In daemon mode (`main.py --daemon`) they are
+# turned off, and the log entries are written to stdout as JSON Lines instead.
+console_messages = True
+
+# Get the current timestamp
+def timestamp():
+    # Get the current timestamp
+    return datetime.now().strftime("%d/%m/%Y %H:%M:%S.%f")[:-4]
+
+# Print a message to the console, with a timestamp
+def print_message(message):
+    if console_messages:
+        print(f"{timestamp()} >>> {message}")
+
+# Create the probe function used to ping the addresses, from the site settings
+def create_probe_function(site_settings):
+    ping_settings = site_settings.ping
+    return tracing.traced("probe." + ping_settings.probe_method)(prober.create_prober(
+        ping_settings.probe_method,
+        ping_settings.probe_timeout,
+        ping_settings.probe_tcp_port,
+        ping_settings.probe_dns_query_name
+    ))
+
+# Create the adaptive check interval from the site settings, or None if adaptive scheduling is off
+def create_check_interval(site_settings):
+    ping_settings = site_settings.ping
+    if not ping_settings.adaptive_scheduling:
+        return None
+    return adaptive_scheduling.AdaptiveCheckInterval(
+        ping_settings.minimum_check_interval,
+        ping_settings.ping_check_frequency * 60,
+        ping_settings.fast_recheck_interval,
+        ping_settings.fast_recheck_limit,
+        ping_settings.adaptive_loss_threshold
+    )
+
+# Format a number of seconds for messages, in seconds or minutes
+def format_duration(seconds):
+    if seconds < 60:
+        return f"{seconds:g} seconds"
+    return f"{seconds / 60:g} minutes"
+
+# Find the addresses whose ping statistics are over the packet loss / latency / jitter limits
+# in the site settings. Returns a dictionary of address: reason.
+def find_degraded_addresses(ping_statistics, site_settings):
+    ping_settings = site_settings.ping
+    degraded_addresses = {}
+    for ping_address in ping_settings.ping_list:
+        if ping_address not in ping_statistics:
+            continue
+        reason = ping_statistics_engine.degraded_reason(
+            ping_statistics[ping_address],
+            ping_settings.max_packet_loss,
+            ping_settings.max_latency,
+            ping_settings.max_jitter
+        )
+        if reason:
+            degraded_addresses[ping_address] = reason
+    return degraded_addresses
+
+# Create the reboot governor from the site settings, with the reboot history so far
+def create_reboot_governor(site_settings, reboot_times=()):
+    network_settings = site_settings.network
+    return reboot_governor.RebootGovernor(
+        network_settings.max_reboots_per_hour,
+        network_settings.max_reboots_per_day,
+        network_settings.reboot_backoff_base,
+        network_settings.reboot_backoff_max,
+        reboot_times
+    )
+
+# The states of a site monitor, and the states it can move to from each of them:
+#  - idle: waiting for the next check cycle
+#  - checking: pinging the addresses in the ping list
+#  - diagnosing: finding out where the connection is broken, before rebooting
+#  - rebooting: waiting for the router to accept the reboot request
+#  - waiting_for_recovery: waiting for the network to come back after a reboot
+#  - cooldown: waiting after too many reboots in a row
+#  - stopped: not monitoring
+STATE_IDLE = "idle"
+STATE_CHECKING = "checking"
+STATE_DIAGNOSING = "diagnosing"
+STATE_REBOOTING = "rebooting"
+STATE_WAITING_FOR_RECOVERY = "waiting_for_recovery"
+STATE_COOLDOWN = "cooldown"
+STATE_STOPPED = "stopped"
+STATE_TRANSITIONS = {
+    STATE_STOPPED: (STATE_IDLE, STATE_COOLDOWN),
+    STATE_IDLE: (STATE_CHECKING, STATE_STOPPED),
+    STATE_CHECKING: (STATE_IDLE, STATE_DIAGNOSING, STATE_REBOOTING, STATE_STOPPED),
+    STATE_DIAGNOSING: (STATE_IDLE, STATE_REBOOTING, STATE_STOPPED),
+    STATE_REBOOTING: (STATE_WAITING_FOR_RECOVERY, STATE_COOLDOWN, STATE_IDLE, STATE_STOPPED),
+    STATE_WAITING_FOR_RECOVERY: (STATE_COOLDOWN, STATE_IDLE, STATE_STOPPED),
+    STATE_COOLDOWN: (STATE_IDLE, STATE_STOPPED)
+}
+
+# Monitors the internet connection of one site, and reboots its router when needed
+class SiteMonitor:
+    __slots__ = ("scheduler", "name", "settings", "pending_settings", "prefix", "probe_address", "check_interval", "ping_statistics", "client", "number_of_reboots_in_a_row", "state", "state_since", "timer", "last_check_result", "recovery_watcher", "last_recovery_seconds", "dns_failures", "diagnosis", "reboot_governor", "cooldown_until", "saved_token", "on_state_change")
+
+    def __init__(self, scheduler, site_settings, show_name=False):
+        self.scheduler = scheduler
+        self.name = site_settings.name
+        self.settings = site_settings
+        self.show_name(show_name)
+        self.probe_address = create_probe_function(site_settings)
+        # The wait between check cycles, if adaptive scheduling is turned on
+        self.check_interval = create_check_interval(site_settings)
+        # Rolling latency and packet loss statistics for each address in the ping list
+        self.ping_statistics = {}
+        # The router client, created the first time it is needed, then kept between reboots
+        self.client = None
+        self.number_of_reboots_in_a_row = 0
+        # New settings from a configuration reload, used from the next check cycle
+        self.pending_settings = None
+        self.state = STATE_STOPPED
+        self.state_since = scheduler.time()
+        self.timer = None
+        self.last_check_result = None
+        # Watches the network come back after a reboot, and how long it took last time
+        self.recovery_watcher = None
+        self.last_recovery_seconds = None
+        # Addresses in the current check cycle that could not be resolved
+        self.dns_failures = 0
+        # Finds out where the connection is broken before a reboot
+        self.diagnosis = None
+        # Decides if the router may be rebooted, from when the last few reboots were requested
+        self.reboot_governor = create_reboot_governor(site_settings)
+        # When the cooldown period ends (Unix time)
+        self.cooldown_until = None
+        # A login token from the state file, given to the router client when it is created
+        self.saved_token = None
+        # Called after the reboot history or cooldown period change, to save the state file
+        self.on_state_change = None
+
+    # Print a message to the console, with a timestamp and the site name
+    def print(self, message):
+        print_message(self.prefix + message)
+
+    # Write a message to the log file, with the site name
+    def log(self, status, message, ping_status="n/a", internet_connection="n/a", network_reboot="n/a"):
+        loger.write_to_log_file(status, self.prefix + message, ping_status, internet_connection, network_reboot)
+
+    # Move to a new state
+    def set_state(self, state):
+        if state not in STATE_TRANSITIONS[self.state]:
+            raise RuntimeError(f"Invalid site monitor state change: {self.state} -> {state}")
+        now = self.scheduler.time()
+        # How long the site spent in the last state (e.g. "monitor.idle" is the time spent waiting)
+        tracing.record("monitor." + self.state, now - self.state_since)
+        self.state = state
+        self.state_since = now
+        for site_state in STATE_TRANSITIONS:
+            metrics.site_state.set(self.name, site_state, value=1 if site_state == state else 0)
+
+    # Run a method of the monitor after a delay in seconds
+    def schedule(self, delay, callback, *args):
+        self.timer = self.scheduler.call_later(delay, callback, *args)
+
+    # The status of the site, for health queries
+    def status(self):
+        now = self.scheduler.time()
+        next_event = None
+        if self.timer is not None and not self.timer.cancelled and self.timer.when >= now:
+            next_event = round(self.timer.when - now, 3)
+        return {
+            "name": self.name,
+            "state": self.state,
+            "seconds_in_state": round(now - self.state_since, 3),
+            "seconds_until_next_event": next_event,
+            "number_of_reboots_in_a_row": self.number_of_reboots_in_a_row,
+            "last_check_result": self.last_check_result,
+            "last_recovery_seconds": self.last_recovery_seconds
+        }
+
+    # The state of the site to save to the state file
+    def export_state(self):
+        router_token = self.client.export_token() if self.client is not None else self.saved_token
+        if router_token is not None:
+            router_token["router_ip_address"] = self.settings.router_details.get("router_ip_address")
+            if router_token["expires_at"] <= time.time():
+                router_token = None
+        return {
+            "reboot_times": list(self.reboot_governor.reboot_times),
+            "number_of_reboots_in_a_row": self.number_of_reboots_in_a_row,
+            "cooldown_until": self.cooldown_until,
+            "last_check_result": self.last_check_result,
+            "last_recovery_seconds": self.last_recovery_seconds,
+            "ping_statistics": {ping_address: address_statistics.export_samples() for ping_address, address_statistics in self.ping_statistics.items()},
+            "router_token": router_token
+        }
+
+    # Carry on from the state saved in the state file, before the site is started
+    def restore_state(self, saved):
+        self.reboot_governor.reboot_times.extend(saved.get("reboot_times", []))
+        self.number_of_reboots_in_a_row = saved.get("number_of_reboots_in_a_row", 0)
+        self.cooldown_until = saved.get("cooldown_until")
+        self.last_check_result = saved.get("last_check_result")
+        self.last_recovery_seconds = saved.get("last_recovery_seconds")
+        ping_settings = self.settings.ping
+        for ping_address, saved_statistics in saved.get("ping_statistics", {}).items():
+            if ping_address in ping_settings.ping_list:
+                self.ping_statistics[ping_address] = ping_statistics_engine.PingStatistics(ping_settings.statistics_window_size)
+                self.ping_statistics[ping_address].restore_samples(saved_statistics)
+        router_token = saved.get("router_token")
+        # The token is only any use for the same router
+        if router_token and router_token.get("router_ip_address") == self.settings.router_details.get("router_ip_address"):
+            self.saved_token = router_token
+        metrics.reboots_in_a_row.set(self.name, value=self.number_of_reboots_in_a_row)
+        if self.last_recovery_seconds is not None:
+            metrics.last_recovery.set(self.name, value=self.last_recovery_seconds)
+
+    # Let the service save the state file
+    def state_changed(self):
+        if self.on_state_change:
+            self.on_state_change()
+
+    # Use new site settings from the next check cycle, without losing the site's state
+    def update_settings(self, site_settings):
+        self.pending_settings = site_settings
+
+    # Keep the ping statistics in line with new site settings: the addresses that were removed
+    # from the ping list lose their statistics and metrics, and if the statistics window size
+    # has changed the other addresses keep their newest samples that fit in the new window
+    def update_ping_statistics(self, site_settings):
+        ping_settings = site_settings.ping
+        for ping_address in set(self.settings.ping.ping_list) - set(ping_settings.ping_list):
+            metrics.forget_target(self.name, ping_address)
+        for ping_address in list(self.ping_statistics):
+            if ping_address not in ping_settings.ping_list:
+                del self.ping_statistics[ping_address]
+            elif self.ping_statistics[ping_address].window_size != ping_settings.statistics_window_size:
+                address_statistics = ping_statistics_engine.PingStatistics(ping_settings.statistics_window_size)
+                address_statistics.restore_samples(self.ping_statistics[ping_address].export_samples())
+                self.ping_statistics[ping_address] = address_statistics
+
+    # Messages are prefixed with the site name when there is more than one site
+    def show_name(self, show_name):
+        self.prefix = f"[{self.name}] " if show_name else ""
+
+    # Start monitoring the site. After a restart, a cooldown period that hasn't ended yet
+    # carries on, and the network isn't checked until the network reboot interval after the
+    # last reboot has passed.
+    def start(self):
+        now = time.time()
+        if self.cooldown_until is not None:
+            if self.cooldown_until > now:
+                remaining = self.cooldown_until - now
+                self.set_state(STATE_COOLDOWN)
+                self.print(f"{format.RED}Carrying on with the cooldown period, for {format_duration(round(remaining))}...{format.END}")
+                self.log("neutral", f"Carrying on with the cooldown period, for {format_duration(round(remaining))}", "n/a", "n/a", "no")
+                self.schedule(remaining, self.end_cooldown)
+                return
+            # The cooldown period ended while the program wasn't running
+            self.cooldown_until = None
+            self.number_of_reboots_in_a_row = 0
+            metrics.reboots_in_a_row.set(self.name, value=0)
+
+        self.set_state(STATE_IDLE)
+        delay = 0
+        reboot_times = self.reboot_governor.reboot_times
+        if reboot_times:
+            delay = max(0, reboot_times[-1] + self.settings.network.network_reboot_interval * 60 - now)
+        if delay > 0:
+            self.print(f"The network was rebooted {format_duration(round(now - reboot_times[-1]))} ago. Waiting for {format_duration(round(delay))} before checking the internet connection...")
+            self.log("neutral", f"The network was rebooted {format_duration(round(now - reboot_times[-1]))} ago. Waiting for {format_duration(round(delay))} before checking the internet connection")
+        self.schedule(delay, self.start_check_cycle)
+
+    # Stop monitoring the site
+    def stop(self):
+        if self.state == STATE_STOPPED:
+            return
+        if self.timer:
+            self.timer.cancel()
+        if self.recovery_watcher:
+            self.recovery_watcher.cancel()
+            self.recovery_watcher = None
+        if self.diagnosis:
+            self.diagnosis.cancel()
+            self.diagnosis = None
+        self.set_state(STATE_STOPPED)
+
+    # Check the internet connection with the ping list
+    def start_check_cycle(self):
+        if self.pending_settings is not None:
+            # Log in again with the new router details if they have changed
+            if self.pending_settings.router_details != self.settings.router_details:
+                self.client = None
+                self.saved_token = None
+            self.update_ping_statistics(self.pending_settings)
+            self.settings = self.pending_settings
+            self.pending_settings = None
+            self.probe_address = create_probe_function(self.settings)
+            self.check_interval = create_check_interval(self.settings)
+            self.reboot_governor = create_reboot_governor(self.settings, self.reboot_governor.reboot_times)
+            self.print("New configuration settings loaded.")
+            self.log("neutral", "New configuration settings loaded")
+
+        self.set_state(STATE_CHECKING)
+        self.print("Checking the internet connection...")
+        self.dns_failures = 0
+        ping_settings = self.settings.ping
+        ping_engine.PingCheckCycle(
+            self.scheduler,
+            ping_settings.ping_list,
+            self.probe_address,
+            ping_settings.unreachable_ping_threshold,
+            ping_settings.ping_retry_amount,
+            self.ping_retry_interval(),
+            self.on_ping_attempt,
+            self.on_check_cycle_complete,
+            ping_settings.count_dns_failures
+        ).start()
+
+    # The number of seconds to wait before retrying a failed ping. While adaptive scheduling is
+    # confirming a failure with fast rechecks, the (usually much shorter) fast recheck interval
+    def ping_retry_interval(self):
+        ping_retry_interval = self.settings.ping.ping_retry_interval
+        if self.check_interval is not None and self.check_interval.fast_rechecking:
+            return min(ping_retry_interval, self.check_interval.fast_recheck_interval)
+        return ping_retry_interval
+
+    # The packet loss rate (0 to 1) over the ping statistics of all of the addresses in the ping list
+    def loss_rate(self):
+        statistics = [self.ping_statistics[address] for address in self.settings.ping.ping_list if address in self.ping_statistics]
+        sample_count = sum(address_statistics.sample_count for address_statistics in statistics)
+        if sample_count == 0:
+            return 0.0
+        return sum(address_statistics.lost_count for address_statistics in statistics) / sample_count
+
+    # Print and log the result of each ping attempt
+    def on_ping_attempt(self, ping_address, attempt, attempts, rtt):
+        # A hostname that can't be resolved says nothing about the connection, so it is kept
+        # out of the ping statistics, the probe store and the rollups
+        if rtt == prober.DNS_FAILURE:
+            metrics.probes.inc(self.name, ping_address, "dns_failure")
+            if attempt == attempts - 1:
+                self.dns_failures += 1
+            self.print(f"({format.YELLOW}DNS lookup failed{format.END}) - {ping_address} - could not resolve the hostname (attempt: {attempt + 1}/{attempts})")
+            self.log("error", f"Failed to resolve {ping_address} (DNS) - (attempt: {attempt + 1}/{attempts})", "dns_error")
+            return
+
+        if ping_address not in self.ping_statistics:
+            self.ping_statistics[ping_address] = ping_statistics_engine.PingStatistics(self.settings.ping.statistics_window_size)
+        self.ping_statistics[ping_address].add_sample(rtt)
+        probe_store.record_probe(ping_address, rtt)
+        if rtt is not None:
+            loger.record_rollup_event("ping", rtt / 1000)
+            metrics.probes.inc(self.name, ping_address, "success")
+            metrics.probe_rtt.observe(self.name, ping_address, value=rtt / 1000000)
+        else:
+            loger.record_rollup_event("failed_ping")
+            metrics.probes.inc(self.name, ping_address, "failure")
+        metrics.probe_loss_ratio.set(self.name, ping_address, value=self.ping_statistics[ping_address].loss_rate())
+
+        if rtt is not None:
+            self.print(f"({format.GREEN}Ping successful{format.END}) - {ping_address} - {rtt / 1000:.1f} ms (attempt: {attempt + 1}/{attempts})")
+            self.log("success", f"Successfully pinged {ping_address} - {rtt / 1000:.1f} ms (attempt: {attempt + 1}/{attempts})", "success")
+        elif attempt < attempts - 1:
+            self.print(f"({format.RED}Ping failed{format.END}) - {ping_address} - Will retry in {self.ping_retry_interval():g} seconds (attempt: {attempt + 1}/{attempts})")
+            self.log("error", f"Failed to ping {ping_address} - (attempt: {attempt + 1}/{attempts})", "error")
+        else:
+            self.print(f"({format.RED}Ping failed{format.END}) - {ping_address} - (attempt: {attempt + 1}/{attempts})")
+            self.log("error", f"Failed to ping {ping_address} - (attempt: {attempt + 1}/{attempts})", "error")
+
+    # Decide if the network needs to be rebooted, once the check cycle is done
+    def on_check_cycle_complete(self, failed_pings):
+        # The site was stopped while the pings were running
+        if self.state != STATE_CHECKING:
+            return
+        unreachable_ping_threshold = self.settings.ping.unreachable_ping_threshold
+
+        # Addresses that answer, but with too much packet loss, latency or jitter
+        degraded_addresses = find_degraded_addresses(self.ping_statistics, self.settings)
+        for ping_address, reason in degraded_addresses.items():
+            self.print(f"({format.YELLOW}Connection degraded{format.END}) - {ping_address} - {reason}")
+            self.log("error", f"Connection to {ping_address} is degraded - {reason}", "n/a")
+
+        self.last_check_result = {"failed_pings": failed_pings, "dns_failures": self.dns_failures, "degraded_addresses": len(degraded_addresses), "failing_layer": None, "time": timestamp()}
+        metrics.failed_pings.set(self.name, value=failed_pings)
+        metrics.dns_failures.set(self.name, value=self.dns_failures)
+        if self.dns_failures:
+            not_counted = "" if self.settings.ping.count_dns_failures else " (not counted as failed pings)"
+            self.print(f"{format.YELLOW}Could not resolve {self.dns_failures} address(es){not_counted}.{format.END}")
+        metrics.unreachable_ping_threshold.set(self.name, value=unreachable_ping_threshold)
+
+        if failed_pings >= unreachable_ping_threshold:
+            self.print(f"{format.RED}Internet connection is considered unstable. ({failed_pings}/{unreachable_ping_threshold} failed pings){format.END}")
+        elif len(degraded_addresses) >= unreachable_ping_threshold:
+            self.print(f"{format.RED}Internet connection is considered unstable. ({len(degraded_addresses)}/{unreachable_ping_threshold} degraded addresses){format.END}")
+        else:
+            self.print(f"{format.GREEN}Internet connection is considered stable. ({failed_pings}/{unreachable_ping_threshold} failed pings){format.END}")
+            self.log("success", "Internet connection is considered stable", "n/a", "yes", "no")
+            loger.record_rollup_event("check")
+            metrics.check_cycles.inc(self.name, "stable")
+            metrics.last_successful_check.set(self.name, value=time.time())
+            self.number_of_reboots_in_a_row = 0
+            metrics.reboots_in_a_row.set(self.name, value=0)
+            self.wait_for_next_check_cycle(failed_pings)
+            return
+
+        self.log("error", "Internet connection is considered unstable", "n/a", "no", "yes")
+        loger.record_rollup_event("failed_check")
+        metrics.check_cycles.inc(self.name, "unstable")
+        if self.settings.network.layered_diagnosis:
+            self.diagnose_network(failed_pings)
+        else:
+            self.request_reboot(failed_pings)
+
+    # Check the local interface, the router and DNS, to find out if a reboot can help
+    def diagnose_network(self, failed_pings):
+        self.set_state(STATE_DIAGNOSING)
+        self.print("Checking the local network before rebooting...")
+        self.diagnosis = diagnosis.NetworkDiagnosis(
+            self.scheduler,
+            diagnosis.get_gateway_address(self.settings.router_details),
+            self.settings.ping.probe_dns_query_name,
+            self.probe_address,
+            lambda layer: self.on_diagnosis_complete(layer, failed_pings)
+        )
+        self.diagnosis.start()
+
+    # Reboot the network if the problem is past the router, or wait for the next check cycle if not
+    def on_diagnosis_complete(self, layer, failed_pings):
+        # The site was stopped while the diagnosis was running
+        if self.state != STATE_DIAGNOSING:
+            return
+        self.diagnosis = None
+        self.last_check_result["failing_layer"] = layer
+        metrics.diagnoses.inc(self.name, layer)
+        description = diagnosis.LAYER_DESCRIPTIONS[layer]
+        if layer in diagnosis.REBOOT_LAYERS:
+            self.print(f"{format.YELLOW}Diagnosis: {description}.{format.END}")
+            self.log("error", f"Diagnosis: {description}", "n/a", "no", "yes")
+            self.request_reboot(failed_pings)
+            return
+
+        self.print(f"{format.RED}Diagnosis: {description}. Not rebooting the network, as a reboot can't fix this.{format.END}")
+        self.log("error", f"Diagnosis: {description}. Not rebooting the network", "n/a", "no", "no")
+        self.wait_for_next_check_cycle(failed_pings)
+
+    # Ask the reboot governor if the network may be rebooted now, and reboot it if so
+    def request_reboot(self, failed_pings):
+        wait, reason = self.reboot_governor.check(time.time(), self.number_of_reboots_in_a_row)
+        if wait <= 0:
+            self.log("neutral", f"Network reboot allowed - {reason}", "n/a", "no", "yes")
+            self.reboot_network()
+            return
+
+        metrics.reboots.inc(self.name, "limited")
+        self.print(f"{format.RED}Not rebooting the network: {reason}. The next reboot is allowed in {format_duration(round(wait))}.{format.END}")
+        self.log("error", f"Network reboot not allowed - {reason}. The next reboot is allowed in {format_duration(round(wait))}", "n/a", "no", "no")
+        # Checking again before then would only be refused again
+        self.wait_for_next_check_cycle(failed_pings, wait)
+
+    # Reboot the network, the router request is ran on a worker thread
+    def reboot_network(self):
+        self.set_state(STATE_REBOOTING)
+        self.number_of_reboots_in_a_row += 1
+        metrics.reboots_in_a_row.set(self.name, value=self.number_of_reboots_in_a_row)
+        if self.client is None:
+            self.client = routers.create_router_client(self.settings.router_details)
+            if self.saved_token is not None:
+                self.client.restore_token(self.saved_token)
+                self.saved_token = None
+        self.state_changed()
+
+        # The client logs in first, or reuses its cached token
+        self.print("Rebooting the network...")
+        self.log("neutral", "Rebooting the network", "n/a", "no", "yes")
+        self.scheduler.run_in_executor(self.on_reboot_complete, self.client.reboot, on_error=self.on_reboot_error)
+
+    # The router driver raised an exception instead of answering, count it as a failed reboot
+    def on_reboot_error(self, error):
+        self.log("error", f"The router driver failed: {error!r}", "n/a", "no", "no")
+        self.on_reboot_complete(False)
+
+    # Wait after the reboot request
+    def on_reboot_complete(self, accepted):
+        # The site was stopped while the router request was running
+        if self.state != STATE_REBOOTING:
+            return
+        if not accepted:
+            self.print(f"{format.RED}Failed to reboot the network.{format.END}")
+            self.log("error", "Failed to reboot the network", "n/a", "no", "no")
+            metrics.reboots.inc(self.name, "failed")
+            self.after_reboot()
+            return
+
+        self.log("success", "Network reboot request accepted", "n/a", "no", "yes")
+        # Only reboots the router accepted count towards the reboot limits
+        self.reboot_governor.record_reboot(time.time())
+        self.state_changed()
+        loger.record_rollup_event("reboot")
+        metrics.reboots.inc(self.name, "accepted")
+        network_settings = self.settings.network
+        network_reboot_interval = network_settings.network_reboot_interval
+        self.set_state(STATE_WAITING_FOR_RECOVERY)
+
+        if not network_settings.recovery_detection:
+            self.print(f"Waiting for {network_reboot_interval} minutes after rebooting the network...")
+            self.log("neutral", f"Waiting for {network_reboot_interval} minutes after rebooting the network")
+            self.schedule(network_reboot_interval * 60, self.after_reboot)
+            return
+
+        # Poll until the network is back, waiting no longer than the network reboot interval
+        self.print(f"Waiting for the network to recover (for up to {network_reboot_interval} minutes)...")
+        self.log("neutral", f"Waiting for the network to recover (for up to {network_reboot_interval} minutes)")
+        ping_settings = self.settings.ping
+        self.recovery_watcher = recovery.RecoveryWatcher(
+            self.scheduler,
+            self.settings.router_details["router_ip_address"],
+            ping_settings.ping_list,
+            self.probe_address,
+            ping_settings.unreachable_ping_threshold,
+            network_settings.recovery_poll_interval,
+            network_settings.recovery_stable_polls,
+            min(network_settings.recovery_down_timeout, network_reboot_interval * 60),
+            self.on_router_down,
+            self.on_network_recovered
+        )
+        self.recovery_watcher.start()
+        self.schedule(network_reboot_interval * 60, self.on_recovery_timeout)
+
+    # The router has stopped answering, so the reboot has started
+    def on_router_down(self, seconds):
+        self.print(f"The router went down {seconds:.1f} seconds after the reboot request.")
+        self.log("neutral", f"The router went down {seconds:.1f} seconds after the reboot request", "n/a", "no", "yes")
+
+    # The network is back and stable after the reboot
+    def on_network_recovered(self, seconds):
+        self.recovery_watcher = None
+        self.timer.cancel()
+        self.last_recovery_seconds = round(seconds, 1)
+        metrics.last_recovery.set(self.name, value=self.last_recovery_seconds)
+        self.print(f"{format.GREEN}The network recovered {seconds:.1f} seconds after the reboot request.{format.END}")
+        self.log("success", f"The network recovered {seconds:.1f} seconds after the reboot request", "success", "yes", "yes")
+        self.after_reboot()
+
+    # The network reboot interval has passed without the network recovering
+    def on_recovery_timeout(self):
+        if self.recovery_watcher:
+            self.recovery_watcher.cancel()
+            self.recovery_watcher = None
+        network_reboot_interval = self.settings.network.network_reboot_interval
+        self.print(f"{format.RED}The network did not recover within {network_reboot_interval} minutes of the reboot request.{format.END}")
+        self.log("error", f"The network did not recover within {network_reboot_interval} minutes of the reboot request", "n/a", "no", "yes")
+        self.after_reboot()
+
+    # Go into the cooldown period if the network has been rebooted too many times in a row
+    def after_reboot(self):
+        network_settings = self.settings.network
+        if self.check_interval is not None:
+            self.check_interval.reset()
+        if self.number_of_reboots_in_a_row < network_settings.network_reboot_retry_count:
+            self.wait_for_next_check_cycle()
+            return
+
+        self.set_state(STATE_COOLDOWN)
+        self.cooldown_until = time.time() + network_settings.network_reboot_cooldown_period * 60
+        self.state_changed()
+        self.print(f"{format.RED}Network reboot retry count reached. Going into cooldown period for {network_settings.network_reboot_cooldown_period} minutes...{format.END}")
+        self.log("error", f"Network reboot retry count reached. Going into cooldown period for {network_settings.network_reboot_cooldown_period} minutes", "n/a", "no", "no")
+        self.schedule(network_settings.network_reboot_cooldown_period * 60, self.end_cooldown)
+
+    # Resume monitoring after the cooldown period
+    def end_cooldown(self):
+        self.number_of_reboots_in_a_row = 0
+        self.cooldown_until = None
+        self.state_changed()
+        metrics.reboots_in_a_row.set(self.name, value=0)
+        if self.check_interval is not None:
+            self.check_interval.reset()
+        self.print("Cooldown period ended. Resuming network monitoring...")
+        self.log("neutral", "Cooldown period ended. Resuming network monitoring")
+        self.wait_for_next_check_cycle()
+
+    # Wait before checking the internet connection again, for at least `minimum_delay` seconds
+    def wait_for_next_check_cycle(self, failed_pings=0, minimum_delay=0):
+        self.set_state(STATE_IDLE)
+        if self.check_interval is not None:
+            delay = self.check_interval.next_interval(failed_pings, self.loss_rate())
+        else:
+            delay = self.settings.ping.ping_check_frequency * 60
+        delay = max(delay, math.ceil(minimum_delay))
+        self.print(f"Waiting for {format_duration(delay)} before checking the internet connection again...")
+        self.log("neutral", f"Waiting for {format_duration(delay)} before checking the internet connection again")
+        self.schedule(delay, self.start_check_cycle)
+
+# The top level settings (everything but the sites), and the ones that are used as soon as
+# they are reloaded. The others (logging, the probe store, the worker threads and the metrics
+# server) are only used when the program starts.
+TOP_LEVEL_SETTINGS = tuple(name for name in configuration.Configuration.__slots__ if name != "sites")
+RELOADABLE_SETTINGS = ("config_watch_interval", "dns_cache_size", "dns_cache_max_stale", "state_file", "state_file_path", "state_save_interval")
+
+# The name of a top level setting in the configuration file, where the metrics settings are in
+# a `metrics` object (e.g. "metrics.port" for `metrics_port`)
+def get_setting_name(name):
+    if name.startswith("metrics_"):
+        return "metrics." + name[len("metrics_"):]
+    return name
+
+# Runs the site monitors of all of the sites on one scheduler, and handles signals:
+#  - SIGTERM / SIGINT (Ctrl + C): stop monitoring and exit
+#  - SIGHUP: reload the configuration settings, from the next check cycle of each site
+#  - SIGUSR1: print the status of each site
+# The scheduler thread only ever waits on a condition, so signals are handled in
+# milliseconds even in the middle of a long wait (e.g. a cooldown period).
+# The configuration file is also watched: its modification time and size are checked every
+# `watch_interval` seconds (which works on every platform, for the cost of one stat call), and
+# the configuration settings are reloaded when they change, as if SIGHUP had been sent.
+# If there is a `state_path`, the state of the sites is loaded from the state file when the
+# service is created, and saved every `state_save_interval` seconds, after every reboot and
+# cooldown period, and when the service stops.
+# `configuration_settings` are the settings the program was started with, so a reload can
+# tell which of the top level settings have changed.
+class MonitorService:
+    def __init__(self, scheduler, sites, load_configuration=None, configuration_path=None, watch_interval=0, state_path=None, state_save_interval=state_file.DEFAULT_STATE_SAVE_INTERVAL, configuration_settings=None):
+        self.scheduler = scheduler
+        self.load_configuration = load_configuration
+        self.configuration_path = configuration_path
+        self.watch_interval = watch_interval
+        self.watch_timer = None
+        self.configuration_stamp = self.get_configuration_stamp()
+        self.state_path = state_path
+        self.state_save_interval = state_save_interval
+        self.state_save_timer = None
+        # The top level settings in use, by name
+        self.top_level_settings = {}
+        if configuration_settings is not None:
+            self.top_level_settings = {name: getattr(configuration_settings, name) for name in TOP_LEVEL_SETTINGS}
+        self.show_names = len(sites) > 1
+        self.monitors = {}
+        saved_sites = state_file.load_state_file(state_path) if state_path is not None else {}
+        for site in sites:
+            site_monitor = self.add_site_monitor(site)
+            if site.name in saved_sites:
+                site_monitor.restore_state(saved_sites[site.name])
+
+    # Create the site monitor of a site
+    def add_site_monitor(self, site):
+        site_monitor = SiteMonitor(self.scheduler, site, self.show_names)
+        site_monitor.on_state_change = self.save_state
+        self.monitors[site.name] = site_monitor
+        return site_monitor
+
+    # Handle signals on the scheduler thread, as a callback that is due straight away
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.scheduler.call_soon(self.stop, "SIGTERM"))
+        signal.signal(signal.SIGINT, lambda signum, frame: self.scheduler.call_soon(self.stop, "SIGINT"))
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.scheduler.call_soon(self.reload))
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.scheduler.call_soon(self.print_status))
+
+    # Start monitoring all of the sites, and run the scheduler until stopped
+    def run(self):
+        self.install_signal_handlers()
+        for site_monitor in self.monitors.values():
+            site_monitor.start()
+        self.start_watching()
+        self.start_saving_state()
+        try:
+            self.scheduler.run()
+        finally:
+            self.scheduler.shutdown()
+            # Write any log entries still waiting in the background log writer
+            loger.close_log_file()
+            probe_store.close_probe_store()
+
+    # Stop monitoring all of the sites
+    def stop(self, reason="stopped"):
+        print_message(f"Stopping the network monitoring ({reason})...")
+        loger.write_to_log_file("neutral", f"Program stopped ({reason})")
+        for site_monitor in self.monitors.values():
+            site_monitor.stop()
+        self.save_state()
+        self.scheduler.stop()
+
+    # Save the state of all of the sites to the state file
+    def save_state(self):
+        if self.state_path is None:
+            return
+        try:
+            state_file.save_state_file({name: site_monitor.export_state() for name, site_monitor in self.monitors.items()}, self.state_path)
+        except OSError as e:
+            print_message(f"{format.RED}Failed to save the state file: {e}{format.END}")
+            loger.write_to_log_file("error", f"Failed to save the state file: {e}")
+
+    # Save the state file every `state_save_interval` seconds from now, for the ping statistics
+    def start_saving_state(self):
+        if self.state_save_timer is not None:
+            self.state_save_timer.cancel()
+            self.state_save_timer = None
+        if self.state_path is not None:
+            self.state_save_timer = self.scheduler.call_later(self.state_save_interval, self.save_state_periodically)
+
+    def save_state_periodically(self):
+        self.state_save_timer = None
+        self.save_state()
+        self.start_saving_state()
+
+    # The status of all of the sites
+    def status(self):
+        return [site_monitor.status() for site_monitor in self.monitors.values()]
+
+    # Print the status of all of the sites, as one JSON object in daemon mode
+    def print_status(self):
+        if not console_messages:
+            loger.write_to_stdout({"timestamp": datetime.now().isoformat(), "status": "neutral", "sites": self.status()})
+            return
+        for site_status in self.status():
+            print_message(f"[{site_status['name']}] state: {site_status['state']} ({site_status['seconds_in_state']:.0f}s), next event in: {site_status['seconds_until_next_event']}s, reboots in a row: {site_status['number_of_reboots_in_a_row']}, last check: {site_status['last_check_result']}")
+
+    # The modification time and size of the configuration file, or None if it can't be read
+    def get_configuration_stamp(self):
+        if self.configuration_path is None:
+            return None
+        try:
+            file_stat = os.stat(self.configuration_path)
+        except OSError:
+            return None
+        return (file_stat.st_mtime_ns, file_stat.st_size)
+
+    # Check the configuration file for changes every `watch_interval` seconds (0 turns it off)
+    def start_watching(self):
+        if self.watch_timer is None and self.watch_interval > 0 and self.load_configuration is not None and self.configuration_path is not None:
+            self.watch_timer = self.scheduler.call_later(self.watch_interval, self.watch_configuration_file)
+
+    # Reload the configuration settings if the configuration file has changed since last time
+    def watch_configuration_file(self):
+        self.watch_timer = None
+        configuration_stamp = self.get_configuration_stamp()
+        if configuration_stamp is not None and configuration_stamp != self.configuration_stamp:
+            print_message(f"`{self.configuration_path}` has changed, reloading the configuration settings...")
+            self.reload()
+        self.start_watching()
+
+    # Keep the current settings after a reload that failed, and say why
+    def reload_failed(self, problems=()):
+        for problem in problems:
+            print_message(f"{format.RED}Invalid configuration settings: {problem}{format.END}")
+            loger.write_to_log_file("error", f"Invalid configuration settings: {problem}")
+        print_message(f"{format.RED}Configuration reload failed, keeping the current settings.{format.END}")
+        loger.write_to_log_file("error", "Configuration reload failed, keeping the current settings")
+
+    # Use the top level settings that have changed and can be changed while the program is
+    # running, and say which of the changed ones are only used after a restart
+    def reload_top_level_settings(self, configuration_settings):
+        changed_settings = []
+        for name in TOP_LEVEL_SETTINGS:
+            value = getattr(configuration_settings, name)
+            # Settings that weren't known before are taken as they are
+            if self.top_level_settings.setdefault(name, value) == value:
+                continue
+            changed_settings.append(name)
+            if name not in RELOADABLE_SETTINGS:
+                print_message(f"{format.YELLOW}The new `{get_setting_name(name)}` setting is only used after the program is restarted, still using {self.top_level_settings[name]}.{format.END}")
+                loger.write_to_log_file("error", f"The new `{get_setting_name(name)}` setting is only used after the program is restarted, still using {self.top_level_settings[name]}")
+                continue
+            self.top_level_settings[name] = value
+            print_message(f"Using the new `{get_setting_name(name)}` setting ({value}).")
+            loger.write_to_log_file("neutral", f"Using the new `{get_setting_name(name)}` setting ({value})")
+
+        if "config_watch_interval" in changed_settings:
+            self.watch_interval = configuration_settings.config_watch_interval
+            if self.watch_timer is not None:
+                self.watch_timer.cancel()
+                self.watch_timer = None
+        if "dns_cache_size" in changed_settings or "dns_cache_max_stale" in changed_settings:
+            dns_cache.reconfigure_dns_cache(configuration_settings.dns_cache_size, configuration_settings.dns_cache_max_stale)
+        if any(name in changed_settings for name in ("state_file", "state_file_path", "state_save_interval")):
+            state_path = configuration_settings.state_file_path if configuration_settings.state_file else None
+            self.state_save_interval = configuration_settings.state_save_interval
+            if state_path != self.state_path:
+                self.state_path = state_path
+                # Carry on in the new state file straight away
+                self.save_state()
+            self.start_saving_state()
+
+    # Reload the configuration settings. Sites are matched by name: existing sites keep their
+    # state (including their ping statistics) and use the new settings from their next check
+    # cycle, new sites are started and sites that are no longer in the configuration settings
+    # are stopped. Settings that are not valid are not used at all.
+    # Top level settings are used straight away if they can be, see `reload_top_level_settings`.
+    def reload(self):
+        if self.load_configuration is None:
+            return
+        self.configuration_stamp = self.get_configuration_stamp()
+        configuration_settings = self.load_configuration()
+        if configuration_settings is None:
+            self.reload_failed()
+            return
+
+        # Each site's settings come from the new config file alone, except the router details
+        # that were entered when the program started, which are kept while the file still
+        # leaves them out
+        for site in configuration_settings.sites:
+            site_monitor = self.monitors.get(site.name)
+            if site_monitor is None:
+                continue
+            for key, value in site_monitor.settings.manual_router_details.items():
+                if site.router_details.get(key) in ("", None):
+                    site.router_details[key] = site.manual_router_details[key] = value
+
+        # Check the router details again with what was kept, as every site needs them to be
+        # monitored, before any of the new settings are used
+        problems = []
+        for site in configuration_settings.sites:
+            configuration.validate_router_details(site.router_details, True, f"[{site.name}] ", problems)
+        if problems:
+            self.reload_failed(problems)
+            return
+
+        self.reload_top_level_settings(configuration_settings)
+        self.start_watching()
+        self.show_names = len(configuration_settings.sites) > 1
+        for site in configuration_settings.sites:
+            site_monitor = self.monitors.get(site.name)
+            if site_monitor is None:
+                self.add_site_monitor(site).start()
+            else:
+                site_monitor.show_name(self.show_names)
+                site_monitor.update_settings(site)
+
+        site_names = {site.name for site in configuration_settings.sites}
+        for name in list(self.monitors):
+            if name not in site_names:
+                self.monitors.pop(name).stop()
+                metrics.forget_site(name)
+
+        print_message("Configuration settings reloaded.")
+        loger.write_to_log_file("neutral", "Configuration settings reloaded")
@@ -0,0 +1,113 @@
+# This file is used by the program to check the internet connection by pinging all
+# of the addresses in the ping list at the same time. This file is not inteded to be
+# ran by itself, but rather imported by `monitor.py`.
+# Each ping is ran on one of the scheduler's worker threads, and retries are scheduler
+# timers, so a check cycle takes about as long as the slowest address instead of the sum
+# of all of them, and nothing sleeps while it waits to retry. The results are handed
+# back to the scheduler thread, which counts the failed addresses and stops the cycle as
+# soon as the decision is known: either enough addresses have failed to reach the
+# unreachable ping threshold, or too few addresses are left for it to be reached.
+# A hostname that can't be resolved (a DNS failure) is retried like a failed ping, but by
+# default it doesn't count as a failed address: a slow or broken resolver is not a reason
+# to reboot the network.
+
+# Import the required modules
+import time
+import tracing
+from scheduler import Scheduler
+from prober import DNS_FAILURE
+
+# One check cycle of a ping list, ran by a scheduler.
+#  - ping_function(address) must return the round trip time (RTT) in microseconds if the
+#    address is reachable, None if it is not, or DNS_FAILURE (see `prober.create_prober`).
+#  - ping_retry_amount is the number of retries after the first failed ping.
+#  - count_dns_failures: count addresses that could not be resolved as failed addresses.
+#  - on_attempt(address, attempt, attempts, rtt) is called for each ping attempt, on the
+#    scheduler thread, so it is safe to print, log and update statistics from it.
+#  - on_complete(failed_pings) is called once, as soon as the decision is known.
+class PingCheckCycle:
+    __slots__ = ("scheduler", "ping_list", "ping_function", "unreachable_ping_threshold", "attempts", "ping_retry_interval", "on_attempt", "on_complete", "count_dns_failures", "failed_pings", "dns_failures", "pending_addresses", "retry_timers", "started", "finished")
+
+    def __init__(self, scheduler, ping_list, ping_function, unreachable_ping_threshold, ping_retry_amount, ping_retry_interval, on_attempt=None, on_complete=None, count_dns_failures=False):
+        self.scheduler = scheduler
+        self.ping_list = ping_list
+        self.ping_function = ping_function
+        self.unreachable_ping_threshold = unreachable_ping_threshold
+        self.attempts = ping_retry_amount + 1
+        self.ping_retry_interval = ping_retry_interval
+        self.on_attempt = on_attempt
+        self.on_complete = on_complete
+        self.count_dns_failures = count_dns_failures
+        self.failed_pings = 0
+        # Addresses that could not be resolved, and were not counted as failed
+        self.dns_failures = 0
+        self.pending_addresses = len(ping_list)
+        self.retry_timers = []
+        self.started = None
+        self.finished = False
+
+    # Start pinging all of the addresses
+    def start(self):
+        self.started = time.perf_counter()
+        for ping_address in self.ping_list:
+            self.ping(ping_address, 0)
+        self.check_decision()
+
+    # Ping an address on a worker thread
+    def ping(self, ping_address, attempt):
+        if self.finished:
+            return
+        # A probe that raises an exception counts as a failed ping
+        self.scheduler.run_in_executor(lambda rtt: self.on_ping_result(ping_address, attempt, rtt), self.ping_function, ping_address, on_error=lambda error: self.on_ping_result(ping_address, attempt, None))
+
+    # Handle the result of a ping
+    def on_ping_result(self, ping_address, attempt, rtt):
+        # The decision has already been made, the result is not needed
+        if self.finished:
+            return
+        if self.on_attempt:
+            self.on_attempt(ping_address, attempt, self.attempts, rtt)
+        if (rtt is None or rtt == DNS_FAILURE) and attempt < self.attempts - 1:
+            self.retry_timers.append(self.scheduler.call_later(self.ping_retry_interval, self.ping, ping_address, attempt + 1))
+            return
+        self.pending_addresses -= 1
+        if rtt is None or (rtt == DNS_FAILURE and self.count_dns_failures):
+            self.failed_pings += 1
+        elif rtt == DNS_FAILURE:
+            self.dns_failures += 1
+        self.check_decision()
+
+    # Finish the cycle as soon as the threshold is reached, or can no longer be reached
+    def check_decision(self):
+        if self.finished:
+            return
+        if self.failed_pings >= self.unreachable_ping_threshold or self.failed_pings + self.pending_addresses < self.unreachable_ping_threshold:
+            self.cancel()
+            tracing.record("ping.check_cycle", time.perf_counter() - self.started)
+            if self.on_complete:
+                self.on_complete(self.failed_pings)
+
+    # Stop the cycle, any pings still running finish in the background and are ignored
+    def cancel(self):
+        self.finished = True
+        for timer in self.retry_timers:
+            timer.cancel()
+        self.retry_timers = []
+
+# Check the list of ping addresses at the same time and return the number of failed addresses.
+# This blocks until the decision is known, see `PingCheckCycle` for the arguments.
+def check_ping_list(ping_list, ping_function, unreachable_ping_threshold, ping_retry_amount, ping_retry_interval, on_attempt=None):
+    scheduler = Scheduler(max_workers=max(1, len(ping_list)))
+    results = []
+
+    def on_complete(failed_pings):
+        results.append(failed_pings)
+        scheduler.stop()
+
+    cycle = PingCheckCycle(scheduler, ping_list, ping_function, unreachable_ping_threshold, ping_retry_amount, ping_retry_interval, on_attempt, on_complete)
+    scheduler.call_soon(cycle.start)
+    try:
+        scheduler.run()
+    finally:
+        scheduler.shutdown()
+    return results[0]
@@ -0,0 +1,118 @@
+# This file is used by the program to keep rolling statistics about the pings to each
+# address in the ping list. This file is not inteded to be ran by itself, but rather
+# imported by `monitor.py`.
+# For each address, the last `window_size` pings are kept in a ring buffer (a fixed size
+# list that is overwritten from the start once it is full), so the memory used stays the
+# same however long the program runs. Adding a ping keeps running totals up to date, so
+# the packet loss, mean round trip time (RTT) and jitter are always ready without looking
+# through the whole buffer. Only the percentiles (p50 / p95 / p99) sort the buffer, and
+# only when they are asked for.
+
+# Default statistics settings
+DEFAULT_WINDOW_SIZE = 100
+DEFAULT_MINIMUM_SAMPLES = 10
+
+# Rolling ping statistics for one address
+class PingStatistics:
+    __slots__ = ("window_size", "samples", "next_index", "sample_count", "lost_count", "rtt_total", "jitter", "last_rtt")
+
+    def __init__(self, window_size=DEFAULT_WINDOW_SIZE):
+        self.window_size = window_size
+        # RTT of each ping in microseconds, or None if the ping was lost
+        self.samples = [None] * window_size
+        self.next_index = 0
+        self.sample_count = 0
+        self.lost_count = 0
+        self.rtt_total = 0
+        # Smoothed jitter in microseconds (mean deviation between consecutive RTTs, as in RFC 3550)
+        self.jitter = 0.0
+        self.last_rtt = None
+
+    # Add the result of a ping: the RTT in microseconds, or None if the ping was lost
+    def add_sample(self, rtt):
+        # Remove the oldest sample from the running totals once the buffer is full
+        if self.sample_count == self.window_size:
+            oldest = self.samples[self.next_index]
+            if oldest is None:
+                self.lost_count -= 1
+            else:
+                self.rtt_total -= oldest
+        else:
+            self.sample_count += 1
+
+        self.samples[self.next_index] = rtt
+        self.next_index = (self.next_index + 1) % self.window_size
+
+        if rtt is None:
+            self.lost_count += 1
+            return
+        self.rtt_total += rtt
+        if self.last_rtt is not None:
+            self.jitter += (abs(rtt - self.last_rtt) - self.jitter) / 16
+        self.last_rtt = rtt
+
+    # Fraction of the pings in the buffer that were lost (0 to 1)
+    def loss_rate(self):
+        if self.sample_count == 0:
+            return 0.0
+        return self.lost_count / self.sample_count
+
+    # Mean RTT of the successful pings in the buffer, in microseconds (None if there are none)
+    def mean_rtt(self):
+        received_count = self.sample_count - self.lost_count
+        if received_count == 0:
+            return None
+        return self.rtt_total / received_count
+
+    # RTT percentiles of the successful pings in the buffer, in microseconds (None if there are none)
+    def percentiles(self, percents=(50, 95, 99)):
+        rtts = sorted(rtt for rtt in self.samples if rtt is not None)
+        if not rtts:
+            return {percent: None for percent in percents}
+        return {percent: rtts[min(len(rtts) - 1, int(len(rtts) * percent / 100))] for percent in percents}
+
+    # The samples (oldest first) and the jitter, to save them to the state file (see `state_file.py`)
+    def export_samples(self):
+        start = self.next_index if self.sample_count == self.window_size else 0
+        samples = [self.samples[(start + index) % self.window_size] for index in range(self.sample_count)]
+        return {"samples": samples, "jitter": self.jitter, "last_rtt": self.last_rtt}
+
+    # Add saved samples back, only the newest `window_size` are kept if the window is smaller now
+    def restore_samples(self, saved):
+        for rtt in saved["samples"][-self.window_size:]:
+            self.add_sample(rtt)
+        self.jitter = saved["jitter"]
+        self.last_rtt = saved["last_rtt"]
+
+    # All of the statistics, with times in milliseconds
+    def summary(self):
+        mean_rtt = self.mean_rtt()
+        percentiles = self.percentiles()
+        return {
+            "samples": self.sample_count,
+            "loss_rate": self.loss_rate(),
+            "mean_rtt": None if mean_rtt is None else mean_rtt / 1000,
+            "p50_rtt": None if percentiles[50] is None else percentiles[50] / 1000,
+            "p95_rtt": None if percentiles[95] is None else percentiles[95] / 1000,
+            "p99_rtt": None if percentiles[99] is None else percentiles[99] / 1000,
+            "jitter": self.jitter / 1000
+        }
+
+# Check the statistics of an address against the configured limits. Returns the reason the
+# connection to the address is considered degraded, or None if it is not (or if there are
+# not enough pings yet to tell). Limits that are None are not checked.
+#  - max_packet_loss: percentage of lost pings (0-100)
+#  - max_latency: 95th percentile RTT in milliseconds
+#  - max_jitter: jitter in milliseconds
+def degraded_reason(statistics, max_packet_loss=None, max_latency=None, max_jitter=None, minimum_samples=DEFAULT_MINIMUM_SAMPLES):
+    if statistics.sample_count < minimum_samples:
+        return None
+    if max_packet_loss is not None and statistics.loss_rate() * 100 > max_packet_loss:
+        return f"packet loss {statistics.loss_rate() * 100:.0f}% > {max_packet_loss}%"
+    if max_latency is not None:
+        p95_rtt = statistics.percentiles((95,))[95]
+        if p95_rtt is not None and p95_rtt / 1000 > max_latency:
+            return f"p95 latency {p95_rtt / 1000:.1f} ms > {max_latency} ms"
+    if max_jitter is not None and statistics.jitter / 1000 > max_jitter:
+        return f"jitter {statistics.jitter / 1000:.1f} ms > {max_jitter} ms"
+    return None
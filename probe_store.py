@@ -0,0 +1,276 @@
+# This file is used by the program to keep every probe result (every ping attempt of every
+# address) for long-term capacity planning, in a compact binary format instead of the JSON
+# log files. It is imported by `monitor.py`, but can also be ran by itself to query the
+# stored probe results (see the bottom of this file).
+# The probe results are stored in `logs/probes`:
+#  - `targets.json` maps each address to a small target id.
+#  - `{YYYY-MM-DD}.bin` is one segment per day (UTC), made of fixed-width 20 byte records:
+#    the timestamp (milliseconds since the epoch), the target id, the RTT in microseconds
+#    and a status code. Records are only ever appended, so each segment is in time order.
+# Segments are grown in chunks and memory-mapped, so appending a record is a copy into
+# memory rather than a write to the file. Space that hasn't been written yet is all zeros,
+# so the end of a segment is the first record with a timestamp of 0, and the segment is
+# truncated to its records when it is closed. Range queries binary search the timestamps
+# to find where to start and stop, then unpack the records in between in one go.
+
+# Import the required modules
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import threading
+import datetime
+
+# The record format: timestamp (ms), target id, RTT (µs), status code, 3 padding bytes
+RECORD_FORMAT = struct.Struct("<qIIB3x")
+RECORD_SIZE = RECORD_FORMAT.size
+TIMESTAMP_FORMAT = struct.Struct("<q")
+
+# Status codes
+STATUS_REACHABLE = 0
+STATUS_UNREACHABLE = 1
+STATUS_NAMES = {STATUS_REACHABLE: "reachable", STATUS_UNREACHABLE: "unreachable"}
+
+# The RTT stored for probes that got no answer
+NO_RTT = 0xFFFFFFFF
+
+# Default probe store settings
+DEFAULT_PROBE_STORE_PATH = "logs/probes"
+DEFAULT_SEGMENT_CHUNK_RECORDS = 65536 # records the segment is grown by at a time (1.25 MiB)
+
+MILLISECONDS_PER_DAY = 86400 * 1000
+
+# The probe store, None until `open_probe_store` is called (storing probe results is off)
+probe_store = None
+
+# The name of the segment for a timestamp in milliseconds
+def get_segment_name(timestamp_ms):
+    return datetime.datetime.fromtimestamp(timestamp_ms / 1000, datetime.timezone.utc).strftime("%Y-%m-%d") + ".bin"
+
+# The first timestamp (ms) of a segment
+def get_segment_start(segment_name):
+    return int(datetime.datetime.strptime(segment_name[:-4], "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
+
+# The number of records in a segment, the first record with a timestamp of 0 is the end
+def count_records(buffer):
+    low = 0
+    high = len(buffer) // RECORD_SIZE
+    while low < high:
+        middle = (low + high) // 2
+        if TIMESTAMP_FORMAT.unpack_from(buffer, middle * RECORD_SIZE)[0] == 0:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+# The index of the first record in a segment with a timestamp of at least `timestamp_ms`
+def find_record(buffer, record_count, timestamp_ms):
+    low = 0
+    high = record_count
+    while low < high:
+        middle = (low + high) // 2
+        if TIMESTAMP_FORMAT.unpack_from(buffer, middle * RECORD_SIZE)[0] < timestamp_ms:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+# Load the address to target id map
+def load_targets(path):
+    targets_path = os.path.join(path, "targets.json")
+    if not os.path.exists(targets_path):
+        return {}
+    with open(targets_path, "r") as file:
+        return json.load(file)
+
+# Appends probe results to the day segments of a probe store. This can be called from any thread.
+class ProbeStore:
+    def __init__(self, path=DEFAULT_PROBE_STORE_PATH, chunk_records=DEFAULT_SEGMENT_CHUNK_RECORDS):
+        self.path = path
+        self.chunk_size = chunk_records * RECORD_SIZE
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.targets = load_targets(path)
+        self.segment_name = None
+        # The range of timestamps (ms) of the current segment, so the day is only worked out once
+        self.segment_start_ms = 0
+        self.segment_end_ms = 0
+        self.file = None
+        self.map = None
+        self.offset = 0
+
+    # The target id of an address, adding it to `targets.json` the first time it is seen
+    def get_target_id(self, address):
+        target_id = self.targets.get(address)
+        if target_id is None:
+            target_id = len(self.targets)
+            self.targets[address] = target_id
+            temporary_path = os.path.join(self.path, "targets.json.tmp")
+            with open(temporary_path, "w") as file:
+                json.dump(self.targets, file, indent=4)
+            os.replace(temporary_path, os.path.join(self.path, "targets.json"))
+        return target_id
+
+    # Open (or create) the segment for a day, and find where its records end
+    def open_segment(self, segment_name):
+        self.close_segment()
+        self.file = open(os.path.join(self.path, segment_name), "a+b")
+        size = os.fstat(self.file.fileno()).st_size
+        if size % RECORD_SIZE:
+            # A partly written record at the end (e.g. a crash while the segment was truncated)
+            size -= size % RECORD_SIZE
+            self.file.truncate(size)
+        if size == 0:
+            size = self.chunk_size
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.offset = count_records(self.map) * RECORD_SIZE
+        self.segment_name = segment_name
+        self.segment_start_ms = get_segment_start(segment_name)
+        self.segment_end_ms = self.segment_start_ms + MILLISECONDS_PER_DAY
+
+    # Grow the current segment by one chunk
+    def grow_segment(self):
+        size = len(self.map) + self.chunk_size
+        self.map.close()
+        self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+
+    # Close the current segment, cutting off the space that hasn't been written yet
+    def close_segment(self):
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.truncate(self.offset)
+            self.file.close()
+            self.file = None
+        self.segment_name = None
+        self.segment_start_ms = 0
+        self.segment_end_ms = 0
+        self.offset = 0
+
+    # Store a probe result, the RTT in microseconds or None if the address didn't answer
+    def append(self, address, rtt, timestamp_ms=None):
+        if timestamp_ms is None:
+            timestamp_ms = time.time_ns() // 1000000
+        if rtt is None:
+            status = STATUS_UNREACHABLE
+            rtt = NO_RTT
+        else:
+            status = STATUS_REACHABLE
+            rtt = min(int(rtt), NO_RTT - 1)
+
+        with self.lock:
+            if not self.segment_start_ms <= timestamp_ms < self.segment_end_ms:
+                self.open_segment(get_segment_name(timestamp_ms))
+            if self.offset + RECORD_SIZE > len(self.map):
+                self.grow_segment()
+            RECORD_FORMAT.pack_into(self.map, self.offset, timestamp_ms, self.get_target_id(address), rtt, status)
+            self.offset += RECORD_SIZE
+
+    # Write the records to the disk
+    def flush(self):
+        with self.lock:
+            if self.map is not None:
+                self.map.flush()
+
+    def close(self):
+        with self.lock:
+            self.close_segment()
+
+# Read the probe results between two timestamps in milliseconds (start included, end not),
+# optionally for one address only. Yields (timestamp_ms, address, rtt, status) in time
+# order, the RTT is in microseconds or None if the address didn't answer.
+def read_probes(start_ms=None, end_ms=None, address=None, path=DEFAULT_PROBE_STORE_PATH):
+    targets = load_targets(path)
+    addresses = {target_id: target_address for target_address, target_id in targets.items()}
+    target_id = None
+    if address is not None:
+        target_id = targets.get(address)
+        if target_id is None:
+            return
+
+    if not os.path.isdir(path):
+        return
+    segment_names = sorted(name for name in os.listdir(path) if name.endswith(".bin"))
+    for segment_name in segment_names:
+        # Skip the segments outside of the range by their day
+        day_start_ms = get_segment_start(segment_name)
+        if end_ms is not None and day_start_ms >= end_ms:
+            break
+        if start_ms is not None and day_start_ms + MILLISECONDS_PER_DAY <= start_ms:
+            continue
+
+        with open(os.path.join(path, segment_name), "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < RECORD_SIZE:
+                continue
+            with mmap.mmap(file.fileno(), size - size % RECORD_SIZE, access=mmap.ACCESS_READ) as buffer:
+                record_count = count_records(buffer)
+                first = 0 if start_ms is None else find_record(buffer, record_count, start_ms)
+                last = record_count if end_ms is None else find_record(buffer, record_count, end_ms)
+                view = memoryview(buffer)[first * RECORD_SIZE:last * RECORD_SIZE]
+                try:
+                    for timestamp_ms, record_target_id, rtt, status in RECORD_FORMAT.iter_unpack(view):
+                        if target_id is not None and record_target_id != target_id:
+                            continue
+                        yield timestamp_ms, addresses.get(record_target_id), None if rtt == NO_RTT else rtt, status
+                finally:
+                    view.release()
+
+# Open the probe store, and turn storing probe results on
+def open_probe_store(path=DEFAULT_PROBE_STORE_PATH):
+    global probe_store
+    close_probe_store()
+    probe_store = ProbeStore(path)
+
+# Store a probe result (does nothing if storing probe results is off)
+def record_probe(address, rtt):
+    if probe_store is not None:
+        probe_store.append(address, rtt)
+
+# Close the probe store (ran when the program stops)
+def close_probe_store():
+    global probe_store
+    if probe_store is not None:
+        probe_store.close()
+        probe_store = None
+
+# Parse a date (YYYY-MM-DD) or date and time (ISO format) to milliseconds since the epoch, in UTC
+def parse_time(value):
+    moment = datetime.datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+if __name__ == "__main__":
+    # Summarise the stored probe results, e.g:
+    #   python probe_store.py
+    #   python probe_store.py 2025-03-01 2025-04-01
+    #   python probe_store.py 2025-03-01 2025-04-01 8.8.8.8
+    start_ms = parse_time(sys.argv[1]) if len(sys.argv) > 1 else None
+    end_ms = parse_time(sys.argv[2]) if len(sys.argv) > 2 else None
+    address = sys.argv[3] if len(sys.argv) > 3 else None
+
+    started = time.perf_counter()
+    summary = {}
+    for timestamp_ms, probe_address, rtt, status in read_probes(start_ms, end_ms, address):
+        address_summary = summary.setdefault(probe_address, [0, 0, 0])
+        address_summary[0] += 1
+        if rtt is None:
+            address_summary[1] += 1
+        else:
+            address_summary[2] += rtt
+    elapsed = time.perf_counter() - started
+
+    total = 0
+    for probe_address, (count, lost, rtt_total) in sorted(summary.items()):
+        total += count
+        answered = count - lost
+        mean_rtt = f"{rtt_total / answered / 1000:.1f} ms" if answered else "n/a"
+        print(f"{probe_address}: {count} probes, {lost / count * 100:.1f}% loss, mean RTT: {mean_rtt}")
+    print(f"Read {total} probe results in {elapsed:.2f} seconds")
@@ -0,0 +1,240 @@
+# This file is used by the program to probe the addresses in the ping list without
+# starting a new `ping` process for every ping. This file is not inteded to be ran by
+# itself, but rather imported by `monitor.py`.
+# There are a few different ways (probe methods) to check if an address is reachable:
+#  - "icmp": sends an ICMP echo request (a ping) from Python. It uses an unprivileged
+#    ICMP datagram socket if the system allows it, or a raw socket if the program is ran
+#    as root. If neither is allowed, it falls back to the "subprocess" method.
+#  - "tcp": opens a TCP connection to a port (443 by default). A refused connection still
+#    counts as reachable, as the address had to be reachable to refuse it.
+#  - "dns": sends a DNS query over UDP to the address, for addresses that are DNS servers
+#    (such as 8.8.8.8 and 1.1.1.1). Any answer counts as reachable.
+#  - "subprocess": runs the system `ping` command, which is how the program used to ping.
+# Every probe method has a timeout (in seconds) and returns the round trip time (RTT) in
+# microseconds if the address is reachable, or None if it is not. Hostnames are resolved
+# with the DNS cache (see `dns_cache.py`) before the timer starts, and a hostname that can't
+# be resolved returns DNS_FAILURE instead, as that says nothing about the connection itself.
+
+# Import the required modules
+import re
+import sys
+import math
+import time
+import random
+import socket
+import struct
+import threading
+import subprocess
+import dns_cache
+
+# Default probe settings
+DEFAULT_PROBE_METHOD = "icmp"
+DEFAULT_PROBE_TIMEOUT = 1
+DEFAULT_TCP_PORT = 443
+DEFAULT_DNS_QUERY_NAME = "www.google.com"
+DNS_PORT = 53
+
+# Returned by a probe instead of the RTT when the address is a hostname that could not be resolved
+DNS_FAILURE = -1
+
+# Raised when a probe method can not be used on this system (e.g. no permission to open ICMP sockets)
+class ProbeNotSupportedError(Exception):
+    pass
+
+# ICMP echo request sequence numbers, shared by all threads
+icmp_sequence_lock = threading.Lock()
+icmp_sequence = random.randint(0, 0xFFFF)
+
+# Whether ICMP sockets can be opened on this system (None until the first ICMP probe)
+icmp_sockets_supported = None
+
+# Get the next ICMP echo request sequence number
+def next_icmp_sequence():
+    global icmp_sequence
+    with icmp_sequence_lock:
+        icmp_sequence = (icmp_sequence + 1) & 0xFFFF
+        return icmp_sequence
+
+# Calculate the internet checksum of an ICMP packet (RFC 1071)
+def icmp_checksum(data):
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+# Open an ICMP socket, an unprivileged datagram socket if possible, otherwise a raw socket
+def open_icmp_socket():
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+    except OSError:
+        pass
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+    except OSError as e:
+        raise ProbeNotSupportedError(f"ICMP sockets are not available: {e}")
+
+# Check if the result of a probe means the address answered
+def is_reachable(rtt):
+    return rtt is not None and rtt != DNS_FAILURE
+
+# Resolve an address (IP address or hostname) to an IPv4 address, or None if it can't be resolved
+def resolve_address(address):
+    return dns_cache.resolve(address)
+
+# Probe: ICMP echo request
+def probe_icmp(address, timeout=DEFAULT_PROBE_TIMEOUT):
+    ip_address = resolve_address(address)
+    if ip_address is None:
+        return DNS_FAILURE
+
+    sock, is_raw_socket = open_icmp_socket()
+    try:
+        identifier = random.randint(0, 0xFFFF)
+        sequence = next_icmp_sequence()
+        payload = b"automatic-network-rebooter".ljust(32, b"\x00")
+        header = struct.pack("!BBHHH", 8, 0, 0, identifier, sequence)
+        checksum = icmp_checksum(header + payload)
+        packet = struct.pack("!BBHHH", 8, 0, checksum, identifier, sequence) + payload
+
+        start = time.perf_counter_ns()
+        deadline = start + int(timeout * 1_000_000_000)
+        sock.sendto(packet, (ip_address, 0))
+
+        while True:
+            remaining = deadline - time.perf_counter_ns()
+            if remaining <= 0:
+                return None
+            sock.settimeout(remaining / 1_000_000_000)
+            data, reply_address = sock.recvfrom(1024)
+            received = time.perf_counter_ns()
+            # Raw sockets also receive the IP header
+            if is_raw_socket:
+                data = data[(data[0] & 0x0F) * 4:]
+            if len(data) < 8 or reply_address[0] != ip_address:
+                continue
+            reply_type, _, _, reply_identifier, reply_sequence = struct.unpack("!BBHHH", data[:8])
+            # Datagram sockets have their identifier set by the kernel, so it is only checked for raw sockets
+            if reply_type == 0 and reply_sequence == sequence and (not is_raw_socket or reply_identifier == identifier):
+                return (received - start) // 1000
+    except OSError:
+        # Includes socket.timeout, and "network is unreachable" errors
+        return None
+    finally:
+        sock.close()
+
+# Probe: TCP connection
+def probe_tcp(address, timeout=DEFAULT_PROBE_TIMEOUT, port=DEFAULT_TCP_PORT):
+    ip_address = resolve_address(address)
+    if ip_address is None:
+        return DNS_FAILURE
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        start = time.perf_counter_ns()
+        try:
+            sock.connect((ip_address, port))
+        except ConnectionRefusedError:
+            # The address answered with a reset, so it is reachable
+            pass
+        return (time.perf_counter_ns() - start) // 1000
+    except OSError:
+        return None
+    finally:
+        sock.close()
+
+# Probe: DNS query over UDP
+def probe_dns(address, timeout=DEFAULT_PROBE_TIMEOUT, query_name=DEFAULT_DNS_QUERY_NAME):
+    ip_address = resolve_address(address)
+    if ip_address is None:
+        return DNS_FAILURE
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        query_id = random.randint(0, 0xFFFF)
+        query = dns_cache.build_dns_query(query_id, query_name)
+
+        start = time.perf_counter_ns()
+        deadline = start + int(timeout * 1_000_000_000)
+        sock.sendto(query, (ip_address, DNS_PORT))
+
+        while True:
+            remaining = deadline - time.perf_counter_ns()
+            if remaining <= 0:
+                return None
+            sock.settimeout(remaining / 1_000_000_000)
+            data, reply_address = sock.recvfrom(4096)
+            received = time.perf_counter_ns()
+            if len(data) < 12 or reply_address[0] != ip_address:
+                continue
+            reply_id, flags = struct.unpack("!HH", data[:4])
+            # Any answer (even an error, such as "refused") means the DNS server is reachable
+            if reply_id == query_id and flags & 0x8000:
+                return (received - start) // 1000
+    except OSError:
+        return None
+    finally:
+        sock.close()
+
+# Probe: the system `ping` command
+def probe_subprocess(address, timeout=DEFAULT_PROBE_TIMEOUT):
+    # Resolve the address here, so `ping` doesn't look it up again every time
+    ip_address = resolve_address(address)
+    if ip_address is None:
+        return DNS_FAILURE
+
+    # `ping -W` is in milliseconds on macOS and in whole seconds on Linux
+    if sys.platform == "darwin":
+        wait_argument = str(max(1, int(timeout * 1000)))
+    else:
+        wait_argument = str(max(1, math.ceil(timeout)))
+
+    try:
+        start = time.perf_counter_ns()
+        result = subprocess.run(["ping", "-c", "1", "-W", wait_argument, ip_address], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=timeout + 1)
+        elapsed = (time.perf_counter_ns() - start) // 1000
+    except Exception:
+        return None
+    if result.returncode != 0:
+        return None
+    # Use the time reported by `ping` if there is one, it doesn't include starting the process
+    match = re.search(r"time[=<]([\d.]+) ?ms", result.stdout)
+    if match:
+        return int(float(match.group(1)) * 1000)
+    return elapsed
+
+# The available probe methods
+PROBE_METHODS = {
+    "icmp": probe_icmp,
+    "tcp": probe_tcp,
+    "dns": probe_dns,
+    "subprocess": probe_subprocess
+}
+
+# Create a probe function for the given settings. The returned function takes an address
+# and returns the RTT in microseconds, or None if the address is not reachable.
+def create_prober(method=DEFAULT_PROBE_METHOD, timeout=DEFAULT_PROBE_TIMEOUT, tcp_port=DEFAULT_TCP_PORT, dns_query_name=DEFAULT_DNS_QUERY_NAME):
+    if method not in PROBE_METHODS:
+        raise ValueError(f"Unknown probe method: {method} (expected one of: {', '.join(PROBE_METHODS)})")
+
+    if method == "tcp":
+        return lambda address: probe_tcp(address, timeout, tcp_port)
+    if method == "dns":
+        return lambda address: probe_dns(address, timeout, dns_query_name)
+    if method == "subprocess":
+        return lambda address: probe_subprocess(address, timeout)
+
+    def probe_icmp_with_fallback(address):
+        global icmp_sockets_supported
+        if icmp_sockets_supported is not False:
+            try:
+                rtt = probe_icmp(address, timeout)
+                icmp_sockets_supported = True
+                return rtt
+            except ProbeNotSupportedError:
+                icmp_sockets_supported = False
+        return probe_subprocess(address, timeout)
+
+    return probe_icmp_with_fallback
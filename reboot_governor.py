@@ -0,0 +1,62 @@
+# This file is used by the program to limit how often a site's router can be rebooted, so a
+# connection that a reboot can't fix doesn't end up in a loop of reboots (which can make the
+# ISP limit the connection or lock the router). This file is not inteded to be ran by itself,
+# but rather imported by `monitor.py`.
+# Before every reboot, the governor is asked if the router may be rebooted now. It says no if:
+#  - the router has already been rebooted `max_reboots_per_hour` times in the last hour, or
+#    `max_reboots_per_day` times in the last day (sliding windows, 0 for no limit), or
+#  - the last reboots didn't fix the connection, and the backoff since the last reboot hasn't
+#    passed yet. The backoff starts at `backoff_base` minutes after the first reboot that
+#    didn't help, and doubles after each one after that, up to `backoff_max` minutes.
+# The governor only keeps the times of the last few reboots (Unix times, oldest first), as
+# many as the highest limit. A window's limit is reached when the reboot that many reboots
+# ago is inside the window, so each check looks at one reboot time per window, however long
+# the history is.
+
+# Import the required modules
+import collections
+
+# Default reboot governor settings
+DEFAULT_MAX_REBOOTS_PER_HOUR = 4
+DEFAULT_MAX_REBOOTS_PER_DAY = 12
+DEFAULT_REBOOT_BACKOFF_BASE = 5 # minutes
+DEFAULT_REBOOT_BACKOFF_MAX = 240 # minutes
+DEFAULT_REBOOT_HISTORY_SIZE = 20 # reboot times kept per site, if the limits are lower
+
+# The sliding windows, in seconds, and their names for messages
+REBOOT_WINDOWS = ((3600, "hour"), (86400, "day"))
+
+# Decides if a site's router may be rebooted, from the times of its last reboots
+class RebootGovernor:
+    __slots__ = ("limits", "backoff_base", "backoff_max", "reboot_times")
+
+    def __init__(self, max_reboots_per_hour=DEFAULT_MAX_REBOOTS_PER_HOUR, max_reboots_per_day=DEFAULT_MAX_REBOOTS_PER_DAY, backoff_base=DEFAULT_REBOOT_BACKOFF_BASE, backoff_max=DEFAULT_REBOOT_BACKOFF_MAX, reboot_times=()):
+        # (window seconds, window name, limit) of each window that has a limit
+        self.limits = tuple((seconds, name, limit) for (seconds, name), limit in zip(REBOOT_WINDOWS, (max_reboots_per_hour, max_reboots_per_day)) if limit > 0)
+        self.backoff_base = backoff_base * 60
+        self.backoff_max = backoff_max * 60
+        history_size = max([DEFAULT_REBOOT_HISTORY_SIZE] + [limit for _, _, limit in self.limits])
+        self.reboot_times = collections.deque(reboot_times, maxlen=history_size)
+
+    # The backoff after a number of reboots in a row that didn't fix the connection, in seconds
+    def backoff(self, reboots_in_a_row):
+        if reboots_in_a_row <= 0 or self.backoff_base <= 0:
+            return 0
+        return min(self.backoff_base * 2 ** min(reboots_in_a_row - 1, 32), self.backoff_max)
+
+    # Check if the router may be rebooted at `now` (Unix time), after `reboots_in_a_row` reboots
+    # that didn't fix the connection. Returns how many seconds until it may (0 if it may now),
+    # and the reason.
+    def check(self, now, reboots_in_a_row=0):
+        for seconds, name, limit in self.limits:
+            if len(self.reboot_times) >= limit and self.reboot_times[-limit] > now - seconds:
+                return self.reboot_times[-limit] + seconds - now, f"{limit} reboots in the last {name}, the limit is {limit} per {name}"
+        backoff = self.backoff(reboots_in_a_row)
+        if backoff and self.reboot_times and self.reboot_times[-1] + backoff > now:
+            return self.reboot_times[-1] + backoff - now, f"backing off for {backoff / 60:g} minutes after {reboots_in_a_row} reboot(s) in a row that didn't fix the connection"
+        limits = ", ".join(f"{limit} per {name}" for _, name, limit in self.limits) or "no limits"
+        return 0, f"within the reboot limits ({limits})"
+
+    # Add a reboot to the history
+    def record_reboot(self, now):
+        self.reboot_times.append(now)
@@ -0,0 +1,110 @@
+# This file is used by the program to find out when the network is back after the router
+# has been rebooted, instead of always waiting `network_reboot_interval` minutes. This
+# file is not inteded to be ran by itself, but rather imported by `monitor.py`.
+# After the reboot request, the router (gateway) is pinged every few seconds:
+#  1. Until it stops answering, which shows the reboot has actually started. If it keeps
+#     answering for `down_timeout` seconds, the program carries on as if it had.
+#  2. Then, together with the ping list, until the router answers and fewer addresses
+#     than the unreachable ping threshold fail, for a few polls in a row.
+# The time from the reboot request to a stable connection is reported back, and the
+# `network_reboot_interval` is only used as an upper bound (by `monitor.py`).
+
+# Import the required modules
+import prober
+
+# Default recovery detection settings
+DEFAULT_RECOVERY_POLL_INTERVAL = 2 # seconds
+DEFAULT_RECOVERY_STABLE_POLLS = 3
+DEFAULT_RECOVERY_DOWN_TIMEOUT = 120 # seconds
+
+# Watches a site's network come back after a reboot, ran by a scheduler.
+#  - ping_function(address) returns the RTT in microseconds, or None (see `prober.create_prober`).
+#  - on_down(seconds) is called when the router stops answering.
+#  - on_recovered(seconds) is called once the connection has been stable for `stable_polls` polls.
+class RecoveryWatcher:
+    __slots__ = ("scheduler", "gateway_address", "ping_list", "ping_function", "unreachable_ping_threshold", "poll_interval", "stable_polls", "down_timeout", "on_down", "on_recovered", "started_at", "router_went_down", "stable_count", "pending_probes", "gateway_up", "failed_pings", "pinging_ping_list", "timer", "finished")
+
+    def __init__(self, scheduler, gateway_address, ping_list, ping_function, unreachable_ping_threshold, poll_interval=DEFAULT_RECOVERY_POLL_INTERVAL, stable_polls=DEFAULT_RECOVERY_STABLE_POLLS, down_timeout=DEFAULT_RECOVERY_DOWN_TIMEOUT, on_down=None, on_recovered=None):
+        self.scheduler = scheduler
+        self.gateway_address = gateway_address
+        self.ping_list = ping_list
+        self.ping_function = ping_function
+        self.unreachable_ping_threshold = unreachable_ping_threshold
+        self.poll_interval = poll_interval
+        self.stable_polls = stable_polls
+        self.down_timeout = down_timeout
+        self.on_down = on_down
+        self.on_recovered = on_recovered
+        self.started_at = None
+        self.router_went_down = False
+        self.stable_count = 0
+        self.pending_probes = 0
+        self.gateway_up = False
+        self.failed_pings = 0
+        self.pinging_ping_list = False
+        self.timer = None
+        self.finished = False
+
+    # Start watching, straight after the reboot request was accepted
+    def start(self):
+        self.started_at = self.scheduler.time()
+        self.poll()
+
+    # Stop watching
+    def cancel(self):
+        self.finished = True
+        if self.timer:
+            self.timer.cancel()
+
+    # Ping the router, and once it has gone down, the ping list too
+    def poll(self):
+        if self.finished:
+            return
+        self.gateway_up = False
+        self.failed_pings = 0
+        addresses = [self.gateway_address]
+        self.pinging_ping_list = self.router_went_down or self.scheduler.time() - self.started_at >= self.down_timeout
+        if self.pinging_ping_list:
+            addresses += self.ping_list
+        self.pending_probes = len(addresses)
+        for index, address in enumerate(addresses):
+            is_gateway = index == 0
+            self.scheduler.run_in_executor(lambda rtt, is_gateway=is_gateway: self.on_probe_result(is_gateway, rtt), self.ping_function, address, on_error=lambda error, is_gateway=is_gateway: self.on_probe_result(is_gateway, None))
+
+    # Handle the result of one ping of the poll
+    def on_probe_result(self, is_gateway, rtt):
+        if self.finished:
+            return
+        if is_gateway:
+            self.gateway_up = prober.is_reachable(rtt)
+        # An address that can't be resolved yet doesn't count as back either
+        elif not prober.is_reachable(rtt):
+            self.failed_pings += 1
+        self.pending_probes -= 1
+        if self.pending_probes == 0:
+            self.on_poll_complete()
+
+    # Decide if the network has recovered, once all of the pings of the poll are done
+    def on_poll_complete(self):
+        elapsed = self.scheduler.time() - self.started_at
+
+        if not self.router_went_down:
+            if not self.gateway_up:
+                self.router_went_down = True
+                if self.on_down:
+                    self.on_down(elapsed)
+            elif elapsed < self.down_timeout:
+                self.timer = self.scheduler.call_later(self.poll_interval, self.poll)
+                return
+
+        if self.pinging_ping_list and self.gateway_up and self.failed_pings < self.unreachable_ping_threshold:
+            self.stable_count += 1
+        else:
+            self.stable_count = 0
+
+        if self.stable_count >= self.stable_polls:
+            self.finished = True
+            if self.on_recovered:
+                self.on_recovered(elapsed)
+            return
+        self.timer = self.scheduler.call_later(self.poll_interval, self.poll)
@@ -0,0 +1,177 @@
+# This file is used by the program to keep the size of the `logs` folder down on devices that
+# run for a long time. This file is not inteded to be ran by itself, but rather imported by
+# the main program (`main.py`). Every so often, on a background thread:
+#  - The log files of months that have ended are compressed with gzip ({month}.jsonl.gz or
+#    {month}.json.gz). `loger.py`, `log_server.py` and `logs.html` all read them as they are.
+#  - Whole months (the log file, its summary and per-minute rollups, and the probe store
+#    segments of the month) are deleted once they are older than `max_age_months`, and the
+#    oldest months are deleted while the `logs` folder is bigger than `max_size_mb`.
+# The current month is never compressed or deleted, and no log file is ever emptied.
+
+# Import the required modules
+import os
+import gzip
+import json
+import shutil
+import datetime
+import threading
+import loger
+
+# Default retention settings
+DEFAULT_COMPRESS_CLOSED_MONTHS = True
+DEFAULT_MAX_AGE_MONTHS = None # keep every month
+DEFAULT_MAX_SIZE_MB = None # no size limit
+DEFAULT_RETENTION_CHECK_INTERVAL = 3600 # seconds
+# How long after a month has ended before it is compressed, so log entries that were
+# still waiting to be written at midnight are in the file first
+CLOSED_MONTH_GRACE_PERIOD = datetime.timedelta(hours=1)
+
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+
+# A month as a single number, so months can be compared and counted
+def month_number(year, month):
+    return year * 12 + month - 1
+
+# The start of the month after a month number
+def start_of_next_month(number):
+    return datetime.datetime((number + 1) // 12, (number + 1) % 12 + 1, 1)
+
+# The size of a file or folder in bytes
+def get_path_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    size = 0
+    for folder, _, file_names in os.walk(path):
+        for file_name in file_names:
+            size += os.path.getsize(os.path.join(folder, file_name))
+    return size
+
+# Delete a file or folder
+def remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+# Every file and folder in the logs folder that belongs to a month, by month number
+def find_month_paths(logs_path="logs", probe_store_path=None):
+    month_paths = {}
+    if not os.path.isdir(logs_path):
+        return month_paths
+    for year in os.listdir(logs_path):
+        year_path = os.path.join(logs_path, year)
+        if not year.isdigit() or not os.path.isdir(year_path):
+            continue
+        for name in os.listdir(year_path):
+            # {month}.json, {month}.jsonl.gz, {month}.summary.json, {month}.minutes ...
+            month = name.split(".")[0]
+            if month in MONTHS:
+                month_paths.setdefault(month_number(int(year), MONTHS.index(month) + 1), []).append(os.path.join(year_path, name))
+
+    # The probe store has one segment per day ({YYYY-MM-DD}.bin)
+    if probe_store_path is not None and os.path.isdir(probe_store_path):
+        for name in os.listdir(probe_store_path):
+            if name.endswith(".bin"):
+                try:
+                    day = datetime.datetime.strptime(name[:-4], "%Y-%m-%d")
+                except ValueError:
+                    continue
+                month_paths.setdefault(month_number(day.year, day.month), []).append(os.path.join(probe_store_path, name))
+    return month_paths
+
+# Compress a log file with gzip, and delete the original once the compressed file is complete
+def compress_log_file(path):
+    compressed_path = path + ".gz"
+    temporary_path = compressed_path + ".tmp"
+    if os.path.exists(compressed_path):
+        # The month was already compressed, but more log entries were written to it since
+        if path.endswith(".jsonl"):
+            # Compressed files can be joined, so add the new lines as another gzip member
+            shutil.copyfile(compressed_path, temporary_path)
+            with open(path, "rb") as source, gzip.open(temporary_path, "ab") as destination:
+                shutil.copyfileobj(source, destination)
+        else:
+            entries = loger.read_log_file(compressed_path) + loger.read_log_file(path)
+            with gzip.open(temporary_path, "wt") as destination:
+                json.dump(entries, destination, indent=4)
+    else:
+        with open(path, "rb") as source, gzip.open(temporary_path, "wb") as destination:
+            shutil.copyfileobj(source, destination)
+    os.replace(temporary_path, compressed_path)
+    os.remove(path)
+    return compressed_path
+
+# Compress the log files of the months that have ended, and return their paths
+def compress_closed_months(logs_path="logs", now=None):
+    if now is None:
+        now = datetime.datetime.now()
+    compressed_paths = []
+    for number, paths in sorted(find_month_paths(logs_path).items()):
+        if now - start_of_next_month(number) < CLOSED_MONTH_GRACE_PERIOD:
+            continue
+        for path in paths:
+            if path.endswith(tuple(loger.LOG_FORMATS.values())) and not path.endswith(".summary.json"):
+                compressed_paths.append(compress_log_file(path))
+    return compressed_paths
+
+# Delete the months that are older than `max_age_months`, then the oldest months while the logs
+# folder is bigger than `max_size_mb`. The current month is never deleted. Returns the deleted
+# months as (year, month name).
+def enforce_retention_limits(logs_path="logs", probe_store_path=None, max_age_months=DEFAULT_MAX_AGE_MONTHS, max_size_mb=DEFAULT_MAX_SIZE_MB, now=None):
+    if now is None:
+        now = datetime.datetime.now()
+    current_month = month_number(now.year, now.month)
+    month_paths = find_month_paths(logs_path, probe_store_path)
+    month_sizes = {number: sum(get_path_size(path) for path in paths) for number, paths in month_paths.items()}
+    total_size = sum(month_sizes.values())
+
+    deleted_months = []
+    for number in sorted(month_paths):
+        if number >= current_month:
+            break
+        too_old = max_age_months is not None and current_month - number > max_age_months
+        too_big = max_size_mb is not None and total_size > max_size_mb * 1024 * 1024
+        if not too_old and not too_big:
+            break
+        for path in month_paths[number]:
+            remove_path(path)
+        # Remove the year folder once its last month is gone
+        year_path = os.path.join(logs_path, str(number // 12))
+        if os.path.isdir(year_path) and not os.listdir(year_path):
+            os.rmdir(year_path)
+        total_size -= month_sizes[number]
+        deleted_months.append((number // 12, MONTHS[number % 12]))
+    return deleted_months
+
+# Runs the retention checks on a background thread, straight away and then every `check_interval` seconds
+class RetentionManager(threading.Thread):
+    def __init__(self, logs_path="logs", probe_store_path=None, compress_closed_months=DEFAULT_COMPRESS_CLOSED_MONTHS, max_age_months=DEFAULT_MAX_AGE_MONTHS, max_size_mb=DEFAULT_MAX_SIZE_MB, check_interval=DEFAULT_RETENTION_CHECK_INTERVAL):
+        super().__init__(name="log-retention", daemon=True)
+        self.logs_path = logs_path
+        self.probe_store_path = probe_store_path
+        self.compress_closed_months = compress_closed_months
+        self.max_age_months = max_age_months
+        self.max_size_mb = max_size_mb
+        self.check_interval = check_interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.check()
+            self.stopped.wait(self.check_interval)
+
+    # Compress and delete old months once
+    def check(self):
+        try:
+            if self.compress_closed_months:
+                for path in compress_closed_months(self.logs_path):
+                    loger.write_to_log_file("neutral", f"Compressed log file {path}")
+            for year, month in enforce_retention_limits(self.logs_path, self.probe_store_path, self.max_age_months, self.max_size_mb):
+                loger.write_to_log_file("neutral", f"Deleted the logs of {month} {year} (retention limit reached)")
+        except Exception as e:
+            # Try again at the next check, a failed check must not stop the program
+            print("Error applying the log retention settings:", e)
+            loger.write_to_log_file("error", f"Error applying the log retention settings: {e}")
+
+    def stop(self):
+        self.stopped.set()
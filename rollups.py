@@ -0,0 +1,103 @@
+# This file is used by the program to keep running totals (rollups) of the checks, pings and
+# reboots per day, hour and minute, so `logs.html` can show an overview of a month without
+# loading every log entry. This file is not inteded to be ran by itself, but rather
+# imported by `loger.py`, which updates the rollups as it writes the log files.
+# The rollups are kept next to each month's log file:
+#  - `logs/{year}/{month}.summary.json`: the totals for each day and each hour of the month.
+#  - `logs/{year}/{month}.minutes/{day}.json`: the totals for each minute of one day.
+# Each total has the number of check cycles, failed check cycles, pings, failed pings,
+# network reboots and the sum and count of the ping round trip times (RTT, in ms), so the
+# mean RTT can be worked out for any bucket, and the totals can keep being added to.
+
+# Import the required modules
+import os
+import json
+
+# The counters of each rollup bucket
+COUNTERS = ("checks", "failed_checks", "pings", "failed_pings", "reboots", "rtt_count", "rtt_total")
+
+# The counters each event adds one to
+ROLLUP_EVENTS = {
+    "check": ("checks",),
+    "failed_check": ("checks", "failed_checks"),
+    "ping": ("pings",),
+    "failed_ping": ("pings", "failed_pings"),
+    "reboot": ("reboots",)
+}
+
+# The path of the summary file of a month
+def get_summary_file_path(year, month):
+    return f"logs/{year}/{month}.summary.json"
+
+# The path of the per-minute rollup file of a day
+def get_minutes_file_path(year, month, day):
+    return f"logs/{year}/{month}.minutes/{day:02d}.json"
+
+# Load a rollup file, or start a new one
+def load_rollup_file(path, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except ValueError:
+        # A damaged rollup file only loses the totals, start again rather than stop logging
+        return default
+
+# Write a rollup file, the old file is only replaced once the new one is complete
+def save_rollup_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w") as file:
+        json.dump(data, file, separators=(",", ":"))
+    os.replace(temporary_path, path)
+
+# Add an event to a bucket of a rollup
+def add_to_bucket(buckets, key, event, rtt):
+    bucket = buckets.get(key)
+    if bucket is None:
+        bucket = buckets[key] = dict.fromkeys(COUNTERS, 0)
+    for counter in ROLLUP_EVENTS[event]:
+        bucket[counter] += 1
+    if rtt is not None:
+        bucket["rtt_count"] += 1
+        bucket["rtt_total"] = round(bucket["rtt_total"] + rtt, 3)
+
+# The rollups of the month (and the day) that is being logged, loaded from the rollup files
+# when the month (or day) is first written to, so restarting the program carries on the totals
+class Rollups:
+    def __init__(self):
+        self.month_key = None
+        self.summary = None
+        self.day_key = None
+        self.minutes = None
+        self.changed = False
+
+    # Add an event at a time (a datetime), with the RTT in ms for pings that were answered
+    def add(self, moment, event, rtt=None):
+        year = moment.year
+        month = moment.strftime("%B")
+        if self.month_key != (year, month):
+            self.save()
+            self.month_key = (year, month)
+            self.summary = load_rollup_file(get_summary_file_path(year, month), {"days": {}, "hours": {}})
+            self.day_key = None
+        if self.day_key != moment.day:
+            if self.day_key is not None:
+                self.save()
+            self.day_key = moment.day
+            self.minutes = load_rollup_file(get_minutes_file_path(year, month, moment.day), {"minutes": {}})
+
+        add_to_bucket(self.summary["days"], moment.strftime("%Y-%m-%d"), event, rtt)
+        add_to_bucket(self.summary["hours"], moment.strftime("%Y-%m-%dT%H"), event, rtt)
+        add_to_bucket(self.minutes["minutes"], moment.strftime("%H:%M"), event, rtt)
+        self.changed = True
+
+    # Write the rollup files, if anything was added since they were last written
+    def save(self):
+        if not self.changed:
+            return
+        year, month = self.month_key
+        save_rollup_file(get_summary_file_path(year, month), self.summary)
+        save_rollup_file(get_minutes_file_path(year, month, self.day_key), self.minutes)
+        self.changed = False
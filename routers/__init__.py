@@ -0,0 +1,44 @@
+# This package has the router drivers, which are used by the program to login to the
+# router, reboot it, check its status and logout. Each router model has its own driver
+# module in this folder, and the driver is chosen with the `router_model` setting in the
+# `router_details` of `config.json`.
+# Driver modules are only imported when they are used, so each driver can import what
+# it needs (e.g. `requests`) without slowing down the start of the program for the
+# other drivers.
+# To add support for a new router, add a module to this folder with a class that
+# inherits from `routers.base.RouterClient`, name it `RouterDriver` in the module, and
+# add it to `ROUTER_DRIVERS` below. A driver outside of this folder can also be used by
+# setting `router_model` to its full module name (e.g. "my_routers.my_router").
+
+# Import the required modules
+import importlib
+
+# The available router drivers: router model name -> driver module
+ROUTER_DRIVERS = {
+    "virgin_media_hub_5": "routers.virgin_media_hub_5"
+}
+DEFAULT_ROUTER_MODEL = "virgin_media_hub_5"
+
+# Raised when the router model in the configuration settings has no driver
+class UnknownRouterModelError(Exception):
+    pass
+
+# Load the driver class for a router model, importing its module the first time it is used
+def load_router_driver(router_model):
+    module_name = ROUTER_DRIVERS.get(router_model)
+    if module_name is None:
+        if "." not in router_model:
+            raise UnknownRouterModelError(f"Unknown router model: {router_model} (supported models: {', '.join(ROUTER_DRIVERS)})")
+        module_name = router_model
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError as e:
+        raise UnknownRouterModelError(f"Could not load the driver for router model {router_model}: {e}")
+    if not hasattr(module, "RouterDriver"):
+        raise UnknownRouterModelError(f"The module {module_name} does not have a `RouterDriver` class")
+    return module.RouterDriver
+
+# Create the router client for the `router_details` in the configuration settings
+def create_router_client(router_details):
+    driver = load_router_driver(router_details.get("router_model", DEFAULT_ROUTER_MODEL))
+    return driver(router_details)
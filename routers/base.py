@@ -0,0 +1,70 @@
+# This file has the base class of the router drivers. It keeps the login token cached
+# until it expires, so a driver only logs in again when it has to. Each driver inherits
+# from `RouterClient` and implements `login`, `status`, `reboot` and `logout` for its
+# router model.
+
+# Import the required modules
+import time
+
+# Default client settings
+DEFAULT_TOKEN_LIFETIME = 240 # seconds
+DEFAULT_REQUEST_TIMEOUT = 10 # seconds
+
+# Base class of the router drivers
+class RouterClient:
+    def __init__(self, router_details):
+        self.router_ip_address = router_details["router_ip_address"]
+        self.router_password = router_details["router_password"]
+        self.token_lifetime = router_details.get("token_lifetime", DEFAULT_TOKEN_LIFETIME)
+        self.request_timeout = router_details.get("request_timeout", DEFAULT_REQUEST_TIMEOUT)
+
+        # Cached login token, and when it expires (time.monotonic() seconds)
+        self.token = None
+        self.token_expiry = 0
+
+    # Cache a new login token
+    def cache_token(self, token):
+        self.token = token
+        self.token_expiry = time.monotonic() + self.token_lifetime
+
+    # Forget the cached login token
+    def forget_token(self):
+        self.token = None
+        self.token_expiry = 0
+
+    # The cached login token and when it expires (Unix time), to save it to the state file, or
+    # None if there isn't one. A restarted program can then reuse it instead of logging in again.
+    def export_token(self):
+        remaining = self.token_expiry - time.monotonic()
+        if not self.token or remaining <= 0:
+            return None
+        return {"token": self.token, "expires_at": time.time() + remaining}
+
+    # Use a saved login token, if it hasn't expired
+    def restore_token(self, saved):
+        remaining = saved["expires_at"] - time.time()
+        if remaining > 0:
+            self.token = saved["token"]
+            self.token_expiry = time.monotonic() + min(remaining, self.token_lifetime)
+
+    # Get the cached login token, logging in again if there isn't one or it has expired
+    def get_token(self):
+        if self.token and time.monotonic() < self.token_expiry:
+            return self.token
+        return self.login()
+
+    # Login to the router, and cache the token. Returns the token, or None if the login failed.
+    def login(self):
+        raise NotImplementedError
+
+    # Get the router's status. Returns a dictionary of status information, or None if it failed.
+    def status(self):
+        raise NotImplementedError
+
+    # Reboot the router. Returns True if the reboot was accepted.
+    def reboot(self):
+        raise NotImplementedError
+
+    # Logout of the router, if logged in. Returns True if the logout was successful.
+    def logout(self):
+        raise NotImplementedError
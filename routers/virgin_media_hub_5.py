@@ -0,0 +1,144 @@
+# This file is the router driver for the Virgin Media Hub 5 (router or modem mode),
+# which is controlled through its REST API at http://{router_ip_address}/rest/v1.
+# The driver keeps one HTTP session open to the router, so every request reuses the
+# same keep-alive connection instead of opening a new one. It only logs in again when
+# it has to (when there is no token, when it has expired or when the router answers
+# with 401 Unauthorized).
+
+# Import the required modules
+import requests
+from requests.adapters import HTTPAdapter
+from routers.base import RouterClient
+import tracing
+
+# The Hub 5 usually doesn't answer the reboot request at all, it just reboots
+REBOOT_RESPONSE_TIMEOUT = 5 # seconds
+
+# Read the body of a response as a JSON object. Returns None if it is empty, and False if it
+# is anything else (not JSON, or JSON that isn't an object, e.g. a list or a string).
+def read_json_object(response):
+    if not response.content:
+        return None
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    return body if isinstance(body, dict) else False
+
+# Router driver for the Virgin Media Hub 5
+class VirginMediaHub5Client(RouterClient):
+    def __init__(self, router_details):
+        super().__init__(router_details)
+        self.base_url = f"http://{self.router_ip_address}"
+        self.user_id = 3
+
+        # One pooled keep-alive connection to the router
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    # Login to the router, and cache the token. Returns the token, or None if the login failed.
+    @tracing.traced("router.login")
+    def login(self):
+        self.forget_token()
+        try:
+            response = self.session.post(self.base_url + "/rest/v1/user/login", json={"password": self.router_password}, timeout=self.request_timeout)
+        except requests.exceptions.RequestException as e:
+            print("Error:", e)
+            return None
+
+        if response.status_code != 201:
+            print("Login failed. Server response:", response.text)
+            return None
+        body = read_json_object(response)
+        created = body.get("created") if body else None
+        token = created.get("token") if isinstance(created, dict) else None
+        if not token or not isinstance(token, str):
+            print("Unexpected response format:", response.text)
+            return None
+
+        self.cache_token(token)
+        self.user_id = created.get("userId", self.user_id)
+        return token
+
+    # The token is only valid for the user it was created for
+    def export_token(self):
+        saved = super().export_token()
+        if saved is not None:
+            saved["user_id"] = self.user_id
+        return saved
+
+    def restore_token(self, saved):
+        super().restore_token(saved)
+        self.user_id = saved.get("user_id", self.user_id)
+
+    # Send an authorised request to the router, logging in again once if the token is rejected.
+    # Returns the response, or None if the program couldn't login.
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.request_timeout)
+        for attempt in range(2):
+            token = self.get_token()
+            if not token:
+                return None
+            response = self.session.request(method, self.base_url + path, headers={"Authorization": "Bearer " + token}, **kwargs)
+            if response.status_code != 401:
+                return response
+            self.forget_token()
+        return response
+
+    # Get the router's system information. Returns the JSON response, or None if it failed.
+    def status(self):
+        try:
+            response = self.request("GET", "/rest/v1/system/info")
+        except requests.exceptions.RequestException as e:
+            print("Error:", e)
+            return None
+        if response is None or response.status_code != 200:
+            return None
+        return read_json_object(response) or None
+
+    # Reboot the router. Returns True if the reboot was accepted.
+    @tracing.traced("router.reboot")
+    def reboot(self):
+        try:
+            response = self.request("POST", "/rest/v1/system/reboot", json={"reboot": {"enable": True}}, timeout=REBOOT_RESPONSE_TIMEOUT)
+        except requests.exceptions.Timeout:
+            print(f"No response after {REBOOT_RESPONSE_TIMEOUT} seconds. Assuming the modem is rebooting successfully.")
+        except requests.exceptions.RequestException as e:
+            print("Error:", e)
+            return False
+        else:
+            if response is None:
+                return False
+            if not response.ok:
+                print("Reboot request failed. Server response:", response.text)
+                return False
+            # An answer has to be a JSON object without an error, like the router's own answers
+            body = read_json_object(response)
+            if body is False or (body and "error" in body):
+                print("Unexpected reboot response:", response.text)
+                return False
+
+        # The token and the open connection don't survive the reboot
+        self.forget_token()
+        self.session.close()
+        return True
+
+    # Logout of the router, if logged in. Returns True if the logout was successful.
+    @tracing.traced("router.logout")
+    def logout(self):
+        if not self.token:
+            return True
+        token = self.token
+        self.forget_token()
+        try:
+            response = self.session.delete(f"{self.base_url}/rest/v1/user/{self.user_id}/token/{token}", headers={"Authorization": "Bearer " + token}, timeout=self.request_timeout)
+        except requests.exceptions.RequestException as e:
+            print("Error:", e)
+            return False
+        if response.status_code != 204:
+            print("Logout failed. Server response:", response.text)
+            return False
+        return True
+
+RouterDriver = VirginMediaHub5Client
@@ -0,0 +1,130 @@
+# This file is used by the program to run everything that has to happen later (the next
+# check cycle, ping retries, waiting after a reboot, cooldown periods) as timers on one
+# thread, instead of each of them blocking the program with `time.sleep`. This file is
+# not inteded to be ran by itself, but rather imported by the main program (`main.py`).
+# The timers are kept in a heap ordered by when they are due, so the scheduler always
+# knows how long it can wait until the next one. Work that does block (pinging, talking
+# to the router) is ran on a pool of worker threads, and its result is handed back to
+# the scheduler thread as a timer that is due straight away. All of the callbacks are
+# ran on the scheduler thread, one at a time, so they never have to worry about locks.
+
+# Import the required modules
+import time
+import heapq
+import itertools
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# Default number of worker threads for blocking work (pings, router requests)
+DEFAULT_MAX_WORKERS = 32
+
+# A callback that is due at a certain time, it can be cancelled before it is ran
+class Timer:
+    __slots__ = ("when", "callback", "args", "cancelled")
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+# Runs timers on the thread that calls `run`, and blocking work on worker threads
+class Scheduler:
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        # Heap of (when, sequence, timer), the sequence keeps timers that are due at the same time in order
+        self.timers = []
+        self.sequence = itertools.count()
+        # A reentrant lock, so a signal handler that schedules a callback can't deadlock the scheduler thread
+        self.condition = threading.Condition(threading.RLock())
+        self.running = False
+        self.max_workers = max_workers
+        self.executor = None
+
+    # The scheduler's clock, in seconds (not affected by changes to the system time)
+    def time(self):
+        return time.monotonic()
+
+    # Run a callback at a time on the scheduler's clock. This can be called from any thread.
+    def call_at(self, when, callback, *args):
+        timer = Timer(when, callback, args)
+        with self.condition:
+            heapq.heappush(self.timers, (when, next(self.sequence), timer))
+            self.condition.notify()
+        return timer
+
+    # Run a callback after a delay in seconds. This can be called from any thread.
+    def call_later(self, delay, callback, *args):
+        return self.call_at(self.time() + delay, callback, *args)
+
+    # Run a callback as soon as possible. This can be called from any thread.
+    def call_soon(self, callback, *args):
+        return self.call_at(self.time(), callback, *args)
+
+    # Run a blocking function on a worker thread, then call callback(result) on the scheduler
+    # thread. If the function raises an exception instead, it is printed and on_error(exception)
+    # is called, so the caller can carry on (e.g. count it as a failed ping) rather than wait
+    # for a result that will never come.
+    def run_in_executor(self, callback, function, *args, on_error=None):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="worker")
+        future = self.executor.submit(function, *args)
+        future.add_done_callback(lambda future: self.call_soon(self.finish_work, future, callback, on_error))
+        return future
+
+    # Hand the result (or the exception) of work ran on a worker thread to its callback
+    def finish_work(self, future, callback, on_error):
+        exception = future.exception()
+        if exception is None:
+            callback(future.result())
+            return
+        traceback.print_exception(type(exception), exception, exception.__traceback__)
+        if on_error is not None:
+            on_error(exception)
+
+    # Wait for the next timer that is due and remove it from the heap, or return None if stopped
+    def next_due_timer(self):
+        with self.condition:
+            while self.running:
+                if self.timers:
+                    delay = self.timers[0][0] - self.time()
+                    if delay <= 0:
+                        return heapq.heappop(self.timers)[2]
+                    self.condition.wait(delay)
+                else:
+                    self.condition.wait()
+        return None
+
+    # Run the timers until `stop` is called
+    def run(self):
+        self.running = True
+        try:
+            while True:
+                timer = self.next_due_timer()
+                if timer is None:
+                    break
+                if timer.cancelled:
+                    continue
+                try:
+                    timer.callback(*timer.args)
+                except Exception:
+                    # One failing callback (e.g. one site) must not stop everything else
+                    traceback.print_exc()
+        finally:
+            self.running = False
+
+    # Stop running timers. This can be called from any thread, or from a callback.
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    # Stop the worker threads, without waiting for any blocking work that is still running
+    def shutdown(self):
+        self.stop()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
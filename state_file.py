@@ -0,0 +1,51 @@
+# This file is used by the program to keep the state of the site monitors in a small file
+# (`state.json`), so a restarted program picks up where it left off. This file is not
+# inteded to be ran by itself, but rather imported by `monitor.py`.
+# For each site, the state file has:
+#  - the times of the last few network reboots, and how many were in a row
+#  - when the current cooldown period ends, if the site is in one
+#  - the last check result and how long the last recovery took
+#  - the rolling ping statistics of each address
+#  - the router's cached login token and when it expires
+# Times are saved as Unix times, as the monotonic clock the scheduler uses starts again
+# with the program. The file is written to a temporary file first, which then replaces the
+# old one in one step (`os.replace`), so it is always either the old or the new state,
+# even if the program (or the computer) stops half way through. It is small (a few KB per
+# site) and read once, when the program starts.
+# The login token is as sensitive as the router password, so the file can only be read by
+# the user running the program.
+
+# Import the required modules
+import os
+import json
+
+# Default state file settings
+DEFAULT_STATE_FILE_PATH = "state.json"
+DEFAULT_STATE_SAVE_INTERVAL = 60 # seconds
+STATE_FILE_VERSION = 1
+
+# Load the state file. Returns a dictionary of site name: site state, which is empty if
+# there is no state file yet, or if it can't be read.
+def load_state_file(path=DEFAULT_STATE_FILE_PATH):
+    try:
+        with open(path, "r") as file:
+            state = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(state, dict) or state.get("version") != STATE_FILE_VERSION or not isinstance(state.get("sites"), dict):
+        return {}
+    return state["sites"]
+
+# Write the state file (a dictionary of site name: site state), the old file is only
+# replaced once the new one is complete and on the disk
+def save_state_file(sites, path=DEFAULT_STATE_FILE_PATH):
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    temporary_path = path + ".tmp"
+    file_descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(file_descriptor, "w") as file:
+        json.dump({"version": STATE_FILE_VERSION, "sites": sites}, file, separators=(",", ":"))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
@@ -0,0 +1,78 @@
+# Tests for `configuration.py`: checking the settings in `config.json`
+
+# Import the required modules
+import copy
+import pytest
+import configuration
+
+# A valid single site configuration, like the one the setup wizard makes
+VALID_CONFIGURATION = {
+    "log_file": True,
+    "router_details": {"router_ip_address": "192.168.0.1", "router_password": "password"},
+    "ping": {"ping_list": ["8.8.8.8", "1.1.1.1", "www.apple.com"], "unreachable_ping_threshold": 2, "ping_check_frequency": 5, "ping_retry_amount": 2, "ping_retry_interval": 5},
+    "network": {"network_reboot_interval": 5, "network_reboot_retry_count": 3, "network_reboot_cooldown_period": 60}
+}
+
+# A copy of the valid configuration with one setting changed, e.g. ("ping", "probe_timeout")
+def with_setting(path, value):
+    configuration_settings = copy.deepcopy(VALID_CONFIGURATION)
+    settings = configuration_settings
+    for key in path[:-1]:
+        settings = settings.setdefault(key, {})
+    settings[path[-1]] = value
+    return configuration_settings
+
+def test_valid_configuration_has_no_problems():
+    assert configuration.validate_configuration_settings(VALID_CONFIGURATION) == []
+    loaded = configuration.load_configuration(VALID_CONFIGURATION)
+    assert loaded.sites[0].ping.statistics_window_size == 100
+
+@pytest.mark.parametrize("path, value", [
+    (("ping", "statistics_window_size"), 0),
+    (("ping", "statistics_window_size"), "100"),
+    (("ping", "probe_timeout"), 0),
+    (("ping", "probe_timeout"), True),
+    (("ping", "probe_tcp_port"), 70000),
+    (("ping", "minimum_check_interval"), -1),
+    (("ping", "fast_recheck_interval"), 0),
+    (("ping", "fast_recheck_limit"), 1.5),
+    (("ping", "max_packet_loss"), 120),
+    (("network", "recovery_poll_interval"), 0),
+    (("network", "recovery_stable_polls"), 0),
+    (("network", "recovery_down_timeout"), "120"),
+    (("network", "max_reboots_per_hour"), -1),
+    (("log_flush_interval",), 0),
+    (("log_batch_size",), 0),
+    (("log_fsync_interval",), -1),
+    (("log_retention_check_interval",), 0),
+    (("max_worker_threads",), 0),
+    (("metrics", "port"), 0),
+    (("metrics", "port"), "9464"),
+    (("dns_cache_size",), -1),
+    (("state_save_interval",), 0)
+])
+def test_invalid_setting_is_reported(path, value):
+    problems = configuration.validate_configuration_settings(with_setting(path, value))
+    assert len(problems) == 1
+    assert path[-1] + "`" in problems[0]
+    with pytest.raises(configuration.InvalidConfigurationError):
+        configuration.load_configuration(with_setting(path, value))
+
+@pytest.mark.parametrize("path, value", [
+    (("log_fsync_interval",), None),
+    (("log_fsync_interval",), 0),
+    (("ping", "max_latency"), None),
+    (("ping", "probe_timeout"), 0.5),
+    (("network", "max_reboots_per_day"), 0)
+])
+def test_optional_settings_accept_their_special_values(path, value):
+    assert configuration.validate_configuration_settings(with_setting(path, value)) == []
+
+def test_router_details_are_only_required_in_daemon_mode():
+    configuration_settings = with_setting(("router_details", "router_password"), "")
+    assert configuration.validate_configuration_settings(configuration_settings) == []
+    assert len(configuration.validate_configuration_settings(configuration_settings, require_router_details=True)) == 1
+
+def test_router_ip_address_can_have_a_port():
+    assert configuration.validate_configuration_settings(with_setting(("router_details", "router_ip_address"), "192.168.0.1:8080")) == []
+    assert len(configuration.validate_configuration_settings(with_setting(("router_details", "router_ip_address"), "192.168.0.1:0"))) == 1
@@ -0,0 +1,82 @@
+# Tests for `main.py --daemon`: exit codes, JSON Lines on stdout and messages on stderr
+
+# Import the required modules
+import os
+import sys
+import json
+import signal
+import socket
+import subprocess
+from test_configuration import VALID_CONFIGURATION, with_setting
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+# A configuration that can be monitored without a network: the ping list is this computer
+def local_configuration(**settings):
+    configuration_settings = with_setting(("ping", "ping_list"), ["127.0.0.1"])
+    configuration_settings["ping"]["unreachable_ping_threshold"] = 1
+    configuration_settings["ping"]["probe_method"] = "tcp"
+    configuration_settings["log_file"] = False
+    configuration_settings.update(settings)
+    return configuration_settings
+
+# Start the program in daemon mode in a folder, with a config.json if there are settings
+def start_daemon(folder, configuration_settings=None):
+    if configuration_settings is not None:
+        with open(folder / "config.json", "w") as file:
+            json.dump(configuration_settings, file)
+    return subprocess.Popen([sys.executable, MAIN_PATH, "--daemon"], cwd=folder, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+# Every line on stdout must be a JSON log entry, return them
+def read_log_entries(stdout):
+    return [json.loads(line) for line in stdout.splitlines()]
+
+def test_missing_configuration_file_exits_with_78(tmp_path):
+    process = start_daemon(tmp_path)
+    stdout, _ = process.communicate(timeout=30)
+    assert process.returncode == 78
+    entries = read_log_entries(stdout)
+    assert entries[-1]["status"] == "error"
+    assert "`config.json` does not exist" in entries[-1]["log"]["message"]
+
+def test_invalid_configuration_exits_with_78(tmp_path):
+    process = start_daemon(tmp_path, with_setting(("ping", "probe_timeout"), 0))
+    stdout, _ = process.communicate(timeout=30)
+    assert process.returncode == 78
+    messages = [entry["log"]["message"] for entry in read_log_entries(stdout)]
+    assert any(message.startswith("Invalid configuration settings:") and "probe_timeout" in message for message in messages)
+
+def test_stops_with_0_on_sigterm(tmp_path):
+    process = start_daemon(tmp_path, local_configuration())
+    try:
+        # Wait until the first check cycle is over, so the site is being monitored
+        first_lines = []
+        while not first_lines or "Waiting for" not in first_lines[-1]:
+            line = process.stdout.readline()
+            assert line, "the program stopped before monitoring started"
+            first_lines.append(line)
+        process.send_signal(signal.SIGTERM)
+        stdout, stderr = process.communicate(timeout=30)
+    finally:
+        process.kill()
+    assert process.returncode == 0
+    messages = [entry["log"]["message"] for entry in read_log_entries("".join(first_lines) + stdout)]
+    assert messages[0] == "Program started in daemon mode - Configuration settings loaded"
+    assert "Program stopped (SIGTERM)" in messages
+    # The console messages are not printed in daemon mode, and nothing else goes to stdout
+    assert "Traceback" not in stderr
+
+def test_an_unexpected_error_exits_with_1(tmp_path):
+    # The metrics port is already in use
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    try:
+        process = start_daemon(tmp_path, local_configuration(metrics={"enabled": True, "host": "127.0.0.1", "port": listener.getsockname()[1]}))
+        stdout, stderr = process.communicate(timeout=30)
+    finally:
+        listener.close()
+    assert process.returncode == 1
+    assert read_log_entries(stdout)[-1]["log"]["message"].startswith("Program stopped by an unexpected error")
+    # The human readable traceback goes to stderr
+    assert "Traceback (most recent call last)" in stderr
@@ -0,0 +1,60 @@
+# Tests for `diagnosis.py`: the first layer that fails is the diagnosis
+
+# Import the required modules
+import threading
+import pytest
+import diagnosis
+from scheduler import Scheduler
+
+# Run a diagnosis with these checks for the local interface and DNS, and this ping function
+# for the gateway, and return the diagnosis
+def run_diagnosis(monkeypatch, check_local_interface, check_dns, ping_function):
+    monkeypatch.setattr(diagnosis, "check_local_interface", check_local_interface)
+    monkeypatch.setattr(diagnosis, "check_dns", check_dns)
+    scheduler = Scheduler()
+    layers = []
+    def on_complete(layer):
+        layers.append(layer)
+        scheduler.stop()
+    scheduler.call_soon(diagnosis.NetworkDiagnosis(scheduler, "192.168.0.1", "example.com", ping_function, on_complete).start)
+    watchdog = threading.Timer(5, scheduler.stop)
+    watchdog.start()
+    try:
+        scheduler.run()
+    finally:
+        watchdog.cancel()
+        scheduler.shutdown()
+    return layers
+
+# Run a diagnosis with each layer fine or not, and return the diagnosis
+def diagnose(monkeypatch, local=True, gateway=True, dns=True):
+    return run_diagnosis(monkeypatch, lambda address: local, lambda hostname: dns, lambda address: 1000 if gateway else None)
+
+@pytest.mark.parametrize("layers, expected_layer", [
+    ({"local": False}, diagnosis.LAYER_LOCAL),
+    ({"gateway": False}, diagnosis.LAYER_GATEWAY),
+    ({"gateway": False, "dns": False}, diagnosis.LAYER_GATEWAY),
+    ({"dns": False}, diagnosis.LAYER_DNS),
+    ({}, diagnosis.LAYER_WAN)
+])
+def test_the_lowest_failed_layer_is_the_diagnosis(monkeypatch, layers, expected_layer):
+    assert diagnose(monkeypatch, **layers) == [expected_layer]
+
+def test_only_a_wan_failure_is_worth_a_reboot():
+    assert diagnosis.REBOOT_LAYERS == (diagnosis.LAYER_WAN,)
+
+def test_a_check_that_raises_counts_as_failed(monkeypatch):
+    def check_dns(hostname):
+        raise OSError("resolver gone")
+    assert run_diagnosis(monkeypatch, lambda address: True, check_dns, lambda address: 1000) == [diagnosis.LAYER_DNS]
+
+def test_layers_with_nothing_to_check_count_as_fine():
+    scheduler = Scheduler()
+    layers = []
+    diagnosis.NetworkDiagnosis(scheduler, "", "", lambda address: None, layers.append).start()
+    assert layers == [diagnosis.LAYER_WAN]
+    scheduler.shutdown()
+
+def test_get_gateway_address():
+    assert diagnosis.get_gateway_address({"router_ip_address": "192.168.0.1:8080"}) == "192.168.0.1"
+    assert diagnosis.get_gateway_address({}) == ""
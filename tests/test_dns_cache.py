@@ -0,0 +1,85 @@
+# Tests for `dns_cache.py`, with a fake clock and fake lookups
+
+# Import the required modules
+import types
+import pytest
+import dns_cache
+
+# A DNS cache that answers from `answers` (hostname: (address, TTL) or an exception), and
+# doesn't start the background refresh thread
+@pytest.fixture
+def cache(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(dns_cache, "time", types.SimpleNamespace(monotonic=lambda: clock.now))
+    answers = {}
+    lookups = []
+    def lookup_hostname(hostname, name_servers, timeout):
+        lookups.append(hostname)
+        answer = answers[hostname]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+    monkeypatch.setattr(dns_cache, "lookup_hostname", lookup_hostname)
+    cache = dns_cache.DnsCache(size=2, max_stale=600, name_servers=[])
+    cache.refresher = "not started"
+    cache.clock, cache.answers, cache.lookups = clock, answers, lookups
+    return cache
+
+def test_an_address_is_cached_for_its_ttl(cache):
+    cache.answers["example.com"] = ("192.0.2.1", 120)
+    assert cache.resolve("example.com") == "192.0.2.1"
+    cache.answers["example.com"] = ("192.0.2.2", 120)
+    cache.clock.now += 119
+    assert cache.resolve("example.com") == "192.0.2.1"
+    assert cache.lookups == ["example.com"]
+    # Once the TTL runs out, the hostname is looked up again
+    cache.clock.now += 1
+    assert cache.resolve("example.com") == "192.0.2.2"
+    assert cache.lookups == ["example.com", "example.com"]
+
+def test_the_refresh_is_scheduled_before_the_ttl_runs_out(cache):
+    cache.answers["example.com"] = ("192.0.2.1", 100)
+    cache.resolve("example.com")
+    assert cache.refresh_times == [(1000.0 + 100 * dns_cache.REFRESH_AHEAD, "example.com")]
+
+@pytest.mark.parametrize("ttl, expected_ttl", [
+    (1, dns_cache.DEFAULT_MINIMUM_TTL),
+    (10 ** 7, dns_cache.DEFAULT_MAXIMUM_TTL),
+    (None, dns_cache.DEFAULT_FALLBACK_TTL)
+])
+def test_the_ttl_is_clamped(cache, ttl, expected_ttl):
+    cache.answers["example.com"] = ("192.0.2.1", ttl)
+    cache.resolve("example.com")
+    assert cache.entries["example.com"].expires_at == 1000.0 + expected_ttl
+
+def test_the_last_address_is_used_while_lookups_fail(cache):
+    cache.answers["example.com"] = ("192.0.2.1", 60)
+    cache.resolve("example.com")
+    cache.answers["example.com"] = dns_cache.DnsLookupError("no answer")
+    cache.clock.now += 60 + 599
+    assert cache.resolve("example.com") == "192.0.2.1"
+    assert cache.entries["example.com"].failing
+    # Once `max_stale` has passed too, the hostname can't be resolved
+    cache.clock.now += 1
+    assert cache.resolve("example.com") is None
+
+def test_the_least_recently_used_hostname_is_dropped(cache):
+    for number, hostname in enumerate(("a.example", "b.example", "c.example")):
+        cache.answers[hostname] = (f"192.0.2.{number}", 60)
+    cache.resolve("a.example")
+    cache.resolve("b.example")
+    cache.resolve("a.example")
+    cache.resolve("c.example")
+    assert list(cache.entries) == ["a.example", "c.example"]
+
+def test_ip_addresses_are_not_looked_up(cache):
+    assert cache.resolve("192.0.2.9") == "192.0.2.9"
+    assert cache.lookups == []
+
+def test_new_settings_keep_the_most_recently_used_hostnames(cache):
+    for number, hostname in enumerate(("a.example", "b.example")):
+        cache.answers[hostname] = (f"192.0.2.{number}", 60)
+        cache.resolve(hostname)
+    cache.configure(1, 30)
+    assert list(cache.entries) == ["b.example"]
+    assert (cache.size, cache.max_stale) == (1, 30)
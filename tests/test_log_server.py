@@ -0,0 +1,152 @@
+# Tests for `log_server.py`: only `logs.html` and the `logs` folder are served, and pages of
+# log entries are filtered and paged the same way whatever shape the log files are in
+
+# Import the required modules
+import os
+import json
+import gzip
+import threading
+import http.client
+from http.server import ThreadingHTTPServer
+import pytest
+import log_server
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "config.json").write_text('{"router_details": {"router_password": "secret"}}')
+    (tmp_path / "state.json").write_text('{"sites": {"default": {"router_token": {"token": "secret"}}}}')
+    (tmp_path / "logs.html").write_text("<html></html>")
+    os.makedirs(tmp_path / "logs" / "2025")
+    (tmp_path / "logs" / "2025" / "01.jsonl").write_text("")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), log_server.LogRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+# Send a GET request to the server, and return the status and the body
+def get(server, path):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+def test_serves_logs_page_and_log_files(server):
+    assert get(server, "/logs.html")[0] == 200
+    assert get(server, "/logs/2025/01.jsonl")[0] == 200
+
+@pytest.mark.parametrize("path", ["/config.json", "/state.json", "/log_server.py", "/", "/logs/../config.json", "/logs/%2e%2e/state.json", "/logs/..%2fconfig.json", "//config.json"])
+def test_other_files_are_not_served(server, path):
+    status, body = get(server, path)
+    assert status == 404
+    assert b"secret" not in body
+
+# A log line as `loger.py` writes it, for the timestamp `2025-03-01T{time}`
+def log_line(time, status="neutral", message="Message"):
+    return json.dumps(create_entry(time, status, message)) + "\n"
+
+def create_entry(time, status="neutral", message="Message"):
+    return {"timestamp": f"2025-03-01T{time}", "status": status, "log": {"message": message}}
+
+# The times of the entries of a page
+def times(entries):
+    return [entry["timestamp"][11:] for entry in entries]
+
+def write_log_file(path, times_and_statuses):
+    path.write_text("".join(log_line(time, status) for time, status in times_and_statuses))
+    return str(path)
+
+TIMES = ["00:00", "01:00", "02:00", "03:00", "04:00"]
+
+def test_pages_newest_and_oldest_first(tmp_path):
+    path = write_log_file(tmp_path / "March.jsonl", [(time, "neutral") for time in TIMES])
+    assert log_server.query_log_files([path], 0, 2) == (5, [create_entry("04:00"), create_entry("03:00")])
+    assert times(log_server.query_log_files([path], 4, 2)[1]) == ["00:00"]
+    assert times(log_server.query_log_files([path], 2, 2, newest_first=False)[1]) == ["02:00", "03:00"]
+    assert log_server.query_log_files([path], 5, 2) == (5, [])
+
+def test_status_and_time_filters(tmp_path):
+    path = write_log_file(tmp_path / "March.jsonl", zip(TIMES, ["neutral", "error", "neutral", "error", "error"]))
+    total, entries = log_server.query_log_files([path], 0, 2, status="error")
+    assert (total, times(entries)) == (3, ["04:00", "03:00"])
+    assert times(log_server.query_log_files([path], 2, 2, status="error")[1]) == ["01:00"]
+    # `from` is included and `to` isn't
+    total, entries = log_server.query_log_files([path], start="2025-03-01T01:00", end="2025-03-01T03:00")
+    assert (total, times(entries)) == (2, ["02:00", "01:00"])
+    total, entries = log_server.query_log_files([path], status="error", start="2025-03-01T01:30")
+    assert (total, times(entries)) == (2, ["04:00", "03:00"])
+
+def test_index_is_extended_as_the_file_grows(tmp_path):
+    path = write_log_file(tmp_path / "March.jsonl", [(time, "neutral") for time in TIMES[:2]])
+    assert log_server.query_log_files([path])[0] == 2
+    index = log_server.log_file_indexes[path]
+    # A line that is still being written is left for the next update
+    with open(path, "a") as file:
+        file.write(log_line("02:00") + log_line("03:00")[:20])
+    total, entries = log_server.query_log_files([path], start="2025-03-01T01:00")
+    assert (total, times(entries)) == (2, ["02:00", "01:00"])
+    with open(path, "a") as file:
+        file.write(log_line("03:00")[20:])
+    assert times(log_server.query_log_files([path])[1]) == ["03:00", "02:00", "01:00", "00:00"]
+    assert log_server.log_file_indexes[path] is index
+    assert len(index) == 4
+    assert index.in_order
+
+def test_damaged_lines_are_skipped(tmp_path):
+    path = tmp_path / "March.jsonl"
+    path.write_text(log_line("00:00") + "{\"timestamp\": \"2025-03-01T01:00\", \"sta\n" + "not json\n" + log_line("02:00", "error"))
+    path = str(path)
+    assert times(log_server.query_log_files([path])[1]) == ["02:00", "00:00"]
+    assert times(log_server.query_log_files([path], status="error")[1]) == ["02:00"]
+    assert times(log_server.query_log_files([path], start="2025-03-01T00:30")[1]) == ["02:00"]
+    assert log_server.get_line_timestamp(b"not json") == ""
+
+def test_time_filter_when_the_clock_goes_back(tmp_path):
+    # The end of daylight saving time: the clock goes back from 02:59 to 02:00
+    path = write_log_file(tmp_path / "March.jsonl", [(time, "neutral") for time in ["01:30", "02:30", "02:45", "02:10", "02:20", "03:00"]])
+    total, entries = log_server.query_log_files([path], start="2025-03-01T02:15", end="2025-03-01T02:50")
+    assert (total, times(entries)) == (3, ["02:20", "02:45", "02:30"])
+    assert not log_server.log_file_indexes[path].in_order
+
+@pytest.mark.parametrize("extension", [".jsonl", ".jsonl.gz", ".json"])
+def test_time_filter_in_every_log_format(tmp_path, extension):
+    entries = [create_entry(time) for time in ["01:00", "02:00", "01:30", "03:00"]]
+    path = tmp_path / ("March" + extension)
+    if extension == ".json":
+        path.write_text(json.dumps(entries))
+    else:
+        data = "".join(json.dumps(entry) + "\n" for entry in entries)
+        if extension.endswith(".gz"):
+            with gzip.open(path, "wt") as file:
+                file.write(data)
+        else:
+            path.write_text(data)
+    assert times(log_server.query_log_files([str(path)], start="2025-03-01T01:15", end="2025-03-01T02:30")[1]) == ["01:30", "02:00"]
+
+def test_month_with_two_log_formats_is_read_as_one(tmp_path):
+    os.makedirs(tmp_path / "2025")
+    (tmp_path / "2025" / "March.json").write_text(json.dumps([create_entry(time) for time in TIMES[:2]]))
+    write_log_file(tmp_path / "2025" / "March.jsonl", [(time, "neutral") for time in TIMES[2:]])
+    paths = log_server.find_log_files("2025", "March", str(tmp_path))
+    assert len(paths) == 2
+    total, entries = log_server.query_log_files(paths, 1, 3)
+    assert (total, times(entries)) == (5, ["03:00", "02:00", "01:00"])
+    total, entries = log_server.query_log_files(paths, start="2025-03-01T00:30", end="2025-03-01T02:30", newest_first=False)
+    assert (total, times(entries)) == (2, ["01:00", "02:00"])
+
+def test_log_entries_api(server):
+    server_logs = os.path.join("logs", "2025")
+    with open(os.path.join(server_logs, "March.json"), "w") as file:
+        json.dump([create_entry("00:00")], file)
+    with open(os.path.join(server_logs, "March.jsonl"), "w") as file:
+        file.write(log_line("01:00", "error") + log_line("02:00"))
+    status, body = get(server, "/api/logs/2025/March?limit=1&offset=1&order=oldest")
+    assert status == 200
+    page = json.loads(body)
+    assert (page["total"], page["offset"], times(page["entries"])) == (3, 1, ["01:00"])
+    assert json.loads(get(server, "/api/logs/2025/March?status=error")[1])["total"] == 1
+    assert get(server, "/api/logs/2025/April")[0] == 404
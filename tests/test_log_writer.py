@@ -0,0 +1,90 @@
+# Tests for the background log writer (`loger.LogWriter`)
+
+# Import the required modules
+import time
+import json
+import pytest
+import loger
+
+# Record the writes of the log writer instead of writing the log files
+@pytest.fixture
+def writes(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    writes = []
+    monkeypatch.setattr(loger, "write_log_entries", lambda path, entries, fsync=False: writes.append((path, [entry["log"]["message"] for entry in entries], fsync)))
+    monkeypatch.setattr(loger, "get_current_log_file_path", lambda: "current.jsonl")
+    return writes
+
+def entry(message):
+    return loger.create_log_entry("neutral", message)
+
+def test_entries_are_written_in_batches(writes):
+    writer = loger.LogWriter(flush_interval=60, batch_size=2, fsync_interval=None)
+    for number in range(5):
+        writer.put("a.jsonl", entry(number))
+    writer.start()
+    writer.flush(5)
+    assert writes == [("a.jsonl", [0, 1], False), ("a.jsonl", [2, 3], False), ("a.jsonl", [4], False)]
+    writer.close()
+
+def test_a_batch_has_one_write_per_log_file(writes):
+    writer = loger.LogWriter(flush_interval=60, batch_size=10, fsync_interval=None)
+    for path, message in (("a.jsonl", 1), ("b.jsonl", 2), ("a.jsonl", 3)):
+        writer.put(path, entry(message))
+    writer.start()
+    writer.flush(5)
+    assert writes == [("a.jsonl", [1, 3], False), ("b.jsonl", [2], False)]
+    writer.close()
+
+def test_a_batch_is_written_after_the_flush_interval(writes):
+    writer = loger.LogWriter(flush_interval=0.05, batch_size=100, fsync_interval=None)
+    writer.start()
+    writer.put("a.jsonl", entry(1))
+    deadline = time.monotonic() + 5
+    while not writes and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writes == [("a.jsonl", [1], False)]
+    writer.close()
+
+def test_entries_are_dropped_when_the_queue_is_full(writes):
+    writer = loger.LogWriter(flush_interval=60, batch_size=100, fsync_interval=None, queue_size=2)
+    started = time.monotonic()
+    for number in range(5):
+        writer.put("a.jsonl", entry(number))
+    # A full queue never blocks
+    assert time.monotonic() - started < 1
+    assert writer.dropped_entries == 3
+    writer.start()
+    writer.close()
+    assert writes[0] == ("a.jsonl", [0, 1], True)
+    assert writes[1] == ("current.jsonl", ["3 log entries were dropped, the log writer could not keep up"], True)
+    assert writer.dropped_entries == 0
+
+@pytest.mark.parametrize("fsync_interval, expected_fsyncs", [
+    # Every batch
+    (0, [True, True, True]),
+    # Only when the writer is closed
+    (None, [False, False, True]),
+    (3600, [False, False, True])
+])
+def test_fsync_interval(writes, fsync_interval, expected_fsyncs):
+    writer = loger.LogWriter(flush_interval=60, batch_size=100, fsync_interval=fsync_interval)
+    writer.start()
+    for number in range(3):
+        writer.put("a.jsonl", entry(number))
+        if number < 2:
+            writer.flush(5)
+    writer.close()
+    assert [fsync for _, _, fsync in writes] == expected_fsyncs
+
+def test_close_writes_every_queued_entry(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / "logs" / "March.jsonl")
+    writer = loger.LogWriter(flush_interval=60, batch_size=7, fsync_interval=None)
+    for number in range(100):
+        writer.put(path, entry(number))
+    writer.start()
+    writer.close()
+    assert not writer.is_alive()
+    with open(path) as file:
+        assert [json.loads(line)["log"]["message"] for line in file] == list(range(100))
@@ -0,0 +1,65 @@
+# Tests for `loger.py`
+
+# Import the required modules
+import json
+import loger
+
+# Write a JSON Lines log file with some whole entries, then `tail` (bytes)
+def create_log_file(tmp_path, tail=b""):
+    path = tmp_path / "March.jsonl"
+    lines = b"".join(json.dumps({"message": f"entry {number}"}).encode() + b"\n" for number in range(3))
+    path.write_bytes(lines + tail)
+    return str(path), lines
+
+def test_a_whole_log_file_is_not_changed(tmp_path):
+    path, lines = create_log_file(tmp_path)
+    assert loger.recover_log_file(path) == 0
+    assert open(path, "rb").read() == lines
+
+def test_a_partly_written_line_is_cut_off(tmp_path):
+    path, lines = create_log_file(tmp_path, b'{"message": "entr')
+    assert loger.recover_log_file(path) == 17
+    assert open(path, "rb").read() == lines
+
+def test_a_line_without_its_newline_is_cut_off(tmp_path):
+    path, lines = create_log_file(tmp_path, b'{"message": "entry 3"}')
+    loger.recover_log_file(path)
+    assert open(path, "rb").read() == lines
+
+def test_zeros_after_a_power_cut_are_cut_off(tmp_path):
+    path, lines = create_log_file(tmp_path, b"\0" * 100 + b"\n" + b"\0" * 50)
+    loger.recover_log_file(path)
+    assert open(path, "rb").read() == lines
+
+def test_zeros_longer_than_the_tail_size_are_cut_off(tmp_path):
+    zeros = b"\0" * (loger.RECOVERY_TAIL_SIZE * 3 + 123)
+    path, lines = create_log_file(tmp_path, zeros)
+    assert loger.recover_log_file(path) == len(zeros)
+    assert open(path, "rb").read() == lines
+
+def test_a_file_of_only_zeros_is_emptied(tmp_path):
+    path = tmp_path / "March.jsonl"
+    path.write_bytes(b"\0" * 1000)
+    assert loger.recover_log_file(str(path), tail_size=64) == 1000
+    assert path.read_bytes() == b""
+
+def test_json_log_files_are_not_changed(tmp_path):
+    path = tmp_path / "March.json"
+    path.write_bytes(b"[{")
+    assert loger.recover_log_file(str(path)) == 0
+    assert path.read_bytes() == b"[{"
+
+def test_a_line_torn_just_before_its_newline_is_cut_off(tmp_path):
+    path, lines = create_log_file(tmp_path, json.dumps({"message": "entry 3"}).encode())
+    assert loger.recover_log_file(path) == len(json.dumps({"message": "entry 3"}))
+    assert open(path, "rb").read() == lines
+
+def test_a_torn_line_that_is_still_valid_json_is_cut_off(tmp_path):
+    path, lines = create_log_file(tmp_path, b"12\n")
+    assert loger.recover_log_file(path) == 3
+    assert open(path, "rb").read() == lines
+
+def test_only_the_torn_lines_are_cut_off_with_a_small_tail_size(tmp_path):
+    path, lines = create_log_file(tmp_path, b'{"message": "en\n' + b"\0" * 500)
+    loger.recover_log_file(path, tail_size=64)
+    assert open(path, "rb").read() == lines
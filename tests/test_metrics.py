@@ -0,0 +1,59 @@
+# Tests for `metrics.py`: scrape the metrics server once, in both text formats
+
+# Import the required modules
+import pytest
+import requests
+import metrics
+
+SITE = "test-site"
+
+# A metrics server on a free port, with one sample of each type of metric
+@pytest.fixture
+def server():
+    metrics.probes.inc(SITE, "192.0.2.1", "success")
+    metrics.probe_rtt.observe(SITE, "192.0.2.1", value=0.004)
+    metrics.failed_pings.set(SITE, value=2)
+    server = metrics.start_metrics_server("127.0.0.1", 0)
+    yield server
+    server.shutdown()
+    server.server_close()
+    metrics.forget_site(SITE)
+
+def scrape(server, accept=None):
+    headers = {"Accept": accept} if accept else {}
+    return requests.get(f"http://127.0.0.1:{server.server_port}/metrics", headers=headers, timeout=5)
+
+def test_prometheus_text_format(server):
+    response = scrape(server)
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == metrics.PROMETHEUS_CONTENT_TYPE
+    lines = response.text.splitlines()
+    # Counter families are named after their samples in the Prometheus format
+    assert "# HELP network_rebooter_probes_total Ping attempts, by site, address and result." in lines
+    assert "# TYPE network_rebooter_probes_total counter" in lines
+    assert 'network_rebooter_probes_total{site="test-site",target="192.0.2.1",result="success"} 1' in lines
+    assert "# TYPE network_rebooter_failed_pings gauge" in lines
+    assert 'network_rebooter_failed_pings{site="test-site"} 2' in lines
+    assert "# HELP network_rebooter_probe_rtt_seconds Round trip time of the ping attempts that were answered." in lines
+    assert "# TYPE network_rebooter_probe_rtt_seconds histogram" in lines
+    assert 'network_rebooter_probe_rtt_seconds_bucket{site="test-site",target="192.0.2.1",le="0.0025"} 0' in lines
+    assert 'network_rebooter_probe_rtt_seconds_bucket{site="test-site",target="192.0.2.1",le="0.005"} 1' in lines
+    assert 'network_rebooter_probe_rtt_seconds_bucket{site="test-site",target="192.0.2.1",le="+Inf"} 1' in lines
+    assert 'network_rebooter_probe_rtt_seconds_count{site="test-site",target="192.0.2.1"} 1' in lines
+    assert 'network_rebooter_probe_rtt_seconds_sum{site="test-site",target="192.0.2.1"} 0.004' in lines
+    assert "# EOF" not in lines
+
+def test_openmetrics_text_format(server):
+    response = scrape(server, "application/openmetrics-text; version=1.0.0")
+    assert response.headers["Content-Type"] == metrics.OPENMETRICS_CONTENT_TYPE
+    lines = response.text.splitlines()
+    assert "# TYPE network_rebooter_probes counter" in lines
+    assert 'network_rebooter_probes_total{site="test-site",target="192.0.2.1",result="success"} 1' in lines
+    assert "# TYPE network_rebooter_failed_pings gauge" in lines
+    assert "# TYPE network_rebooter_probe_rtt_seconds histogram" in lines
+    assert 'network_rebooter_probe_rtt_seconds_bucket{site="test-site",target="192.0.2.1",le="+Inf"} 1' in lines
+    assert lines[-1] == "# EOF"
+
+def test_other_paths_are_not_found(server):
+    response = requests.get(f"http://127.0.0.1:{server.server_port}/", timeout=5)
+    assert response.status_code == 404
@@ -0,0 +1,219 @@
+# Tests for `monitor.py`: the site monitor always has a next event
+
+# Import the required modules
+import time
+import threading
+import configuration
+import monitor
+import metrics
+import loger
+import dns_cache
+import reboot_governor
+from scheduler import Scheduler
+
+# The settings of a site, with the required settings only
+def create_site_settings(name="default", ping_list=("10.0.0.1",), ping=None, network=None):
+    ping_settings = {"ping_list": list(ping_list), "unreachable_ping_threshold": 1, "ping_check_frequency": 5, "ping_retry_amount": 0, "ping_retry_interval": 1}
+    network_settings = {"network_reboot_interval": 5, "network_reboot_retry_count": 3, "network_reboot_cooldown_period": 60}
+    ping_settings.update(ping or {})
+    network_settings.update(network or {})
+    return configuration.SiteSettings(name, {"router_ip_address": "127.0.0.1", "router_password": "password"}, ping_settings, network_settings)
+
+# Run the scheduler on this thread for `seconds`, or until `stop` is called, with a watchdog
+# that stops it if a test leaves it running
+def run_scheduler(scheduler, seconds, timeout=5):
+    scheduler.call_later(seconds, scheduler.stop)
+    watchdog = threading.Timer(timeout, scheduler.stop)
+    watchdog.start()
+    try:
+        scheduler.run()
+    finally:
+        watchdog.cancel()
+        scheduler.shutdown()
+
+# A router driver whose reboot request raises an exception
+class FailingRouterClient:
+    def reboot(self):
+        raise AttributeError("'list' object has no attribute 'get'")
+
+    def export_token(self):
+        return None
+
+def test_site_carries_on_when_the_router_driver_raises():
+    scheduler = Scheduler()
+    site_monitor = monitor.SiteMonitor(scheduler, create_site_settings())
+    site_monitor.client = FailingRouterClient()
+    site_monitor.set_state(monitor.STATE_IDLE)
+    site_monitor.set_state(monitor.STATE_CHECKING)
+    site_monitor.reboot_network()
+    run_scheduler(scheduler, 0.5)
+    assert site_monitor.state == monitor.STATE_IDLE
+    assert site_monitor.timer is not None and not site_monitor.timer.cancelled
+
+# A router driver that accepts every reboot request
+class AcceptingRouterClient(FailingRouterClient):
+    def reboot(self):
+        return True
+
+def test_only_accepted_reboots_count_towards_the_reboot_limits():
+    scheduler = Scheduler()
+    site_monitor = monitor.SiteMonitor(scheduler, create_site_settings(network={"recovery_detection": False}))
+    site_monitor.client = FailingRouterClient()
+    site_monitor.set_state(monitor.STATE_IDLE)
+    site_monitor.set_state(monitor.STATE_CHECKING)
+    site_monitor.reboot_network()
+    run_scheduler(scheduler, 0.3)
+    assert list(site_monitor.reboot_governor.reboot_times) == []
+
+    scheduler = Scheduler()
+    site_monitor.scheduler = scheduler
+    site_monitor.client = AcceptingRouterClient()
+    site_monitor.set_state(monitor.STATE_CHECKING)
+    site_monitor.reboot_network()
+    run_scheduler(scheduler, 0.3)
+    assert site_monitor.state == monitor.STATE_WAITING_FOR_RECOVERY
+    assert len(site_monitor.reboot_governor.reboot_times) == 1
+
+def test_a_refused_reboot_waits_until_the_next_reboot_is_allowed():
+    scheduler = Scheduler()
+    site_monitor = monitor.SiteMonitor(scheduler, create_site_settings())
+    site_monitor.reboot_governor = reboot_governor.RebootGovernor(1, 0, 0, 0, [time.time() - 10])
+    site_monitor.set_state(monitor.STATE_IDLE)
+    site_monitor.set_state(monitor.STATE_CHECKING)
+    site_monitor.request_reboot(1)
+    assert site_monitor.state == monitor.STATE_IDLE
+    # The hourly limit allows the next reboot in about 3590 seconds, not at the next check in 300
+    assert site_monitor.timer.when - scheduler.time() > 3580
+
+def test_a_dns_failure_does_not_reboot_the_router():
+    scheduler = Scheduler()
+    site_monitor = monitor.SiteMonitor(scheduler, create_site_settings())
+    site_monitor.client = FailingRouterClient()
+    site_monitor.set_state(monitor.STATE_IDLE)
+    site_monitor.set_state(monitor.STATE_CHECKING)
+    site_monitor.set_state(monitor.STATE_DIAGNOSING)
+    site_monitor.last_check_result = {}
+    site_monitor.on_diagnosis_complete("dns", 1)
+    assert site_monitor.state == monitor.STATE_IDLE
+    assert site_monitor.number_of_reboots_in_a_row == 0
+    scheduler.shutdown()
+
+# A configuration with one site for each of the router details given, and any other top level settings
+def create_configuration(*router_details_list, **top_level_settings):
+    sites = [{"name": f"site-{index + 1}", "router_details": router_details} for index, router_details in enumerate(router_details_list)]
+    return configuration.load_configuration(dict({
+        "log_file": False,
+        "sites": sites,
+        "ping": {"ping_list": ["10.0.0.1"], "unreachable_ping_threshold": 1, "ping_check_frequency": 5, "ping_retry_amount": 0, "ping_retry_interval": 1},
+        "network": {"network_reboot_interval": 5, "network_reboot_retry_count": 3, "network_reboot_cooldown_period": 60}
+    }, **top_level_settings))
+
+def test_reload_without_router_details_for_a_new_site_is_rejected():
+    router_details = {"router_ip_address": "192.168.0.1", "router_password": "password"}
+    new_configuration = create_configuration(router_details, {"router_ip_address": "", "router_password": ""})
+    service = monitor.MonitorService(Scheduler(), create_configuration(router_details).sites, lambda: new_configuration)
+    service.reload()
+    assert list(service.monitors) == ["site-1"]
+    assert service.monitors["site-1"].pending_settings is None
+
+def test_reload_with_valid_settings_is_used_from_the_next_check_cycle():
+    router_details = {"router_ip_address": "192.168.0.1", "router_password": "password"}
+    new_configuration = create_configuration(dict(router_details, router_ip_address="192.168.0.254"))
+    service = monitor.MonitorService(Scheduler(), create_configuration(router_details).sites, lambda: new_configuration)
+    service.reload()
+    assert service.monitors["site-1"].pending_settings.router_details["router_ip_address"] == "192.168.0.254"
+
+def test_failed_pings_are_retried_at_the_fast_recheck_interval_only_during_fast_rechecks():
+    site_settings = create_site_settings(ping={"adaptive_scheduling": True, "ping_retry_interval": 10, "fast_recheck_interval": 1, "fast_recheck_limit": 2})
+    site_monitor = monitor.SiteMonitor(Scheduler(), site_settings)
+    assert site_monitor.ping_retry_interval() == 10
+    intervals = []
+    for failed_pings in (1, 1, 1, 0):
+        site_monitor.check_interval.next_interval(failed_pings, 0)
+        intervals.append(site_monitor.ping_retry_interval())
+    assert intervals == [1, 1, 10, 10]
+
+def test_reload_does_not_bring_back_removed_router_details():
+    router_details = {"router_ip_address": "192.168.0.1", "router_password": "password"}
+    old_configuration = create_configuration(dict(router_details, router_model="virgin_media_hub_5"))
+    service = monitor.MonitorService(Scheduler(), old_configuration.sites, lambda: create_configuration(router_details))
+    service.reload()
+    assert service.monitors["site-1"].pending_settings.router_details == router_details
+
+def test_reload_keeps_router_details_entered_at_start_up():
+    old_configuration = create_configuration({"router_ip_address": "192.168.0.1", "router_password": ""})
+    site = old_configuration.sites[0]
+    # As entered by the user when the program started (see `main.py`)
+    site.router_details["router_password"] = site.manual_router_details["router_password"] = "entered"
+    service = monitor.MonitorService(Scheduler(), old_configuration.sites, lambda: create_configuration({"router_ip_address": "192.168.0.254", "router_password": ""}))
+    service.reload()
+    new_site = service.monitors["site-1"].pending_settings
+    assert new_site.router_details == {"router_ip_address": "192.168.0.254", "router_password": "entered"}
+    assert new_site.manual_router_details == {"router_password": "entered"}
+
+def test_reload_updates_the_site_names_in_messages():
+    router_details = {"router_ip_address": "192.168.0.1", "router_password": "password"}
+    configurations = [create_configuration(router_details)]
+    service = monitor.MonitorService(Scheduler(), create_configuration(router_details, router_details).sites, lambda: configurations[-1])
+    assert service.monitors["site-1"].prefix == "[site-1] "
+    service.reload()
+    assert service.monitors["site-1"].prefix == ""
+    configurations.append(create_configuration(router_details, router_details))
+    service.reload()
+    assert service.monitors["site-1"].prefix == "[site-1] "
+    for site_monitor in service.monitors.values():
+        site_monitor.stop()
+
+def test_reload_applies_or_reports_every_changed_top_level_setting(tmp_path, monkeypatch):
+    monkeypatch.setattr(dns_cache, "dns_cache", dns_cache.DnsCache())
+    messages = []
+    monkeypatch.setattr(loger, "write_to_log_file", lambda status, message, *args: messages.append((status, message)))
+    router_details = {"router_ip_address": "192.168.0.1", "router_password": "password"}
+    old_configuration = create_configuration(router_details, state_file=False)
+    new_configuration = create_configuration(
+        router_details,
+        log_format="jsonl",
+        metrics={"port": 9000},
+        config_watch_interval=30,
+        dns_cache_size=16,
+        state_file_path=str(tmp_path / "state.json")
+    )
+    scheduler = Scheduler()
+    service = monitor.MonitorService(scheduler, old_configuration.sites, lambda: new_configuration, configuration_settings=old_configuration)
+    service.reload()
+    assert service.watch_interval == 30
+    assert dns_cache.dns_cache.size == 16
+    # The state file was turned on, and is saved straight away and then every `state_save_interval` seconds
+    assert service.state_path == str(tmp_path / "state.json")
+    assert (tmp_path / "state.json").exists()
+    assert service.state_save_timer is not None
+    assert service.top_level_settings["log_format"] == "json"
+    assert ("error", "The new `log_format` setting is only used after the program is restarted, still using json") in messages
+    assert ("error", "The new `metrics.port` setting is only used after the program is restarted, still using 9464") in messages
+    assert ("neutral", "Using the new `dns_cache_size` setting (16)") in messages
+    assert not any("log_file" in message or "max_worker_threads" in message for _, message in messages)
+
+    # A setting that needs a restart is still reported on the next reload, the others are not
+    messages.clear()
+    service.reload()
+    assert [message for _, message in messages if "` setting" in message] == [
+        "The new `log_format` setting is only used after the program is restarted, still using json",
+        "The new `metrics.port` setting is only used after the program is restarted, still using 9464"
+    ]
+    scheduler.shutdown()
+
+def test_new_ping_settings_resize_and_drop_ping_statistics():
+    site_monitor = monitor.SiteMonitor(Scheduler(), create_site_settings("resized", ["10.0.0.1", "10.0.0.2"], ping={"statistics_window_size": 10}))
+    for ping_address in ("10.0.0.1", "10.0.0.2"):
+        for rtt in (1000, None, 2000, 3000, 4000):
+            site_monitor.on_ping_attempt(ping_address, 0, 1, rtt)
+    assert ("resized", "10.0.0.2", "success") in metrics.probes.values
+    site_monitor.update_ping_statistics(create_site_settings("resized", ["10.0.0.1"], ping={"statistics_window_size": 3}))
+    assert list(site_monitor.ping_statistics) == ["10.0.0.1"]
+    address_statistics = site_monitor.ping_statistics["10.0.0.1"]
+    # Only the newest samples that fit in the new window are kept
+    assert (address_statistics.window_size, address_statistics.sample_count, address_statistics.lost_count) == (3, 3, 0)
+    for metric in (metrics.probes, metrics.probe_rtt, metrics.probe_loss_ratio):
+        assert not any(label_values[:2] == ("resized", "10.0.0.2") for label_values in metric.values)
+        assert any(label_values[:2] == ("resized", "10.0.0.1") for label_values in metric.values)
+    metrics.forget_site("resized")
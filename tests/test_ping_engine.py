@@ -0,0 +1,116 @@
+# Tests for `ping_engine.py`
+
+# Import the required modules
+import time
+import threading
+import tracing
+import ping_engine
+from prober import DNS_FAILURE
+from scheduler import Scheduler
+
+# A ping function that answers from `results` (address: RTT, None or DNS_FAILURE)
+def create_ping_function(results, pinged=None):
+    def ping_function(address):
+        if pinged is not None:
+            pinged.append(address)
+        return results[address]
+    return ping_function
+
+def test_failed_addresses_are_counted():
+    results = {"a": 1000, "b": None, "c": None}
+    assert ping_engine.check_ping_list(list(results), create_ping_function(results), 2, 0, 0) == 2
+
+def test_failed_pings_are_retried():
+    results = {"a": None}
+    pinged = []
+    assert ping_engine.check_ping_list(["a"], create_ping_function(results, pinged), 1, 2, 0.01) == 1
+    assert pinged == ["a", "a", "a"]
+
+# A ping function where some addresses fail at once, and the rest wait for `release` and then fail
+def create_blocking_ping_function(failing_addresses, release, pinged):
+    def ping_function(address):
+        pinged.append(address)
+        if address not in failing_addresses:
+            release.wait(5)
+        return None
+    return ping_function
+
+def test_the_cycle_stops_once_the_threshold_is_reached():
+    release = threading.Event()
+    pinged = []
+    attempts = []
+    completed = []
+    scheduler = Scheduler(max_workers=4)
+    def on_complete(failed_pings):
+        completed.append(failed_pings)
+        scheduler.call_later(0.2, scheduler.stop)
+    ping_function = create_blocking_ping_function({"a", "b"}, release, pinged)
+    cycle = ping_engine.PingCheckCycle(scheduler, ["a", "b", "c", "d"], ping_function, 2, 0, 0, lambda address, *_: attempts.append(address), on_complete)
+    scheduler.call_soon(cycle.start)
+    # The last two results come in after the decision, and are ignored
+    scheduler.call_later(0.1, release.set)
+    try:
+        scheduler.run()
+    finally:
+        release.set()
+        scheduler.shutdown()
+    assert completed == [2]
+    assert sorted(pinged) == ["a", "b", "c", "d"]
+    assert sorted(attempts) == ["a", "b"]
+    assert cycle.failed_pings == 2 and cycle.pending_addresses == 2
+
+def test_retries_are_cancelled_once_the_threshold_cant_be_reached():
+    pinged = []
+    completed = []
+    timers = []
+    scheduler = Scheduler(max_workers=2)
+    call_later = scheduler.call_later
+    def record_timer(*args):
+        timers.append(call_later(*args))
+        return timers[-1]
+    scheduler.call_later = record_timer
+    def on_complete(failed_pings):
+        completed.append(failed_pings)
+        scheduler.stop()
+    # "a" fails and would be retried in a minute, but once "b" answers two failed addresses are impossible
+    def ping_function(address):
+        pinged.append(address)
+        if address == "a":
+            return None
+        time.sleep(0.1)
+        return 1000
+    cycle = ping_engine.PingCheckCycle(scheduler, ["a", "b"], ping_function, 2, 3, 60, on_complete=on_complete)
+    scheduler.call_soon(cycle.start)
+    try:
+        scheduler.run()
+    finally:
+        scheduler.shutdown()
+    assert completed == [0]
+    assert sorted(pinged) == ["a", "b"]
+    assert len(timers) == 1 and timers[0].cancelled
+
+def test_check_ping_list_returns_without_waiting_for_slow_pings():
+    release = threading.Event()
+    pinged = []
+    try:
+        assert ping_engine.check_ping_list(["a", "b", "c"], create_blocking_ping_function({"a"}, release, pinged), 1, 0, 0) == 1
+        assert not release.is_set()
+    finally:
+        release.set()
+
+def test_dns_failures_are_not_counted_by_default():
+    results = {"a": DNS_FAILURE}
+    assert ping_engine.check_ping_list(["a"], create_ping_function(results), 1, 0, 0) == 0
+
+def test_a_probe_that_raises_is_a_failed_ping():
+    def ping_function(address):
+        raise OSError("no route")
+    assert ping_engine.check_ping_list(["a"], ping_function, 1, 0, 0) == 1
+
+def test_the_check_cycle_is_traced(monkeypatch):
+    monkeypatch.setattr(tracing, "tracing_enabled", False)
+    monkeypatch.setattr(tracing, "spans", tracing.spans)
+    tracing.enable_tracing()
+    results = {"a": 1000, "b": 2000}
+    ping_engine.check_ping_list(list(results), create_ping_function(results), 1, 0, 0)
+    assert [phase for phase, _, _ in tracing.spans] == ["ping.check_cycle"]
@@ -0,0 +1,57 @@
+# Tests for `ping_statistics.py`
+
+# Import the required modules
+import pytest
+import ping_statistics
+
+def test_empty_statistics():
+    statistics = ping_statistics.PingStatistics(10)
+    assert statistics.loss_rate() == 0.0
+    assert statistics.mean_rtt() is None
+    assert statistics.percentiles() == {50: None, 95: None, 99: None}
+
+def test_loss_rate_and_mean_rtt():
+    statistics = ping_statistics.PingStatistics(10)
+    for rtt in (1000, None, 3000, None):
+        statistics.add_sample(rtt)
+    assert statistics.sample_count == 4
+    assert statistics.loss_rate() == 0.5
+    assert statistics.mean_rtt() == 2000
+
+def test_oldest_samples_leave_the_window():
+    statistics = ping_statistics.PingStatistics(3)
+    for rtt in (None, None, 1000, 2000, 3000):
+        statistics.add_sample(rtt)
+    assert statistics.sample_count == 3
+    assert statistics.lost_count == 0
+    assert statistics.mean_rtt() == 2000
+    assert statistics.percentiles((50,)) == {50: 2000}
+
+def test_jitter_is_smoothed():
+    statistics = ping_statistics.PingStatistics(10)
+    statistics.add_sample(1000)
+    statistics.add_sample(2600)
+    assert statistics.jitter == pytest.approx(100)
+
+def test_export_and_restore_keep_the_newest_samples():
+    statistics = ping_statistics.PingStatistics(4)
+    for rtt in (1000, None, 2000, 3000, 4000, 5000):
+        statistics.add_sample(rtt)
+    saved = statistics.export_samples()
+    assert saved["samples"] == [2000, 3000, 4000, 5000]
+    restored = ping_statistics.PingStatistics(2)
+    restored.restore_samples(saved)
+    assert restored.export_samples()["samples"] == [4000, 5000]
+    assert restored.mean_rtt() == 4500
+    assert restored.jitter == statistics.jitter
+
+def test_degraded_reason():
+    statistics = ping_statistics.PingStatistics(20)
+    for _ in range(9):
+        statistics.add_sample(None)
+    # Not enough pings to tell yet
+    assert ping_statistics.degraded_reason(statistics, max_packet_loss=10) is None
+    statistics.add_sample(100000)
+    assert ping_statistics.degraded_reason(statistics, max_packet_loss=10).startswith("packet loss 90%")
+    assert ping_statistics.degraded_reason(statistics, max_latency=50).startswith("p95 latency 100.0 ms")
+    assert ping_statistics.degraded_reason(statistics) is None
@@ -0,0 +1,79 @@
+# Tests for `probe_store.py`
+
+# Import the required modules
+import os
+import probe_store
+
+# 2025-03-14 12:00:00 UTC, in milliseconds
+NOON_MS = 1741953600000
+
+# Simulate a crash: write the records to the disk, but don't truncate the segment
+def crash(store):
+    store.map.flush()
+    store.map.close()
+    store.file.close()
+
+def test_records_are_20_bytes():
+    assert probe_store.RECORD_FORMAT.format == "<qIIB3x"
+    assert probe_store.RECORD_SIZE == 20
+
+def test_records_round_trip(tmp_path):
+    store = probe_store.ProbeStore(str(tmp_path))
+    store.append("192.0.2.1", 1234.9, NOON_MS)
+    store.append("example.com", None, NOON_MS + 1)
+    store.append("192.0.2.1", 2 ** 40, NOON_MS + 2)
+    store.close()
+    assert list(probe_store.read_probes(path=str(tmp_path))) == [
+        (NOON_MS, "192.0.2.1", 1234, probe_store.STATUS_REACHABLE),
+        (NOON_MS + 1, "example.com", None, probe_store.STATUS_UNREACHABLE),
+        (NOON_MS + 2, "192.0.2.1", probe_store.NO_RTT - 1, probe_store.STATUS_REACHABLE)
+    ]
+    # The segment is cut down to its records when it is closed
+    assert os.path.getsize(tmp_path / "2025-03-14.bin") == 3 * probe_store.RECORD_SIZE
+
+def test_a_segment_grows_past_its_first_chunk(tmp_path):
+    store = probe_store.ProbeStore(str(tmp_path), chunk_records=4)
+    for number in range(10):
+        store.append("192.0.2.1", number, NOON_MS + number)
+    assert len(store.map) == 12 * probe_store.RECORD_SIZE
+    store.close()
+    assert [rtt for _, _, rtt, _ in probe_store.read_probes(path=str(tmp_path))] == list(range(10))
+
+def test_a_reopened_segment_carries_on_after_its_last_record(tmp_path):
+    store = probe_store.ProbeStore(str(tmp_path), chunk_records=8)
+    for number in range(3):
+        store.append("192.0.2.1", number, NOON_MS + number)
+    crash(store)
+    # The segment still has its unwritten (zero) space, the end is found by binary search
+    assert os.path.getsize(tmp_path / "2025-03-14.bin") == 8 * probe_store.RECORD_SIZE
+    store = probe_store.ProbeStore(str(tmp_path), chunk_records=8)
+    store.append("192.0.2.1", 3, NOON_MS + 3)
+    assert store.offset == 4 * probe_store.RECORD_SIZE
+    store.close()
+    assert [rtt for _, _, rtt, _ in probe_store.read_probes(path=str(tmp_path))] == [0, 1, 2, 3]
+
+def test_count_records_finds_the_first_empty_record():
+    for record_count in range(6):
+        buffer = bytearray(5 * probe_store.RECORD_SIZE)
+        for index in range(min(record_count, 5)):
+            probe_store.RECORD_FORMAT.pack_into(buffer, index * probe_store.RECORD_SIZE, NOON_MS + index, 0, 0, 0)
+        assert probe_store.count_records(buffer) == min(record_count, 5)
+
+def test_a_new_segment_is_started_at_midnight_utc(tmp_path):
+    midnight_ms = probe_store.get_segment_start("2025-03-15.bin")
+    store = probe_store.ProbeStore(str(tmp_path))
+    store.append("192.0.2.1", 1, midnight_ms - 1)
+    store.append("192.0.2.1", 2, midnight_ms)
+    store.close()
+    assert sorted(os.listdir(tmp_path)) == ["2025-03-14.bin", "2025-03-15.bin", "targets.json"]
+    assert [rtt for _, _, rtt, _ in probe_store.read_probes(path=str(tmp_path))] == [1, 2]
+
+def test_range_and_address_queries(tmp_path):
+    store = probe_store.ProbeStore(str(tmp_path))
+    for number in range(10):
+        store.append("192.0.2.1" if number % 2 else "192.0.2.2", number, NOON_MS + number * 1000)
+    store.close()
+    path = str(tmp_path)
+    assert [rtt for _, _, rtt, _ in probe_store.read_probes(NOON_MS + 3000, NOON_MS + 6000, path=path)] == [3, 4, 5]
+    assert [rtt for _, _, rtt, _ in probe_store.read_probes(NOON_MS + 3000, address="192.0.2.1", path=path)] == [3, 5, 7, 9]
+    assert list(probe_store.read_probes(address="192.0.2.9", path=path)) == []
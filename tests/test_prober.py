@@ -0,0 +1,130 @@
+# Tests for `prober.py`, against a local TCP listener and a local UDP (DNS) responder
+
+# Import the required modules
+import sys
+import socket
+import struct
+import threading
+import subprocess
+import pytest
+import prober
+
+# A UDP socket on a free local port that answers every DNS query, with the query id
+# changed by `id_offset` (so a non-zero offset answers with the wrong id)
+@pytest.fixture
+def dns_responder(monkeypatch):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(5)
+    monkeypatch.setattr(prober, "DNS_PORT", sock.getsockname()[1])
+    state = {"id_offset": 0}
+
+    def respond():
+        try:
+            while True:
+                query, address = sock.recvfrom(512)
+                query_id = (struct.unpack("!H", query[:2])[0] + state["id_offset"]) & 0xFFFF
+                # A "refused" answer still means the DNS server is reachable
+                sock.sendto(struct.pack("!HHHHHH", query_id, 0x8005, 0, 0, 0, 0), address)
+        except OSError:
+            pass
+
+    threading.Thread(target=respond, daemon=True).start()
+    yield state
+    sock.close()
+
+# A free local TCP port with nothing listening on it
+def get_closed_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+def test_tcp_probe_of_a_listening_port():
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    try:
+        rtt = prober.probe_tcp("127.0.0.1", 1, listener.getsockname()[1])
+    finally:
+        listener.close()
+    assert isinstance(rtt, int) and rtt >= 0
+
+def test_tcp_probe_of_a_refused_port_is_reachable():
+    assert prober.is_reachable(prober.probe_tcp("127.0.0.1", 1, get_closed_port()))
+
+def test_dns_probe_gets_an_answer(dns_responder):
+    rtt = prober.probe_dns("127.0.0.1", 1)
+    assert isinstance(rtt, int) and rtt >= 0
+
+def test_dns_probe_ignores_answers_to_other_queries(dns_responder):
+    dns_responder["id_offset"] = 1
+    assert prober.probe_dns("127.0.0.1", 0.2) is None
+
+def test_dns_probe_without_an_answer_times_out(monkeypatch):
+    silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    silent.bind(("127.0.0.1", 0))
+    monkeypatch.setattr(prober, "DNS_PORT", silent.getsockname()[1])
+    try:
+        assert prober.probe_dns("127.0.0.1", 0.2) is None
+    finally:
+        silent.close()
+
+def test_a_hostname_that_cannot_be_resolved_is_a_dns_failure(monkeypatch):
+    monkeypatch.setattr(prober, "resolve_address", lambda address: None)
+    for probe in (prober.probe_icmp, prober.probe_tcp, prober.probe_dns, prober.probe_subprocess):
+        assert probe("nowhere.invalid") == prober.DNS_FAILURE
+    assert not prober.is_reachable(prober.DNS_FAILURE)
+
+# Replace `subprocess.run` with one that records the command and returns `stdout` and `returncode`
+def fake_ping(monkeypatch, stdout="", returncode=0, error=None):
+    commands = []
+    def run(command, **kwargs):
+        commands.append(command)
+        if error is not None:
+            raise error
+        return subprocess.CompletedProcess(command, returncode, stdout, "")
+    monkeypatch.setattr(prober.subprocess, "run", run)
+    return commands
+
+def test_subprocess_probe_uses_the_time_reported_by_ping(monkeypatch):
+    monkeypatch.setattr(sys, "platform", "linux")
+    commands = fake_ping(monkeypatch, "64 bytes from 192.0.2.1: icmp_seq=1 ttl=64 time=12.5 ms\n")
+    assert prober.probe_subprocess("192.0.2.1", 1.5) == 12500
+    # `-W` is in whole seconds on Linux
+    assert commands == [["ping", "-c", "1", "-W", "2", "192.0.2.1"]]
+
+def test_subprocess_probe_wait_is_in_milliseconds_on_macos(monkeypatch):
+    monkeypatch.setattr(sys, "platform", "darwin")
+    commands = fake_ping(monkeypatch, "64 bytes from 192.0.2.1: icmp_seq=0 ttl=64 time<1 ms\n")
+    assert prober.probe_subprocess("192.0.2.1", 1.5) == 1000
+    assert commands[0][3:5] == ["-W", "1500"]
+
+def test_subprocess_probe_without_a_reported_time_uses_the_elapsed_time(monkeypatch):
+    fake_ping(monkeypatch, "1 packets transmitted, 1 received\n")
+    assert isinstance(prober.probe_subprocess("192.0.2.1"), int)
+
+@pytest.mark.parametrize("returncode, error", [(1, None), (0, subprocess.TimeoutExpired("ping", 2)), (0, FileNotFoundError("ping"))])
+def test_subprocess_probe_failures(monkeypatch, returncode, error):
+    fake_ping(monkeypatch, returncode=returncode, error=error)
+    assert prober.probe_subprocess("192.0.2.1") is None
+
+def test_icmp_falls_back_to_the_subprocess_once_sockets_are_not_allowed(monkeypatch):
+    monkeypatch.setattr(prober, "icmp_sockets_supported", None)
+    socket_attempts = []
+    def open_icmp_socket():
+        socket_attempts.append(True)
+        raise prober.ProbeNotSupportedError("ICMP sockets are not available")
+    monkeypatch.setattr(prober, "open_icmp_socket", open_icmp_socket)
+    monkeypatch.setattr(prober, "probe_subprocess", lambda address, timeout: 4321)
+    probe = prober.create_prober("icmp")
+    assert probe("192.0.2.1") == 4321
+    assert probe("192.0.2.1") == 4321
+    # ICMP sockets are only tried once
+    assert socket_attempts == [True]
+    assert prober.icmp_sockets_supported is False
+
+def test_unknown_probe_method():
+    with pytest.raises(ValueError):
+        prober.create_prober("carrier-pigeon")
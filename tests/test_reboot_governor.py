@@ -0,0 +1,52 @@
+# Tests for `reboot_governor.py`
+
+# Import the required modules
+import reboot_governor
+
+NOW = 1_700_000_000
+
+def test_no_reboots_is_within_the_limits():
+    wait, reason = reboot_governor.RebootGovernor(4, 12).check(NOW)
+    assert wait == 0
+    assert reason == "within the reboot limits (4 per hour, 12 per day)"
+
+def test_the_hourly_limit():
+    governor = reboot_governor.RebootGovernor(2, 0, 0, 0, [NOW - 3000, NOW - 600])
+    wait, reason = governor.check(NOW)
+    # The oldest of the last 2 reboots leaves the hour in 600 seconds
+    assert wait == 600
+    assert reason.startswith("2 reboots in the last hour")
+    assert governor.check(NOW + 600) == (0, "within the reboot limits (2 per hour)")
+
+def test_the_daily_limit():
+    governor = reboot_governor.RebootGovernor(0, 3, 0, 0, [NOW - 80000, NOW - 40000, NOW - 7200])
+    wait, reason = governor.check(NOW)
+    assert wait == 86400 - 80000
+    assert "per day" in reason
+
+def test_no_limits():
+    governor = reboot_governor.RebootGovernor(0, 0, 0, 0, [NOW - 1] * 50)
+    assert governor.check(NOW) == (0, "within the reboot limits (no limits)")
+
+def test_the_backoff_doubles_up_to_the_maximum():
+    governor = reboot_governor.RebootGovernor(backoff_base=5, backoff_max=30)
+    assert [governor.backoff(n) for n in range(6)] == [0, 300, 600, 1200, 1800, 1800]
+    # A huge number of reboots in a row doesn't overflow
+    assert governor.backoff(10 ** 6) == 1800
+
+def test_the_backoff_is_counted_from_the_last_reboot():
+    governor = reboot_governor.RebootGovernor(0, 0, 5, 240)
+    governor.record_reboot(NOW - 500)
+    wait, reason = governor.check(NOW, reboots_in_a_row=2)
+    assert wait == 100
+    assert reason.startswith("backing off for 10 minutes after 2 reboot(s) in a row")
+    assert governor.check(NOW + 100, reboots_in_a_row=2)[0] == 0
+    # A reboot that fixed the connection doesn't back off
+    assert governor.check(NOW, reboots_in_a_row=0)[0] == 0
+
+def test_the_history_keeps_enough_reboots_for_the_limits():
+    governor = reboot_governor.RebootGovernor(0, 50, 0, 0)
+    for number in range(60):
+        governor.record_reboot(NOW - 60 + number)
+    assert len(governor.reboot_times) == 50
+    assert governor.check(NOW)[0] == 86400 - 50
@@ -0,0 +1,98 @@
+# Tests for `recovery.py`, and how the site monitor waits for the network after a reboot
+
+# Import the required modules
+import threading
+import recovery
+import monitor
+from scheduler import Scheduler
+from test_monitor import create_site_settings, AcceptingRouterClient
+
+GATEWAY = "192.168.0.1"
+
+# Run the scheduler on this thread until `stop` is called, or for at most `timeout` seconds
+def run_until_stopped(scheduler, timeout=5):
+    watchdog = threading.Timer(timeout, scheduler.stop)
+    watchdog.start()
+    try:
+        scheduler.run()
+    finally:
+        watchdog.cancel()
+        scheduler.shutdown()
+
+# A ping function where the gateway answers (or not) as listed, one result per poll, then
+# as the last one listed; the ping list always answers if `ping_list_up`
+def create_ping_function(gateway_results, ping_list_up=True):
+    gateway_results = list(gateway_results)
+    def ping_function(address):
+        if address == GATEWAY:
+            up = gateway_results.pop(0) if len(gateway_results) > 1 else gateway_results[0]
+            return 1000 if up else None
+        return 2000 if ping_list_up else None
+    return ping_function
+
+# Watch a recovery and return the calls to on_down and on_recovered
+def watch(ping_function, down_timeout=5, stable_polls=2, timeout=5):
+    scheduler = Scheduler()
+    events = []
+    def on_recovered(seconds):
+        events.append(("recovered", seconds))
+        scheduler.stop()
+    watcher = recovery.RecoveryWatcher(scheduler, GATEWAY, ["192.0.2.1", "192.0.2.2"], ping_function, 1, 0.01, stable_polls, down_timeout, lambda seconds: events.append(("down", seconds)), on_recovered)
+    scheduler.call_soon(watcher.start)
+    scheduler.call_later(timeout, scheduler.stop)
+    run_until_stopped(scheduler)
+    return events, watcher
+
+def test_recovered_once_the_router_has_gone_down_and_come_back():
+    events, _ = watch(create_ping_function([True, True, False, False, True]))
+    assert [name for name, _ in events] == ["down", "recovered"]
+    down_seconds, recovered_seconds = events[0][1], events[1][1]
+    assert 0 < down_seconds < recovered_seconds < 1
+
+def test_a_router_that_never_goes_down_is_watched_after_the_down_timeout():
+    events, _ = watch(create_ping_function([True]), down_timeout=0.1)
+    assert [name for name, _ in events] == ["recovered"]
+    assert events[0][1] >= 0.1
+
+def test_not_recovered_while_the_ping_list_fails():
+    events, watcher = watch(create_ping_function([False, True], ping_list_up=False), timeout=0.3)
+    assert [name for name, _ in events] == ["down"]
+    assert watcher.stable_count == 0 and not watcher.finished
+    watcher.cancel()
+
+def test_the_stable_polls_must_be_in_a_row():
+    # The gateway drops out again after one good poll
+    events, _ = watch(create_ping_function([False, True, False, True, True, True]), stable_polls=3)
+    assert [name for name, _ in events] == ["down", "recovered"]
+
+# A site monitor that has just had its reboot request accepted, with recovery detection on
+def reboot_site(ping_function, network_reboot_interval):
+    scheduler = Scheduler()
+    site_settings = create_site_settings(network={"network_reboot_interval": network_reboot_interval, "recovery_poll_interval": 0.01, "recovery_stable_polls": 2, "recovery_down_timeout": 5})
+    site_settings.router_details["router_ip_address"] = GATEWAY
+    site_monitor = monitor.SiteMonitor(scheduler, site_settings)
+    site_monitor.client = AcceptingRouterClient()
+    site_monitor.probe_address = ping_function
+    site_monitor.set_state(monitor.STATE_IDLE)
+    site_monitor.set_state(monitor.STATE_CHECKING)
+    site_monitor.reboot_network()
+    return scheduler, site_monitor
+
+def test_the_site_carries_on_as_soon_as_the_network_is_back():
+    scheduler, site_monitor = reboot_site(create_ping_function([False, True]), 5)
+    scheduler.call_later(1, scheduler.stop)
+    run_until_stopped(scheduler)
+    assert site_monitor.state == monitor.STATE_IDLE
+    assert site_monitor.recovery_watcher is None
+    assert site_monitor.last_recovery_seconds is not None and site_monitor.last_recovery_seconds < 1
+    # The next check is the normal check interval away, not the rest of the network reboot interval
+    assert site_monitor.timer.when - scheduler.time() > 5 * 60 - 2
+
+def test_the_site_carries_on_after_the_network_reboot_interval_if_the_network_is_not_back():
+    # 0.005 minutes is 0.3 seconds
+    scheduler, site_monitor = reboot_site(create_ping_function([False], ping_list_up=False), 0.005)
+    scheduler.call_later(1, scheduler.stop)
+    run_until_stopped(scheduler)
+    assert site_monitor.state == monitor.STATE_IDLE
+    assert site_monitor.recovery_watcher is None
+    assert site_monitor.last_recovery_seconds is None
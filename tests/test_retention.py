@@ -0,0 +1,68 @@
+# Tests for `retention.py`
+
+# Import the required modules
+import gzip
+import datetime
+import retention
+
+NOW = datetime.datetime(2025, 6, 15, 12, 0)
+
+# Write a month's log files (and a probe store segment), `size` bytes each
+def create_month(logs_path, probe_store_path, year, month, size=100):
+    year_path = logs_path / str(year)
+    year_path.mkdir(parents=True, exist_ok=True)
+    name = retention.MONTHS[month - 1]
+    (year_path / f"{name}.jsonl").write_bytes(b"x" * size)
+    (year_path / f"{name}.summary.json").write_bytes(b"{}")
+    probe_store_path.mkdir(exist_ok=True)
+    (probe_store_path / f"{year}-{month:02d}-01.bin").write_bytes(b"x" * size)
+
+def test_find_month_paths(tmp_path):
+    logs_path, probe_store_path = tmp_path / "logs", tmp_path / "probes"
+    create_month(logs_path, probe_store_path, 2025, 5)
+    (logs_path / "2025" / "notes.txt").write_text("")
+    (probe_store_path / "broken.bin").write_bytes(b"")
+    month_paths = retention.find_month_paths(str(logs_path), str(probe_store_path))
+    assert list(month_paths) == [retention.month_number(2025, 5)]
+    assert len(month_paths[retention.month_number(2025, 5)]) == 3
+
+def test_months_older_than_the_age_limit_are_deleted(tmp_path):
+    logs_path, probe_store_path = tmp_path / "logs", tmp_path / "probes"
+    for year, month in ((2024, 11), (2025, 3), (2025, 6)):
+        create_month(logs_path, probe_store_path, year, month)
+    deleted = retention.enforce_retention_limits(str(logs_path), str(probe_store_path), max_age_months=6, now=NOW)
+    assert deleted == [(2024, "November")]
+    assert not (logs_path / "2024").exists()
+    assert not (probe_store_path / "2024-11-01.bin").exists()
+    assert (logs_path / "2025" / "March.jsonl").exists()
+
+def test_oldest_months_are_deleted_until_under_the_size_limit(tmp_path):
+    logs_path, probe_store_path = tmp_path / "logs", tmp_path / "probes"
+    for month in (3, 4, 5, 6):
+        create_month(logs_path, probe_store_path, 2025, month, size=300 * 1024)
+    # Each month is about 600 KB, so two months fit in 1.5 MB
+    deleted = retention.enforce_retention_limits(str(logs_path), str(probe_store_path), max_size_mb=1.5, now=NOW)
+    assert deleted == [(2025, "March"), (2025, "April")]
+    assert (logs_path / "2025" / "May.jsonl").exists()
+
+def test_the_current_month_is_never_deleted(tmp_path):
+    logs_path, probe_store_path = tmp_path / "logs", tmp_path / "probes"
+    create_month(logs_path, probe_store_path, 2025, 6, size=2 * 1024 * 1024)
+    assert retention.enforce_retention_limits(str(logs_path), str(probe_store_path), max_age_months=0, max_size_mb=1, now=NOW) == []
+    assert (logs_path / "2025" / "June.jsonl").exists()
+
+def test_closed_months_are_compressed(tmp_path):
+    logs_path, probe_store_path = tmp_path / "logs", tmp_path / "probes"
+    create_month(logs_path, probe_store_path, 2025, 5)
+    create_month(logs_path, probe_store_path, 2025, 6)
+    compressed = retention.compress_closed_months(str(logs_path), now=NOW)
+    assert compressed == [str(logs_path / "2025" / "May.jsonl.gz")]
+    assert not (logs_path / "2025" / "May.jsonl").exists()
+    assert (logs_path / "2025" / "May.summary.json").exists()
+    with gzip.open(compressed[0], "rb") as file:
+        assert file.read() == b"x" * 100
+
+def test_a_month_is_not_compressed_during_the_grace_period(tmp_path):
+    logs_path, probe_store_path = tmp_path / "logs", tmp_path / "probes"
+    create_month(logs_path, probe_store_path, 2025, 5)
+    assert retention.compress_closed_months(str(logs_path), now=datetime.datetime(2025, 6, 1, 0, 30)) == []
@@ -0,0 +1,49 @@
+# Tests for `rollups.py`
+
+# Import the required modules
+import json
+import datetime
+import rollups
+
+def test_events_are_added_to_the_day_hour_and_minute(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    moment = datetime.datetime(2025, 3, 14, 9, 26, 53)
+    month_rollups = rollups.Rollups()
+    month_rollups.add(moment, "ping", 12.5)
+    month_rollups.add(moment, "failed_ping")
+    month_rollups.add(moment, "failed_check")
+    month_rollups.save()
+
+    summary = json.loads((tmp_path / "logs" / "2025" / "March.summary.json").read_text())
+    day = summary["days"]["2025-03-14"]
+    assert day["pings"] == 2 and day["failed_pings"] == 1
+    assert day["checks"] == 1 and day["failed_checks"] == 1
+    assert day["rtt_count"] == 1 and day["rtt_total"] == 12.5
+    assert summary["hours"]["2025-03-14T09"] == day
+    minutes = json.loads((tmp_path / "logs" / "2025" / "March.minutes" / "14.json").read_text())
+    assert minutes["minutes"]["09:26"] == day
+
+def test_totals_carry_on_after_a_restart(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    moment = datetime.datetime(2025, 3, 14, 9, 26)
+    first_rollups = rollups.Rollups()
+    first_rollups.add(moment, "reboot")
+    first_rollups.save()
+    second_rollups = rollups.Rollups()
+    second_rollups.add(moment, "reboot")
+    second_rollups.save()
+    summary = json.loads((tmp_path / "logs" / "2025" / "March.summary.json").read_text())
+    assert summary["days"]["2025-03-14"]["reboots"] == 2
+
+def test_a_new_month_saves_the_last_one(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    month_rollups = rollups.Rollups()
+    month_rollups.add(datetime.datetime(2025, 3, 31, 23, 59), "check")
+    month_rollups.add(datetime.datetime(2025, 4, 1, 0, 0), "check")
+    assert (tmp_path / "logs" / "2025" / "March.summary.json").exists()
+    assert not (tmp_path / "logs" / "2025" / "April.summary.json").exists()
+
+def test_damaged_rollup_file_starts_again(tmp_path):
+    path = tmp_path / "damaged.json"
+    path.write_text("{")
+    assert rollups.load_rollup_file(str(path), {"days": {}}) == {"days": {}}
@@ -0,0 +1,63 @@
+# Tests for the router client (`routers/base.py` and the Virgin Media Hub 5 driver), against
+# the stub Hub 5 server in `benchmarks/stub_router.py`
+
+# Import the required modules
+import os
+import sys
+import pytest
+import routers
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from stub_router import start_stub_router, STUB_ROUTER_PASSWORD
+
+@pytest.fixture
+def server():
+    server = start_stub_router()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def create_client(server, password=STUB_ROUTER_PASSWORD):
+    return routers.create_router_client({"router_ip_address": f"127.0.0.1:{server.server_port}", "router_password": password})
+
+def test_login_and_reboot(server):
+    client = create_client(server)
+    assert client.login()
+    assert client.status()["info"]["model"] == "stub"
+    assert client.reboot() is True
+    assert server.reboot_count == 1
+    # The token doesn't survive the reboot
+    assert client.token is None
+
+def test_cached_token_is_reused(server):
+    client = create_client(server)
+    client.status()
+    client.status()
+    assert server.login_count == 1
+
+def test_rejected_token_logs_in_again_once(server):
+    client = create_client(server)
+    client.login()
+    server.tokens.clear()
+    assert client.reboot() is True
+    assert server.login_count == 2
+
+def test_wrong_password_fails(server):
+    client = create_client(server, "wrong")
+    assert client.login() is None
+    assert client.reboot() is False
+    assert server.reboot_count == 0
+
+@pytest.mark.parametrize("body", [b"[]", b"not json", b'{"created": []}'])
+def test_login_with_a_bad_body_fails(server, body):
+    server.login_body = body
+    client = create_client(server)
+    assert client.login() is None
+    assert client.reboot() is False
+    assert server.reboot_count == 0
+
+def test_logout(server):
+    client = create_client(server)
+    client.login()
+    assert client.logout() is True
+    assert server.tokens == set()
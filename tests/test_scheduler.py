@@ -0,0 +1,54 @@
+# Tests for `scheduler.py`
+
+# Import the required modules
+import threading
+from scheduler import Scheduler
+
+# Run the scheduler on this thread until `stop` is called, or for at most `timeout` seconds
+def run_until_stopped(scheduler, timeout=5):
+    watchdog = threading.Timer(timeout, scheduler.stop)
+    watchdog.start()
+    try:
+        scheduler.run()
+    finally:
+        watchdog.cancel()
+        scheduler.shutdown()
+
+def test_timers_run_in_order():
+    scheduler = Scheduler()
+    calls = []
+    scheduler.call_later(0.02, calls.append, "second")
+    scheduler.call_later(0.01, calls.append, "first")
+    scheduler.call_later(0.03, scheduler.stop)
+    run_until_stopped(scheduler)
+    assert calls == ["first", "second"]
+
+def test_cancelled_timer_is_not_ran():
+    scheduler = Scheduler()
+    calls = []
+    scheduler.call_later(0.01, calls.append, "cancelled").cancel()
+    scheduler.call_later(0.02, scheduler.stop)
+    run_until_stopped(scheduler)
+    assert calls == []
+
+def test_run_in_executor_hands_result_to_callback():
+    scheduler = Scheduler()
+    results = []
+    def callback(result):
+        results.append((result, threading.current_thread() is threading.main_thread()))
+        scheduler.stop()
+    scheduler.run_in_executor(callback, lambda value: value * 2, 21)
+    run_until_stopped(scheduler)
+    assert results == [(42, True)]
+
+def test_run_in_executor_hands_exception_to_on_error():
+    scheduler = Scheduler()
+    errors = []
+    def fail():
+        raise RuntimeError("worker failed")
+    def on_error(error):
+        errors.append(error)
+        scheduler.stop()
+    scheduler.run_in_executor(lambda result: errors.append("callback"), fail, on_error=on_error)
+    run_until_stopped(scheduler)
+    assert len(errors) == 1 and isinstance(errors[0], RuntimeError)
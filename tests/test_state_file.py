@@ -0,0 +1,88 @@
+# Tests for `state_file.py`, and how the site monitors carry on from it after a restart
+
+# Import the required modules
+import os
+import json
+import stat
+import time
+import pytest
+import monitor
+import state_file
+from scheduler import Scheduler
+from test_monitor import create_site_settings
+
+def test_the_state_file_is_only_readable_by_its_user(tmp_path):
+    path = str(tmp_path / "state.json")
+    state_file.save_state_file({"default": {"number_of_reboots_in_a_row": 2}}, path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert state_file.load_state_file(path) == {"default": {"number_of_reboots_in_a_row": 2}}
+    assert os.listdir(tmp_path) == ["state.json"]
+
+def test_a_failed_save_leaves_the_old_state_file(tmp_path):
+    path = str(tmp_path / "state.json")
+    state_file.save_state_file({"default": {"number_of_reboots_in_a_row": 1}}, path)
+    with pytest.raises(TypeError):
+        state_file.save_state_file({"default": {"number_of_reboots_in_a_row": object()}}, path)
+    assert state_file.load_state_file(path) == {"default": {"number_of_reboots_in_a_row": 1}}
+
+@pytest.mark.parametrize("content", [
+    None,
+    "",
+    '{"version": 1, "sites": {"default": ',
+    '{"version": 99, "sites": {}}',
+    '{"version": 1, "sites": []}',
+    "[]"
+])
+def test_a_missing_or_damaged_state_file_is_ignored(tmp_path, content):
+    path = tmp_path / "state.json"
+    if content is not None:
+        path.write_text(content)
+    assert state_file.load_state_file(str(path)) == {}
+
+# A site monitor restored from a saved state, and started
+def start_restored_site(saved):
+    scheduler = Scheduler()
+    site_monitor = monitor.SiteMonitor(scheduler, create_site_settings())
+    site_monitor.restore_state(saved)
+    site_monitor.start()
+    return scheduler, site_monitor
+
+def test_a_cooldown_period_carries_on_after_a_restart():
+    scheduler, site_monitor = start_restored_site({"number_of_reboots_in_a_row": 3, "cooldown_until": time.time() + 600})
+    assert site_monitor.state == monitor.STATE_COOLDOWN
+    assert 590 < site_monitor.timer.when - scheduler.time() <= 600
+    scheduler.shutdown()
+
+def test_a_cooldown_period_that_ended_while_stopped_is_over():
+    scheduler, site_monitor = start_restored_site({"number_of_reboots_in_a_row": 3, "cooldown_until": time.time() - 10})
+    assert site_monitor.state == monitor.STATE_IDLE
+    assert site_monitor.number_of_reboots_in_a_row == 0
+    assert site_monitor.cooldown_until is None
+    assert site_monitor.timer.when - scheduler.time() < 1
+    scheduler.shutdown()
+
+def test_the_wait_after_a_reboot_carries_on_after_a_restart():
+    # The network reboot interval is 5 minutes, and the network was rebooted a minute ago
+    scheduler, site_monitor = start_restored_site({"reboot_times": [time.time() - 60], "number_of_reboots_in_a_row": 1})
+    assert site_monitor.state == monitor.STATE_IDLE
+    assert 230 < site_monitor.timer.when - scheduler.time() <= 240
+    assert list(site_monitor.reboot_governor.reboot_times) and site_monitor.number_of_reboots_in_a_row == 1
+    scheduler.shutdown()
+
+def test_the_state_is_saved_and_restored_by_the_service(tmp_path):
+    path = str(tmp_path / "state.json")
+    sites = [create_site_settings()]
+    service = monitor.MonitorService(Scheduler(), sites, state_path=path)
+    site_monitor = service.monitors["default"]
+    site_monitor.reboot_governor.record_reboot(time.time() - 60)
+    site_monitor.number_of_reboots_in_a_row = 1
+    site_monitor.ping_statistics["10.0.0.1"] = monitor.ping_statistics_engine.PingStatistics(10)
+    site_monitor.ping_statistics["10.0.0.1"].add_sample(1000)
+    service.save_state()
+    with open(path) as file:
+        assert json.load(file)["version"] == state_file.STATE_FILE_VERSION
+
+    restored = monitor.MonitorService(Scheduler(), [create_site_settings()], state_path=path).monitors["default"]
+    assert list(restored.reboot_governor.reboot_times) == list(site_monitor.reboot_governor.reboot_times)
+    assert restored.number_of_reboots_in_a_row == 1
+    assert restored.ping_statistics["10.0.0.1"].mean_rtt() == 1000
@@ -0,0 +1,63 @@
+# Tests for the Virgin Media Hub 5 driver: answers the driver doesn't expect are failures,
+# never exceptions
+
+# Import the required modules
+import pytest
+import requests
+from routers.virgin_media_hub_5 import VirginMediaHub5Client
+
+# A response with a status code and a body
+def create_response(status_code, body):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    return response
+
+# A session that answers every request with the next of the given responses
+class FakeSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+
+    def request(self, method, url, **kwargs):
+        return self.responses.pop(0)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        pass
+
+def create_client(*responses):
+    client = VirginMediaHub5Client({"router_ip_address": "192.168.0.1", "router_password": "password"})
+    client.session = FakeSession(*responses)
+    return client
+
+LOGIN_RESPONSE = create_response(201, b'{"created": {"token": "abc", "userId": 4}}')
+
+def test_login_caches_the_token():
+    client = create_client(LOGIN_RESPONSE)
+    assert client.login() == "abc"
+    assert client.token == "abc" and client.user_id == 4
+
+@pytest.mark.parametrize("body", [b'["created"]', b'"created"', b"not json", b"", b'{"created": "abc"}', b'{"created": {"token": 5}}', b'{"error": "busy"}'])
+def test_login_with_an_unexpected_body_fails(body):
+    client = create_client(create_response(201, body))
+    assert client.login() is None
+    assert client.token is None
+
+def test_reboot_is_accepted():
+    client = create_client(LOGIN_RESPONSE, create_response(200, b'{"reboot": {"enable": true}}'))
+    assert client.reboot() is True
+
+def test_reboot_with_an_empty_answer_is_accepted():
+    client = create_client(LOGIN_RESPONSE, create_response(204, b""))
+    assert client.reboot() is True
+
+@pytest.mark.parametrize("body", [b"[1, 2]", b"<html>error</html>", b'{"error": "not allowed"}'])
+def test_reboot_with_an_unexpected_body_fails(body):
+    client = create_client(LOGIN_RESPONSE, create_response(200, body))
+    assert client.reboot() is False
+
+def test_status_with_an_unexpected_body_is_none():
+    client = create_client(LOGIN_RESPONSE, create_response(200, b"[]"))
+    assert client.status() is None
@@ -0,0 +1,182 @@
+# This file is used by the program to find out where the time goes: pinging, writing the
+# logs, talking to the router, or waiting. This file is not inteded to be ran by itself, but
+# rather imported by the modules it measures, and turned on by `main.py --profile`.
+# Each measured phase records a span (the phase name, when it ended and how long it took,
+# from the monotonic clock) into a ring buffer that keeps the most recent spans. While
+# tracing is off, a traced function only pays for one check of a global, and a span is a
+# shared object that does nothing.
+# With `--profile`, the latency percentiles of each phase are printed when the program
+# exits, and optionally:
+#  - `--profile-cprofile {path}`: a cProfile of the scheduler (main) thread, in the pstats
+#    format (view it with `python -m pstats {path}` or snakeviz).
+#  - `--profile-stacks {path}`: the stacks of every thread, sampled every few milliseconds,
+#    in the "collapsed" format that flamegraph.pl and speedscope read.
+
+# Import the required modules
+import sys
+import time
+import atexit
+import cProfile
+import functools
+import threading
+import collections
+
+# Default tracing settings
+DEFAULT_RING_SIZE = 65536 # spans
+DEFAULT_STACK_SAMPLE_INTERVAL = 0.005 # seconds
+
+# Whether tracing is on, and the most recent spans as (phase, end time, duration in seconds).
+# Appending to a deque is atomic, so any thread can record spans without a lock.
+tracing_enabled = False
+spans = collections.deque(maxlen=DEFAULT_RING_SIZE)
+
+# Turn tracing on, keeping the most recent `ring_size` spans
+def enable_tracing(ring_size=DEFAULT_RING_SIZE):
+    global tracing_enabled, spans
+    spans = collections.deque(maxlen=ring_size)
+    tracing_enabled = True
+
+# Record a span that has already finished, e.g. the time a site monitor spent in a state
+def record(phase, duration):
+    if tracing_enabled:
+        spans.append((phase, time.perf_counter(), duration))
+
+# Measures the code in a `with` block
+class Span:
+    __slots__ = ("phase", "started")
+
+    def __init__(self, phase):
+        self.phase = phase
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        ended = time.perf_counter()
+        spans.append((self.phase, ended, ended - self.started))
+
+# Does nothing, used while tracing is off
+class NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        pass
+
+NO_SPAN = NoSpan()
+
+# Measure a block of code as a phase:
+#   with tracing.span("router.reboot"):
+#       ...
+def span(phase):
+    return Span(phase) if tracing_enabled else NO_SPAN
+
+# Measure every call of a function as a phase
+def traced(phase):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracing_enabled:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                ended = time.perf_counter()
+                spans.append((phase, ended, ended - started))
+        return wrapper
+    return decorator
+
+# The value at a percent (0 to 100) of a sorted list
+def percentile(sorted_values, percent):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))]
+
+# The latency percentiles of each phase, over the spans in the ring buffer (times in ms)
+def phase_summary(percents=(50, 95, 99)):
+    durations = {}
+    for phase, _, duration in list(spans):
+        durations.setdefault(phase, []).append(duration)
+    summary = {}
+    for phase, phase_durations in sorted(durations.items()):
+        phase_durations.sort()
+        summary[phase] = {
+            "count": len(phase_durations),
+            "total": round(sum(phase_durations) * 1000, 3),
+            **{f"p{percent}": round(percentile(phase_durations, percent) * 1000, 3) for percent in percents},
+            "max": round(phase_durations[-1] * 1000, 3)
+        }
+    return summary
+
+# Print the latency percentiles of each phase as a table
+def print_phase_summary():
+    summary = phase_summary()
+    if not summary:
+        print("No phases were recorded.")
+        return
+    width = max(len(phase) for phase in summary)
+    print(f"{'phase':<{width}}  {'count':>8}  {'total ms':>12}  {'p50 ms':>10}  {'p95 ms':>10}  {'p99 ms':>10}  {'max ms':>10}")
+    for phase, phase_summary_values in summary.items():
+        print(f"{phase:<{width}}  {phase_summary_values['count']:>8}  {phase_summary_values['total']:>12.3f}  {phase_summary_values['p50']:>10.3f}  {phase_summary_values['p95']:>10.3f}  {phase_summary_values['p99']:>10.3f}  {phase_summary_values['max']:>10.3f}")
+
+# Samples the stacks of every thread on a background thread, and counts each distinct stack
+class StackSampler(threading.Thread):
+    def __init__(self, interval=DEFAULT_STACK_SAMPLE_INTERVAL):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.stack_counts = collections.Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        thread_names = {}
+        while not self.stopped.wait(self.interval):
+            for thread in threading.enumerate():
+                thread_names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(f"{frame.f_code.co_name} ({frame.f_code.co_filename}:{frame.f_code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self.stack_counts[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+
+    # Write the stacks in the collapsed format, one "stack count" line per stack
+    def write(self, path):
+        with open(path, "w") as file:
+            for stack, count in self.stack_counts.most_common():
+                file.write(f"{stack} {count}\n")
+
+# Turn tracing on for the rest of the program, and report on it when the program exits
+def start_profiling(cprofile_path=None, stacks_path=None):
+    enable_tracing()
+    profiler = None
+    if cprofile_path is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    sampler = None
+    if stacks_path is not None:
+        sampler = StackSampler()
+        sampler.start()
+
+    def stop_profiling():
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+            print(f"cProfile saved to: {cprofile_path}")
+        if sampler is not None:
+            sampler.stop()
+            sampler.join()
+            sampler.write(stacks_path)
+            print(f"Stack samples saved to: {stacks_path}")
+        print("\nPhase latencies:")
+        print_phase_summary()
+
+    atexit.register(stop_profiling)